@@ -1,19 +1,64 @@
 import streamlit as st
-from PyPDF2 import PdfWriter
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain.chains.question_answering import load_qa_chain
-from langchain_openai.chat_models import ChatOpenAI
-from langchain_community.vectorstores import FAISS
 import os
 
+import metrics
+from answer_cache import DEFAULT_SIMILARITY_THRESHOLD, AnswerCache
+from request_scheduler import SchedulerBusy
+from streaming import StreamTimer, render_debug_panel
+
 # Access the shared secret
 open_api_key = st.secrets["OPEN_API_KEY"]
 
 if not open_api_key:
     raise ValueError("API key not found.")
 
+# Stage timings and counters are labelled with the app name when exported
+metrics.configure(app="docuquery")
+
+
+@st.cache_resource
+def get_index_cache():
+    from index_cache import IndexCache
+
+    # One on-disk cache shared by every session of this process
+    return IndexCache()
+
+
+@st.cache_resource
+def get_embedding_store():
+    from embedding_store import EmbeddingStore
+
+    # Per-chunk vectors shared across documents, revisions and sessions
+    return EmbeddingStore()
+
+
+@st.cache_resource
+def get_answer_cache():
+    # Answers are shared by every session asking about the same documents
+    return AnswerCache()
+
+
+@st.cache_resource(max_entries=32)
+def get_retriever(fingerprint, _vector_store):
+    from hybrid_search import HybridRetriever
+
+    # BM25 postings are built once per index version and shared across sessions. Only for cached
+    # single-file indexes, which never change once built
+    return HybridRetriever(_vector_store)
+
+
+def get_corpus_retriever(corpus):
+    from hybrid_search import HybridRetriever
+
+    # A corpus store belongs to one session and changes in place as documents come and go, so its
+    # retriever stays in that session and is rebuilt whenever the documents or the store change
+    key = (corpus.fingerprint(), id(corpus.vector_store))
+    cached = st.session_state.get("corpus_retriever")
+    if cached is None or cached[0] != key:
+        cached = st.session_state.corpus_retriever = (key, HybridRetriever(corpus.vector_store))
+    return cached[1]
+
+
 # Inject custom CSS
 st.markdown(
     """
@@ -78,29 +123,62 @@ st.header("📄 DocuQuery AI: Intelligent Document Assistant", divider=True)
 with st.sidebar:
     st.title("📂 Upload Your Document")
     st.markdown("Use the uploader below to select your PDF file.")
-    file = st.file_uploader("Upload a PDF file to ask questions and extract insights:", type="pdf")
-
-# Process the uploaded file
-if file is not None:
-    pdf_reader = PdfReader(file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-
-    # Split the document into smaller chunks for efficient processing
-    text_splitter = RecursiveCharacterTextSplitter(
-        separators="\n",
-        chunk_size=400,
-        chunk_overlap=150,
-        length_function=len
+    corpus_mode = st.toggle("Corpus mode", help="Index several PDFs together and search across them.")
+    if corpus_mode:
+        files = st.file_uploader("Upload PDF files to build a searchable corpus:", type="pdf", accept_multiple_files=True)
+    else:
+        file = st.file_uploader("Upload a PDF file to ask questions and extract insights:", type="pdf")
+        files = [file] if file is not None else []
+
+# Process the uploaded files
+if files:
+    # LangChain, FAISS and PyPDF2 are only loaded once there is a document to work on
+    import docuquery_pipeline as pipeline
+    from corpus_index import CorpusIndex, document_id
+    from stream_callbacks import PlaceholderStreamHandler
+
+    # This app has always split on the "\n" string rather than a one-item list
+    SPLITTER_SETTINGS = {**pipeline.SPLITTER_SETTINGS, "separators": "\n"}
+
+    # Generate embeddings for the text chunks; uncached ones go out in concurrent batches
+    embedding_progress = st.sidebar.empty()
+    embeddings = pipeline.make_embeddings(
+        open_api_key,
+        get_embedding_store(),
+        on_progress=lambda done, total: embedding_progress.progress(done / total, text=f"Embedded {done}/{total} chunks"),
     )
-    chunks = text_splitter.split_text(text)
-
-    # Generate embeddings for the text chunks
-    embeddings = OpenAIEmbeddings(openai_api_key=open_api_key)
 
-    # Create a vector store for similarity search
-    vector_store = FAISS.from_texts(chunks, embeddings)
+    if corpus_mode:
+        # Append vectors for new uploads and drop them for files that were removed
+        if "corpus" not in st.session_state:
+            st.session_state.corpus = CorpusIndex(
+                embeddings, index_mode=pipeline.INDEX_SETTINGS["mode"], index_params=pipeline.SEARCH_SETTINGS
+            )
+        corpus = st.session_state.corpus
+        corpus.embeddings = embeddings
+        uploads = {document_id(f.getvalue()): f for f in files}
+        corpus.sync(
+            {doc_id: f.name for doc_id, f in uploads.items()},
+            lambda doc_id: pipeline.split_pdf(uploads[doc_id].getvalue(), SPLITTER_SETTINGS),
+        )
+        with st.sidebar:
+            selected_docs = st.multiselect(
+                "Search within",
+                list(corpus.documents),
+                format_func=lambda doc_id: corpus.documents[doc_id]["source"],
+                placeholder="All documents",
+            )
+        fingerprint = corpus.fingerprint(selected_docs)
+        retriever = get_corpus_retriever(corpus)
+    else:
+        # Load the index for this exact file and settings from the cache, or build it once
+        vector_store, fingerprint = pipeline.load_index(get_index_cache(), file.getvalue(), embeddings, SPLITTER_SETTINGS)
+        retriever = get_retriever(fingerprint, vector_store)
+        selected_docs = None
+    embedding_stats = embeddings.underlying.stats
+    if embedding_stats.chunks:
+        embedding_progress.empty()
+        st.sidebar.metric("Embedding throughput", f"{embedding_stats.chunks_per_second:.1f} chunks/sec")
 
     # Input field for user queries
     user_question = st.text_input(
@@ -108,24 +186,77 @@ if file is not None:
         placeholder="Type your question here:"
     )
 
-    # Perform similarity search and generate response
-    match = None
-    if user_question:
-        match = vector_store.similarity_search(user_question)
-
-    # Define the language model
-    llm = ChatOpenAI(
-        openai_api_key=open_api_key,
-        temperature=0,
-        max_tokens=1000,
-        model_name="gpt-3.5-turbo"
+    try:
+        # Serve repeated or near-identical questions from the shared answer cache
+        answer_cache = get_answer_cache()
+        cached_response = None
+        question_vector = None
+        if user_question:
+            cached_response = answer_cache.get_exact(fingerprint, user_question)
+            if cached_response is None:
+                # Part numbers and other identifiers are matched lexically, skipping the query embedding
+                if retriever.wants_lexical_only(user_question):
+                    answer_cache.record_miss()
+                else:
+                    question_vector = embeddings.embed_query(user_question)
+                    cached_response = answer_cache.get_similar(
+                        fingerprint, question_vector, st.session_state.get("answer_similarity", DEFAULT_SIMILARITY_THRESHOLD)
+                    )
+
+        # Perform similarity search and generate response
+        match = None
+        if user_question and cached_response is None:
+            # Overlapping neighbours are merged so the prompt carries each passage once
+            match, _, prompt_tokens = pipeline.retrieve(
+                retriever, user_question, query_vector=question_vector, doc_ids=selected_docs
+            )
+            st.session_state.last_prompt_tokens = prompt_tokens
+
+        # Tokens are rendered into this placeholder as they arrive
+        response_placeholder = st.empty()
+        timer = StreamTimer()
+
+        # Define the language model; one shared instance, tokens are routed by the per-request callback
+        llm = pipeline.make_llm(open_api_key, streaming=True)
+
+        # Provide the answer if relevant matches are found
+        if match:
+            response = pipeline.answer(
+                llm,
+                match,
+                user_question,
+                callbacks=[PlaceholderStreamHandler(response_placeholder, timer, prefix="### 📜 Response:\n")],
+            )
+            response_placeholder.markdown(f"### 📜 Response:\n{response}")
+            citations = pipeline.format_citations(match)
+            if citations:
+                st.caption(f"Sources: {citations}")
+            st.session_state.last_stream_timer = timer
+            answer_cache.put(fingerprint, user_question, response, question_vector, timer.total_time or 0.0)
+        elif cached_response is not None:
+            response_placeholder.markdown(f"### 📜 Response:\n{cached_response}")
+    except SchedulerBusy as e:
+        # The shared request queue is full; nothing was sent for this question
+        st.warning(str(e))
+
+render_debug_panel(
+    st.session_state.get("last_stream_timer"),
+    {"Prompt tokens (context + question)": st.session_state.get("last_prompt_tokens", "n/a")},
+    registry=metrics.REGISTRY,
+)
+with st.sidebar.expander("Answer cache"):
+    # Per session; the lookup above reads it from session state
+    st.slider(
+        "Similar-question threshold",
+        min_value=0.80,
+        max_value=1.0,
+        value=DEFAULT_SIMILARITY_THRESHOLD,
+        step=0.01,
+        key="answer_similarity",
+        help="Cosine similarity a new question needs to a cached one to reuse its answer.",
     )
-
-    # Provide the answer if relevant matches are found
-    if match:
-        chain = load_qa_chain(llm, chain_type="stuff")
-        response = chain.run(input_documents=match, question=user_question)
-        st.markdown(f"### 📜 Response:\n{response}")
+    st.metric("Hit rate", f"{get_answer_cache().hit_rate:.0%}")
+    st.metric("Latency saved", f"{get_answer_cache().saved_seconds:.1f} s")
 
 
 
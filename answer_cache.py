@@ -0,0 +1,171 @@
+"""Process-wide answer cache with exact and near-duplicate question matching."""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_SIMILARITY_THRESHOLD = float(os.environ.get("DOCUQUERY_ANSWER_SIMILARITY", 0.95))
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", question.lower())).strip()
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _Entry:
+    __slots__ = ("answer", "vector", "created", "latency")
+
+    def __init__(self, answer, vector, latency):
+        self.answer = answer
+        self.vector = _unit(vector) if vector is not None else None
+        self.created = time.monotonic()
+        self.latency = latency
+
+
+class AnswerCache:
+    """Answers keyed by (document fingerprint, normalized question), evicted by TTL and LRU.
+
+    Near-duplicate lookups score the question against one matrix of unit vectors per fingerprint.
+    The matrix is rebuilt after that fingerprint's questions change, and scoring runs outside the
+    lock, so sessions only wait on each other for the bookkeeping.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._by_fingerprint = {}
+        # fingerprint -> (version, questions, matrix). A fingerprint's version is the change number of
+        # its last change, unique across the cache; a fingerprint without questions has version 0
+        self._changes = 0
+        self._versions = {}
+        self._matrices = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def _expired(self, entry):
+        return time.monotonic() - entry.created > self.ttl
+
+    def _changed(self, fingerprint):
+        self._changes += 1
+        self._versions[fingerprint] = self._changes
+        self._matrices.pop(fingerprint, None)
+
+    def _drop(self, key):
+        if self._entries.pop(key, None) is None:
+            return
+        fingerprint, question = key
+        self._changed(fingerprint)
+        questions = self._by_fingerprint.get(fingerprint)
+        if questions is not None:
+            questions.discard(question)
+            if not questions:
+                del self._by_fingerprint[fingerprint]
+                del self._versions[fingerprint]
+
+    def _hit(self, key, entry, counter):
+        self._entries.move_to_end(key)
+        setattr(self, counter, getattr(self, counter) + 1)
+        metrics.record_cache("answer", hit=True)
+        self.saved_seconds += entry.latency
+        return entry.answer
+
+    def get_exact(self, fingerprint, question):
+        """Cheap lookup that needs no embedding; returns the answer or None."""
+        key = (fingerprint, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                self._drop(key)
+                return None
+            return self._hit(key, entry, "exact_hits")
+
+    def _matrix(self, fingerprint):
+        # Questions with vectors for ``fingerprint`` and their stacked vectors, built outside the lock
+        with self._lock:
+            snapshot = self._matrices.get(fingerprint)
+            if snapshot is not None:
+                return snapshot
+            version = self._versions.get(fingerprint, 0)
+            pairs = [
+                (question, self._entries[(fingerprint, question)].vector)
+                for question in self._by_fingerprint.get(fingerprint, ())
+                if self._entries[(fingerprint, question)].vector is not None
+            ]
+        matrix = np.stack([vector for _, vector in pairs]) if pairs else None
+        snapshot = (version, tuple(question for question, _ in pairs), matrix)
+        with self._lock:
+            # Keep it for the next lookup unless the questions changed meanwhile
+            if self._versions.get(fingerprint, 0) == version:
+                self._matrices[fingerprint] = snapshot
+        return snapshot
+
+    def get_similar(self, fingerprint, question_vector, threshold=None):
+        """Best cached answer for the same documents whose question passes the cosine ``threshold``.
+
+        ``threshold`` defaults to the cache's; sessions may pass their own.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        _, questions, matrix = self._matrix(fingerprint)
+        candidates = []
+        if matrix is not None:
+            scores = matrix @ _unit(question_vector)
+            above = np.flatnonzero(scores >= threshold)
+            candidates = [questions[position] for position in above[np.argsort(-scores[above])]]
+        with self._lock:
+            # Best first; skip questions dropped or expired since the matrix was built
+            for question in candidates:
+                key = (fingerprint, question)
+                entry = self._entries.get(key)
+                if entry is None or entry.vector is None:
+                    continue
+                if self._expired(entry):
+                    self._drop(key)
+                    continue
+                return self._hit(key, entry, "similar_hits")
+            self.misses += 1
+        metrics.record_cache("answer", hit=False)
+        return None
+
+    def put(self, fingerprint, question, answer, question_vector=None, latency=0.0):
+        key = (fingerprint, normalize_question(question))
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = _Entry(answer, question_vector, latency)
+            self._by_fingerprint.setdefault(fingerprint, set()).add(key[1])
+            self._changed(fingerprint)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def record_miss(self):
+        # For lookups that stop after get_exact, e.g. queries answered without an embedding
+        with self._lock:
+            self.misses += 1
+        metrics.record_cache("answer", hit=False)
+
+    @property
+    def hit_rate(self):
+        hits = self.exact_hits + self.similar_hits
+        total = hits + self.misses
+        return hits / total if total else 0.0
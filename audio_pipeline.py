@@ -0,0 +1,125 @@
+"""In-memory audio transcription: downmix and compress, split at pauses, transcribe segments concurrently.
+
+Recordings stay in memory as pydub ``AudioSegment``s and ``BytesIO`` buffers, so concurrent sessions
+never share a file. Uploads are 16 kHz mono, which is what Whisper transcribes.
+The recording is cut into up to ``TRANSCRIBE_WORKERS`` segments. Every cut falls in the longest pause
+found shortly before the target length, so words are not split. Each segment is then converted,
+encoded (MP3 when ffmpeg is available, WAV otherwise) and sent on its own worker, so conversion
+overlaps the uploads. The texts are joined back in recording order.
+"""
+import functools
+import io
+import math
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import shared_resources
+
+# Whisper resamples everything to 16 kHz mono; sending more only adds upload time
+SAMPLE_RATE = 16_000
+# Segments per recording sent at once, and the segment length bounds. Ten minutes of 16 kHz
+# 16-bit WAV is about 19 MB, under the API's 25 MB upload limit
+TRANSCRIBE_WORKERS = 4
+MIN_SEGMENT_SECONDS = 60
+MAX_SEGMENT_SECONDS = 600
+# A cut is placed in a pause within this many seconds before the target length
+SEARCH_SECONDS = 20
+MIN_SILENCE_MS = 300
+# Quieter than the recording's average loudness by this much counts as a pause
+SILENCE_BELOW_AVERAGE_DB = 16
+SEEK_STEP_MS = 10
+COMPRESSED_BITRATE = "48k"
+
+# Shared by every session; workers mostly wait on uploads and the API
+_transcribe_pool = ThreadPoolExecutor(max_workers=2 * TRANSCRIBE_WORKERS, thread_name_prefix="transcribe")
+
+
+def prepare(audio):
+    """A 16 kHz mono 16-bit copy of ``audio``, the format Whisper transcribes in."""
+    return audio.set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
+
+
+def segment_length_ms(duration_ms, workers=TRANSCRIBE_WORKERS):
+    # One segment per worker, within the length bounds. Cuts land up to SEARCH_SECONDS early, so
+    # allow for that, or a short extra segment is left at the end
+    target = math.ceil(duration_ms / workers) + SEARCH_SECONDS * 1000
+    return min(max(target, MIN_SEGMENT_SECONDS * 1000), MAX_SEGMENT_SECONDS * 1000)
+
+
+def split_at_silence(audio, segment_ms, search_ms=SEARCH_SECONDS * 1000, min_silence_ms=MIN_SILENCE_MS):
+    """Cut ``audio`` into pieces of at most ``segment_ms``, each ending in the middle of a pause.
+
+    Only the ``search_ms`` before each target cut is scanned, so long recordings cost no more than
+    short ones per cut. Where no pause is found, the cut falls at the target length.
+    """
+    from pydub.silence import detect_silence
+
+    loudness = audio.dBFS
+    silence_thresh = loudness - SILENCE_BELOW_AVERAGE_DB if math.isfinite(loudness) else -60.0
+    segments = []
+    start = 0
+    while len(audio) - start > segment_ms:
+        limit = start + segment_ms
+        window_start = max(start, limit - search_ms)
+        pauses = detect_silence(
+            audio[window_start:limit], min_silence_len=min_silence_ms, silence_thresh=silence_thresh, seek_step=SEEK_STEP_MS
+        )
+        if pauses:
+            begin, end = max(pauses, key=lambda pause: pause[1] - pause[0])
+            cut = window_start + (begin + end) // 2
+        else:
+            cut = limit
+        segments.append(audio[start:cut])
+        start = cut
+    segments.append(audio[start:])
+    return segments
+
+
+@functools.lru_cache(maxsize=None)
+def can_compress():
+    """Whether pydub can find ffmpeg to encode MP3; without it segments go up as WAV."""
+    from pydub import AudioSegment
+
+    return shutil.which(AudioSegment.converter) is not None
+
+
+def encode(segment, name):
+    """``(file name, bytes)`` of ``segment`` ready to upload, encoded in memory."""
+    buffer = io.BytesIO()
+    if can_compress():
+        segment.export(buffer, format="mp3", bitrate=COMPRESSED_BITRATE)
+        return f"{name}.mp3", buffer.getvalue()
+    segment.export(buffer, format="wav")
+    return f"{name}.wav", buffer.getvalue()
+
+
+def openai_transcriber(get_client, model="whisper-1"):
+    """Return ``transcribe_file(name, data) -> str`` backed by the OpenAI transcription endpoint.
+
+    ``get_client()`` returns the OpenAI client; calls go through the "audio" request scheduler.
+    """
+    def transcribe_file(name, data):
+        with metrics.span("transcribe_segment", bytes=len(data)):
+            return shared_resources.request_scheduler("audio").call(
+                lambda: get_client().audio.transcriptions.create(file=(name, data), model=model, response_format="text"),
+                stage="transcribe",
+            )
+
+    return transcribe_file
+
+
+def _send_segment(transcribe_file, segment, name):
+    return transcribe_file(*encode(prepare(segment), name))
+
+
+def transcribe(audio, transcribe_file, workers=TRANSCRIBE_WORKERS):
+    """Transcript of a pydub ``AudioSegment``; segments are converted and sent concurrently, joined in order."""
+    with metrics.span("audio_split", audio_seconds=round(len(audio) / 1000)):
+        segments = split_at_silence(audio, segment_length_ms(len(audio), workers))
+    futures = [
+        _transcribe_pool.submit(_send_segment, transcribe_file, segment, f"segment-{number:03d}")
+        for number, segment in enumerate(segments)
+    ]
+    texts = [future.result().strip() for future in futures]
+    return " ".join(text for text in texts if text)
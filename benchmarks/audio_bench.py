@@ -0,0 +1,126 @@
+"""Transcription latency of the Audio Journal for 1, 10 and 30 minute recordings, against the stub.
+
+    python -m benchmarks.audio_bench --minutes 1 10 30 --transcribe-speed 0.02
+
+Recordings are synthetic speech: bursts of modulated noise separated by short pauses, at 44.1 kHz
+mono like the browser recorder's. The stub API takes ``--transcribe-speed`` seconds per second of
+WAV audio and rejects uploads over 25 MB, as the real endpoint does (``--no-upload-limit`` lifts
+that, to time the single request anyway). Each recording goes through:
+
+* single: the previous page's path; export a WAV file to disk and send it in one request;
+* pipeline: ``audio_pipeline.transcribe``; split at pauses, convert each segment to 16 kHz mono in
+  memory and send the segments concurrently through the audio request scheduler.
+
+The report covers wall time, bytes uploaded and segment count, plus whether the transcript
+segments came back in order.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+from benchmarks.common import save_results
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+RECORDER_RATE = 44_100
+
+
+def synthetic_recording(minutes, seed=0):
+    """An ``AudioSegment`` of speech-like bursts (0.5 to 6 s) and pauses (0.2 to 1.2 s)."""
+    import numpy as np
+    from pydub import AudioSegment
+
+    rng = np.random.default_rng(seed)
+    total = int(minutes * 60 * RECORDER_RATE)
+    samples = np.zeros(total, dtype=np.int16)
+    position = 0
+    while position < total:
+        burst = int(rng.uniform(0.5, 6.0) * RECORDER_RATE)
+        end = min(total, position + burst)
+        # Noise under a syllable-rate envelope is close enough to speech for silence detection
+        envelope = 0.6 + 0.4 * np.sin(np.arange(end - position) * (2 * np.pi * 4 / RECORDER_RATE))
+        samples[position:end] = (rng.normal(0, 4000, end - position) * envelope).astype(np.int16)
+        position = end + int(rng.uniform(0.2, 1.2) * RECORDER_RATE)
+    return AudioSegment(samples.tobytes(), frame_rate=RECORDER_RATE, sample_width=2, channels=1)
+
+
+def single(client, audio, directory):
+    # The old page: whole recording as one WAV file on disk, one request
+    path = os.path.join(directory, "audio_journal.wav")
+    started = time.perf_counter()
+    audio.export(path, format="wav")
+    try:
+        with open(path, "rb") as upload:
+            client.audio.transcriptions.create(file=upload, model="whisper-1", response_format="text")
+        status = "ok"
+    except Exception as error:
+        status = f"failed ({getattr(error, 'status_code', type(error).__name__)})"
+    return {"seconds": time.perf_counter() - started, "uploaded_mb": os.path.getsize(path) / 1e6, "segments": 1, "status": status}
+
+
+def pipeline(client, audio):
+    import audio_pipeline
+
+    uploads = []
+    transcribe_file = audio_pipeline.openai_transcriber(lambda: client)
+
+    def counted(name, data):
+        uploads.append(len(data))
+        return transcribe_file(name, data)
+
+    started = time.perf_counter()
+    try:
+        text = audio_pipeline.transcribe(audio, counted)
+        names = [part.split(" (")[0].rsplit(" ", 1)[-1] for part in text.split("Stub transcript of ")[1:]]
+        status = "ok" if names == sorted(names) else "out of order"
+    except Exception as error:
+        status = f"failed ({getattr(error, 'status_code', type(error).__name__)})"
+    return {"seconds": time.perf_counter() - started, "uploaded_mb": sum(uploads) / 1e6, "segments": len(uploads), "status": status}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Audio Journal transcription latency against the stub API.")
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10, 30], help="recording lengths")
+    parser.add_argument("--transcribe-speed", type=float, default=0.02, help="stub seconds per second of audio")
+    parser.add_argument("--latency", type=float, default=0.3, help="stub seconds added to every request")
+    parser.add_argument("--no-upload-limit", action="store_true", help="accept uploads over 25 MB, to time the single request")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/audio-<commit>.json)")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    from openai import OpenAI
+
+    import audio_pipeline
+    import stub_openai_server
+
+    state = stub_openai_server.StubState(
+        latency=args.latency,
+        transcribe_speed=args.transcribe_speed,
+        max_audio_bytes=0 if args.no_upload_limit else stub_openai_server.MAX_AUDIO_BYTES,
+    )
+    server = stub_openai_server.serve(state=state)
+    client = OpenAI(api_key="stub", base_url=stub_openai_server.base_url(server), max_retries=0)
+
+    results = {"settings": vars(args), "compressed": audio_pipeline.can_compress(), "runs": {}}
+    print(f"Segments upload as {'MP3' if results['compressed'] else 'WAV (no ffmpeg)'}; "
+          f"stub {args.transcribe_speed}s per audio second + {args.latency}s per request")
+    with tempfile.TemporaryDirectory() as directory:
+        for minutes in args.minutes:
+            audio = synthetic_recording(minutes)
+            row = results["runs"][f"{minutes:g}min"] = {"single": single(client, audio, directory), "pipeline": pipeline(client, audio)}
+            for name, run in row.items():
+                print(
+                    f"  {minutes:>4g} min  {name:<9} {run['seconds']:>7.2f} s  {run['uploaded_mb']:>7.1f} MB uploaded  "
+                    f"{run['segments']:>2} segments  {run['status']}"
+                )
+    server.shutdown()
+    print(f"Saved {save_results('audio', results, args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Helpers shared by the benchmark scripts: synthetic PDFs, resource usage and result files."""
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+_VOCABULARY = (
+    "model data policy system user process value risk report control review access network service "
+    "training output input quality safety content response request document section table figure "
+    "generative language retrieval vector index latency throughput budget customer contract".split()
+)
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_synthetic_pdf(pages, lines_per_page=45, words_per_line=11, seed=0):
+    """Return bytes of a text PDF with ``pages`` pages of reproducible pseudo-prose."""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for page in range(pages):
+        lines = []
+        for line in range(lines_per_page):
+            words = [rng.choice(_VOCABULARY) for _ in range(words_per_line)]
+            if rng.random() < 0.05:
+                words[rng.randrange(words_per_line)] = f"PN-{rng.randrange(10000):04d}"
+            lines.append(f"({_escape(' '.join(words))}) Tj T*")
+        stream = f"BT /F1 10 Tf 12 TL 50 790 Td (Page {page + 1}) Tj T* {' '.join(lines)} ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+    """Collects wall time, peak RSS and throughput for named stages."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, function, items=None):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        count = items(result) if callable(items) else items
+        self.stages[name] = {
+            "seconds": elapsed,
+            "peak_rss_mb": peak_rss_mb(),
+            "items": count,
+            "items_per_second": (count / elapsed) if count and elapsed else None,
+        }
+        return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(name, results, path=None):
+    """Write results to ``benchmarks/results/<name>-<commit>.json`` unless a path is given."""
+    payload = {"benchmark": name, "revision": git_revision(), "timestamp": time.time(), "results": results}
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{name}-{payload['revision']}.json")
+    with open(path, "w") as out:
+        json.dump(payload, out, indent=2)
+    return path
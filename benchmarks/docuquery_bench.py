@@ -0,0 +1,141 @@
+"""Per-stage cost of the DocuQuery pipeline across document sizes, fully offline.
+
+    python -m benchmarks.docuquery_bench --pages 10 100 500 --queries 50
+    python -m benchmarks.docuquery_bench --compare old.json new.json
+
+Embeddings and chat run against the local stub API in ``stub_openai_server.py``; every document
+size runs in a fresh process so peak RSS is per size.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from benchmarks.common import StageTimer, make_synthetic_pdf, save_results
+
+SAMPLE_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "Generative_AI_Overview.pdf")
+
+
+def _questions(texts, count, seed=0):
+    # Questions built from chunk words so lexical and dense retrieval both have something to find
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(count):
+        words = rng.choice(texts).split()
+        start = rng.randrange(max(1, len(words) - 6))
+        questions.append("What does the document say about " + " ".join(words[start:start + 6]) + "?")
+    return questions
+
+
+def run_document(label, pdf_bytes, queries, answers, dim):
+    """Run every stage for one document and return its stage measurements."""
+    import stub_openai_server
+    from langchain_community.vectorstores import FAISS
+
+    import docuquery_pipeline as pipeline
+    import shared_resources
+    from embedding_pipeline import PipelineEmbeddings
+    from hybrid_search import HybridRetriever
+    from pdf_extract import iter_page_documents, iter_page_texts
+
+    server = stub_openai_server.serve(state=stub_openai_server.StubState(dim=dim))
+    base_url = stub_openai_server.base_url(server)
+    embeddings = PipelineEmbeddings(
+        shared_resources.embedding_backend("stub", base_url=base_url),
+        max_batch_size=pipeline.EMBEDDING_BATCH_SIZE,
+        concurrency=pipeline.EMBEDDING_CONCURRENCY,
+    )
+    llm = pipeline.make_llm("stub", base_url=base_url)
+    timer = StageTimer()
+
+    pages = timer.run("extract", lambda: list(iter_page_texts(pdf_bytes)), items=len)
+    splitter = pipeline.make_text_splitter()
+    chunks = timer.run("split", lambda: list(iter_page_documents(pages, splitter)), items=len)
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = timer.run("embed", lambda: embeddings.embed_documents(texts), items=len)
+    vector_store = timer.run(
+        "index_build",
+        lambda: FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, metadatas=[c.metadata for c in chunks]),
+        items=len(texts),
+    )
+    retriever = timer.run("lexical_index_build", lambda: HybridRetriever(vector_store), items=len(texts))
+
+    questions = _questions(texts, queries)
+    query_vectors = timer.run("query_embed", lambda: [embeddings.embed_query(q) for q in questions], items=len)
+    timer.run(
+        "similarity_search",
+        lambda: [retriever.search(q, k=pipeline.RETRIEVAL_CANDIDATES, query_vector=v) for q, v in zip(questions, query_vectors)],
+        items=len,
+    )
+    timer.run(
+        "answer",
+        lambda: [
+            pipeline.answer(llm, pipeline.retrieve(retriever, q, v)[0], q)
+            for q, v in zip(questions[:answers], query_vectors[:answers])
+        ],
+        items=len,
+    )
+    server.shutdown()
+    return {"document": label, "pages": len(pages), "chunks": len(texts), "stages": timer.stages}
+
+
+def compare(old_path, new_path):
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    print(f"{old['revision']} -> {new['revision']}")
+    baseline = {row["document"]: row for row in old["results"]}
+    for row in new["results"]:
+        before = baseline.get(row["document"])
+        if before is None:
+            continue
+        print(row["document"])
+        for stage, numbers in row["stages"].items():
+            previous = before["stages"].get(stage)
+            if previous and previous["seconds"]:
+                change = numbers["seconds"] / previous["seconds"] - 1
+                print(f"  {stage:<20}{previous['seconds']:>10.3f}s {numbers['seconds']:>10.3f}s {change:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DocuQuery stages against stub backends.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500], help="synthetic document sizes")
+    parser.add_argument("--no-sample", action="store_true", help="skip data/Generative_AI_Overview.pdf")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--answers", type=int, default=10, help="questions sent through the full QA chain")
+    parser.add_argument("--dim", type=int, default=384, help="stub embedding dimension")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/docuquery-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    documents = [(f"synthetic-{pages}p", make_synthetic_pdf(pages, seed=pages)) for pages in args.pages]
+    if not args.no_sample and os.path.exists(SAMPLE_PDF):
+        with open(SAMPLE_PDF, "rb") as sample:
+            documents.insert(0, ("Generative_AI_Overview.pdf", sample.read()))
+
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for label, pdf_bytes in documents:
+            # A fresh interpreter per document keeps peak RSS and caches independent
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                os.environ["DOCUQUERY_CACHE_DIR"] = scratch
+                row = pool.submit(run_document, label, pdf_bytes, args.queries, args.answers, args.dim).result()
+            results.append(row)
+            print(f"{label} ({row['pages']} pages, {row['chunks']} chunks)")
+            for stage, numbers in row["stages"].items():
+                rate = f"{numbers['items_per_second']:,.1f}/s" if numbers["items_per_second"] else ""
+                print(f"  {stage:<20}{numbers['seconds']:>9.3f}s {numbers['peak_rss_mb']:>8.1f} MiB  {rate}")
+
+    print(f"Saved {save_results('docuquery', results, args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
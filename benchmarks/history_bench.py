@@ -0,0 +1,174 @@
+"""Page-load and write latency of ``history_store`` as the number of users and records grows.
+
+    python -m benchmarks.history_bench --users 2000 --entries 500
+
+Seeds a fresh database with ``users`` users, each with ``entries`` journal entries and as many chat
+messages spread over a few conversations, written straight through SQLite. It then times what the
+apps do: opening a page (latest session, newest messages, newest entries), paging back, and
+queuing writes from the UI thread while the writer thread commits them. Mood Trends is timed
+three ways: a scan of every entry (as before the per-day aggregates), a rebuild of the series
+from the aggregates after a new entry, and a revisit that only reads the data version.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.common import save_results
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+SESSIONS_PER_USER = 4
+DAY = 86400.0
+
+
+def seed(path, users, entries):
+    from history_store import _BACKFILL, HistoryStore
+
+    HistoryStore(path).close()
+    conn = sqlite3.connect(path)
+    started = time.time() - entries * DAY
+    with conn:
+        for user_number in range(users):
+            user = f"user{user_number}"
+            sessions = [f"{user}-s{number}" for number in range(SESSIONS_PER_USER)]
+            conn.executemany(
+                "INSERT INTO sessions VALUES (?, ?, 'mental_health', ?)",
+                [(session, user, started + number) for number, session in enumerate(sessions)],
+            )
+            conn.executemany(
+                "INSERT INTO messages (user, session, created, role, content) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (user, sessions[number * SESSIONS_PER_USER // entries], started + number * DAY,
+                     "user" if number % 2 == 0 else "assistant", f"message {number} from {user}")
+                    for number in range(entries)
+                ],
+            )
+            conn.executemany(
+                "INSERT INTO journal_entries (user, created, date, entry, mood, sentiment, encouragement)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (user, started + number * DAY, time.strftime("%Y-%m-%d", time.gmtime(started + number * DAY)),
+                     f"entry {number}", "Neutral", 0.0, "Keep going.")
+                    for number in range(entries)
+                ],
+            )
+        # Rows written behind the store's back; fill the per-day aggregates it would have kept
+        for statement in _BACKFILL:
+            conn.execute(statement)
+    conn.close()
+
+
+def _timed_ms(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {"p50_ms": statistics.median(samples) * 1000, "p95_ms": samples[int(len(samples) * 0.95) - 1] * 1000}
+
+
+def measure(path, users, repeat, writes):
+    from history_store import HistoryStore
+    from mood_trends import trend_series
+
+    store = HistoryStore(path)
+    rng = random.Random(0)
+
+    def open_page():
+        user = f"user{rng.randrange(users)}"
+        session = store.latest_session(user, "mental_health")
+        store.messages(user, session)
+        store.entries(user)
+
+    def page_back():
+        user = f"user{rng.randrange(users)}"
+        _, cursor = store.entries(user)
+        for _ in range(3):
+            if cursor is None:
+                break
+            _, cursor = store.entries(user, before=cursor)
+
+    def trends_scan():
+        # What Mood Trends did before the per-day aggregates: average every entry of the user
+        user = f"user{rng.randrange(users)}"
+        with store._read_lock:
+            store._reader_conn.execute(
+                "SELECT date, AVG(sentiment) FROM journal_entries WHERE user = ? GROUP BY date ORDER BY date", (user,)
+            ).fetchall()
+
+    def trends_rebuild():
+        # A new entry since the last visit: fetch the per-day rows and rebuild the series
+        user = f"user{rng.randrange(users)}"
+        trend_series(store.daily_mood(user))
+
+    def trends_revisit():
+        # Unchanged data: the page only reads the version its cached chart is keyed by
+        store.journal_version(f"user{rng.randrange(users)}")
+
+    results = {
+        "open_page": _timed_ms(open_page, repeat),
+        "page_back_3": _timed_ms(page_back, repeat),
+        "trends_scan": _timed_ms(trends_scan, repeat),
+        "trends_rebuild": _timed_ms(trends_rebuild, repeat),
+        "trends_revisit": _timed_ms(trends_revisit, repeat),
+    }
+
+    enqueue = []
+    started = time.perf_counter()
+    for number in range(writes):
+        began = time.perf_counter()
+        store.append_message(f"user{number % users}", f"user{number % users}-s0", "user", f"new message {number}")
+        enqueue.append(time.perf_counter() - began)
+    queued = time.perf_counter() - started
+    store.flush()
+    committed = time.perf_counter() - started
+    enqueue.sort()
+    results["writes"] = {
+        "count": writes,
+        "enqueue_p50_us": statistics.median(enqueue) * 1e6,
+        "enqueue_max_us": enqueue[-1] * 1e6,
+        "ui_thread_seconds": queued,
+        "committed_per_second": writes / committed,
+    }
+    store.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure history_store page loads and writes at scale.")
+    parser.add_argument("--users", type=int, default=2000, help="users to seed")
+    parser.add_argument("--entries", type=int, default=500, help="journal entries (and chat messages) per user")
+    parser.add_argument("--repeat", type=int, default=200, help="page loads per measurement")
+    parser.add_argument("--writes", type=int, default=20000, help="messages queued from the calling thread")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/history-<commit>.json)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "history.sqlite3")
+        started = time.perf_counter()
+        seed(path, args.users, args.entries)
+        print(f"Seeded {args.users:,} users x {args.entries:,} entries and messages in {time.perf_counter() - started:.1f}s "
+              f"({os.path.getsize(path) / 1e6:,.0f} MB)")
+        results = measure(path, args.users, args.repeat, args.writes)
+
+    for name in ("open_page", "page_back_3", "trends_scan", "trends_rebuild", "trends_revisit"):
+        print(f"  {name:<14} p50 {results[name]['p50_ms']:>7.3f} ms   p95 {results[name]['p95_ms']:>7.3f} ms")
+    writes = results["writes"]
+    print(
+        f"  {writes['count']:,} writes: {writes['enqueue_p50_us']:.1f} us median on the calling thread "
+        f"(max {writes['enqueue_max_us']:.0f} us), {writes['committed_per_second']:,.0f} rows/s committed"
+    )
+    results.update(users=args.users, entries_per_user=args.entries)
+    print(f"Saved {save_results('history', results, args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
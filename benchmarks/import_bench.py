@@ -0,0 +1,105 @@
+"""Throughput of bulk journal import against one-entry-at-a-time scoring.
+
+    python -m benchmarks.import_bench --entries 20000 --workers 1 4
+
+Writes a synthetic CSV export of ``--entries`` entries and imports it into fresh databases:
+
+* per_entry: what the Journal page does for each submission, minus the LLM call: score with the
+  shared analyzer, pick the mood with if/elif, queue one entry;
+* import_<n>: ``journal_import.import_records`` with ``n`` scoring processes.
+
+Every run is timed until the store has committed the last entry. Results are entries per second.
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks.common import save_results
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+WORDS = (
+    "today I felt calm tired anxious hopeful grateful overwhelmed happy sad proud lonely rested "
+    "work was stressful but the walk helped and dinner with friends was lovely not great slept badly "
+    "really good progress on my project worried about tomorrow"
+).split()
+
+
+def write_export(path, entries, seed=0):
+    rng = random.Random(seed)
+    first = date.today() - timedelta(days=entries)
+    with open(path, "w", newline="") as export:
+        writer = csv.writer(export)
+        writer.writerow(["date", "entry"])
+        for number in range(entries):
+            sentences = (" ".join(rng.choices(WORDS, k=rng.randint(8, 20))) for _ in range(rng.randint(2, 6)))
+            writer.writerow([(first + timedelta(days=number)).isoformat(), ". ".join(sentences) + "."])
+
+
+def per_entry(store, path):
+    from journal_import import read_records
+
+    import shared_resources
+
+    analyzer = shared_resources.sentiment_analyzer()
+    started = time.perf_counter()
+    imported = 0
+    with open(path, "rb") as export:
+        for day, text in read_records(path, export):
+            compound = analyzer.polarity_scores(text)["compound"]
+            if compound > 0.2:
+                mood = "Positive"
+            elif compound < -0.2:
+                mood = "Negative"
+            else:
+                mood = "Neutral"
+            store.append_entry("bench", {"date": day, "entry": text, "mood": mood, "sentiment": compound, "encouragement": ""})
+            imported += 1
+    store.flush()
+    return imported, time.perf_counter() - started
+
+
+def bulk(store, path, workers):
+    from journal_import import import_records, read_records
+
+    with open(path, "rb") as export:
+        stats = import_records(store, "bench", read_records(path, export), max_workers=workers)
+    return stats["imported"], stats["seconds"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bulk journal import throughput.")
+    parser.add_argument("--entries", type=int, default=20000, help="entries in the synthetic export")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1], help="scoring processes to try")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/import-<commit>.json)")
+    args = parser.parse_args()
+
+    from history_store import HistoryStore
+
+    results = {"entries": args.entries, "cpus": os.cpu_count()}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "export.csv")
+        write_export(path, args.entries)
+        print(f"{args.entries:,} entries ({os.path.getsize(path) / 1e6:.1f} MB CSV), {os.cpu_count()} CPUs")
+        runs = [("per_entry", per_entry)] + [
+            (f"import_{workers}", lambda store, path, workers=workers: bulk(store, path, workers))
+            for workers in dict.fromkeys(args.workers)
+        ]
+        for name, run in runs:
+            store = HistoryStore(os.path.join(directory, f"{name}.sqlite3"))
+            imported, seconds = run(store, path)
+            store.close()
+            results[name] = {"imported": imported, "seconds": seconds, "per_second": imported / seconds}
+            print(f"  {name:<12} {imported:>8,} entries  {seconds:>7.2f} s  {imported / seconds:>9,.0f} entries/s")
+    print(f"Saved {save_results('import', results, args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""Per-rerun overhead of building clients and models, before and after ``shared_resources``.
+
+    python -m benchmarks.rerun_bench --repeat 50 --requests 50
+
+"before" builds each object fresh, as the apps used to on every Streamlit rerun; "after" fetches
+it from ``shared_resources``. The request section sends sequential calls to the local stub API
+with a new client per call versus the pooled client and counts the TCP connections opened.
+Finally each app is rerun through ``AppTest`` to give the whole-script rerun time.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+from benchmarks.common import save_results
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def _median_ms(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def construction(repeat, base_url):
+    from langchain.chains.question_answering import load_qa_chain
+    from langchain_openai.chat_models import ChatOpenAI
+    from openai import OpenAI
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+    import docuquery_pipeline as pipeline
+    import shared_resources
+
+    settings = {**pipeline.LLM_SETTINGS, "streaming": True}
+    fresh = {
+        "sentiment_analyzer": lambda: SentimentIntensityAnalyzer(),
+        "openai_client": lambda: OpenAI(api_key="stub", base_url=base_url),
+        "chat_model_and_chain": lambda: load_qa_chain(
+            ChatOpenAI(openai_api_key="stub", base_url=base_url, **settings), chain_type="stuff"
+        ),
+    }
+    shared = {
+        "sentiment_analyzer": shared_resources.sentiment_analyzer,
+        "openai_client": lambda: shared_resources.openai_client("stub", base_url),
+        "chat_model_and_chain": lambda: shared_resources.qa_chain(
+            shared_resources.chat_model("stub", base_url, **settings)
+        ),
+    }
+    rows = {}
+    for name in fresh:
+        rows[name] = {"before_ms": _median_ms(fresh[name], repeat), "after_ms": _median_ms(shared[name], repeat)}
+    return rows
+
+
+def requests(count, server, base_url):
+    from openai import OpenAI
+
+    import shared_resources
+
+    state = server.RequestHandlerClass.state
+
+    def run(client_for_call):
+        connections = state.connections
+        started = time.perf_counter()
+        for number in range(count):
+            client_for_call().embeddings.create(model="text-embedding-ada-002", input=[f"question {number}"])
+        return {
+            "ms_per_request": (time.perf_counter() - started) / count * 1000,
+            "connections": state.connections - connections,
+        }
+
+    return {
+        "before": run(lambda: OpenAI(api_key="stub", base_url=base_url)),
+        "after": run(lambda: shared_resources.openai_client("stub", base_url)),
+    }
+
+
+def app_reruns(repeat):
+    from streamlit.testing.v1 import AppTest
+
+    rows = {}
+    for script in ("chatbot.py", "DocuQuery_Insightful_Assistant.py", "mental_health.py", "mental_health_journal.py"):
+        app = AppTest.from_file(os.path.join(REPO_ROOT, script), default_timeout=120)
+        app.secrets["OPEN_API_KEY"] = "stub"
+        app.run()
+        rows[script] = {"rerun_ms": _median_ms(app.run, repeat)}
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-rerun construction and connection overhead.")
+    parser.add_argument("--repeat", type=int, default=30, help="samples per measurement (median is reported)")
+    parser.add_argument("--requests", type=int, default=50, help="sequential API calls per client strategy")
+    parser.add_argument("--no-apps", action="store_true", help="skip the AppTest rerun timings")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/rerun-<commit>.json)")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+    # The apps open a throwaway history database, never the real .cache one
+    directory = tempfile.TemporaryDirectory()
+    os.environ["GENAI_HISTORY_DB"] = os.path.join(directory.name, "history.sqlite3")
+
+    import shared_resources
+    import stub_openai_server
+
+    server = stub_openai_server.serve(state=stub_openai_server.StubState(dim=64))
+    base_url = stub_openai_server.base_url(server)
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    results = {"construction": construction(args.repeat, base_url), "requests": requests(args.requests, server, base_url)}
+    print("Construction per rerun")
+    for name, row in results["construction"].items():
+        print(f"  {name:<24}{row['before_ms']:>10.3f} ms -> {row['after_ms']:>8.3f} ms")
+    print(f"{args.requests} sequential requests")
+    for label, row in results["requests"].items():
+        print(f"  {label:<24}{row['ms_per_request']:>10.2f} ms/request  {row['connections']:>4} connections")
+    if not args.no_apps:
+        results["apps"] = app_reruns(args.repeat)
+        print("Whole-script rerun")
+        for script, row in results["apps"].items():
+            print(f"  {script:<36}{row['rerun_ms']:>8.1f} ms")
+    server.shutdown()
+    shared_resources.clear()
+    directory.cleanup()
+
+    print(f"Saved {save_results('rerun', results, args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Load test of ``request_scheduler`` against a rate-limited stub API.
+
+    python -m benchmarks.scheduler_bench --rpm 1200 --sessions 6 --ingest 4 --duration 20
+
+The stub accepts at most ``--rpm`` requests in any trailing minute and answers the rest with 429s.
+Interactive "sessions" send chat completions, and "ingest" workers send embedding batches as fast
+as they can. Both run twice, for ``--duration`` seconds each:
+
+* unscheduled: every thread calls the API directly, with the SDK's own retries;
+* scheduled: every call goes through one ``RequestScheduler`` sized to the same limit.
+
+The report covers successful requests per second, with their spread across the run, plus 429s,
+failed calls and interactive latency. Those show whether throughput holds at the limit or
+collapses once the minute's allowance is spent.
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+import warnings
+
+from benchmarks.common import save_results
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else None
+
+
+def run(mode, args):
+    from openai import OpenAI
+
+    import stub_openai_server
+    from request_scheduler import BACKGROUND, INTERACTIVE, RequestScheduler
+
+    state = stub_openai_server.StubState(dim=64, latency=args.latency, requests_per_minute=args.rpm)
+    server = stub_openai_server.serve(state=state)
+    base_url = stub_openai_server.base_url(server)
+    scheduled = mode == "scheduled"
+    # The scheduled run leaves retries to the scheduler, as shared_resources does
+    client = OpenAI(api_key="stub", base_url=base_url, max_retries=0 if scheduled else 2)
+    scheduler = RequestScheduler(args.rpm, name="bench", burst_seconds=args.burst) if scheduled else None
+
+    started = time.monotonic()
+    deadline = started + args.duration
+    completions = []  # (seconds since start, kind)
+    latencies = {"interactive": [], "background": []}
+    failures = {"interactive": 0, "background": 0}
+    lock = threading.Lock()
+
+    def chat():
+        return client.chat.completions.create(
+            model="gpt-3.5-turbo", messages=[{"role": "user", "content": "How can I sleep better?"}], max_tokens=50
+        )
+
+    def embed():
+        return client.embeddings.create(model="text-embedding-ada-002", input=[f"chunk {n}" for n in range(16)])
+
+    def worker(kind, function, priority, think_time):
+        while time.monotonic() < deadline:
+            began = time.monotonic()
+            try:
+                if scheduler is None:
+                    function()
+                else:
+                    scheduler.call(function, priority=priority, stage=kind)
+            except Exception:
+                with lock:
+                    failures[kind] += 1
+            else:
+                finished = time.monotonic()
+                with lock:
+                    completions.append((finished - started, kind))
+                    latencies[kind].append(finished - began)
+            if think_time:
+                time.sleep(think_time)
+
+    threads = [
+        threading.Thread(target=worker, args=("interactive", chat, INTERACTIVE, args.think_time))
+        for _ in range(args.sessions)
+    ] + [threading.Thread(target=worker, args=("background", embed, BACKGROUND, 0.0)) for _ in range(args.ingest)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    # Only requests that finished inside the run count towards throughput
+    per_second = [0] * int(args.duration)
+    for offset, _ in completions:
+        if offset < args.duration:
+            per_second[int(offset)] += 1
+    steady = per_second[1:]
+    interactive = latencies["interactive"]
+    return {
+        "succeeded": sum(per_second),
+        "per_second_mean": statistics.mean(steady),
+        "per_second_stdev": statistics.pstdev(steady),
+        "per_second_min": min(steady),
+        "per_second": per_second,
+        "rate_limited_responses": state.rejected,
+        "failed": failures,
+        "background_succeeded": sum(1 for offset, kind in completions if kind == "background" and offset < args.duration),
+        "interactive_p50_ms": (_percentile(interactive, 0.50) or 0) * 1000,
+        "interactive_p95_ms": (_percentile(interactive, 0.95) or 0) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the request scheduler against a rate-limited stub.")
+    parser.add_argument("--rpm", type=int, default=1200, help="stub and scheduler requests-per-minute limit")
+    parser.add_argument("--sessions", type=int, default=6, help="interactive chat threads")
+    parser.add_argument("--ingest", type=int, default=4, help="background embedding threads")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per run")
+    parser.add_argument("--think-time", type=float, default=0.5, help="pause between a session's requests")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub seconds per response")
+    parser.add_argument("--burst", type=float, default=1.0, help="scheduler burst allowance in seconds")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/scheduler-<commit>.json)")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    results = {"settings": vars(args)}
+    limit = args.rpm / 60.0
+    print(f"limit {limit:.1f} requests/s, {args.sessions} sessions + {args.ingest} ingest workers, {args.duration:.0f}s per run")
+    for mode in ("unscheduled", "scheduled"):
+        row = results[mode] = run(mode, args)
+        print(
+            f"  {mode:<12} {row['per_second_mean']:>6.1f}/s mean  stdev {row['per_second_stdev']:>5.1f}  "
+            f"min {row['per_second_min']:>3}/s  429s {row['rate_limited_responses']:>6}  "
+            f"failed {row['failed']['interactive'] + row['failed']['background']:>5}  "
+            f"chat p50 {row['interactive_p50_ms']:>6.0f} ms  p95 {row['interactive_p95_ms']:>6.0f} ms  "
+            f"ingest {row['background_succeeded']}"
+        )
+        print(f"  {'':<12} per second: {' '.join(str(count) for count in row['per_second'])}")
+    print(f"Saved {save_results('scheduler', results, args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""Journal search latency over years of daily entries, against the stub embeddings API.
+
+    python -m benchmarks.search_bench --years 1 5 10
+
+For each history length, a fresh store gets ``--per-day`` entries a day, then:
+
+* build: ``JournalIndex.sync`` embeds every entry into an empty index;
+* incremental: one more entry is written and synced, as after a Journal submission;
+* load: a new index reads the saved vectors back from disk;
+* search: mean time of ``JournalIndex.search``, unfiltered and filtered to the last year's
+  negative entries, with the query vector cached as on a rerun;
+* uncached: the same unfiltered scan when every query reads the vectors back from SQLite.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+from datetime import date, timedelta
+
+from benchmarks.common import save_results
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+QUERY = "worried about work and slept badly"
+MOODS = ["Positive", "Neutral", "Negative"]
+
+
+def seed(store, user, years, per_day, rng):
+    from benchmarks.import_bench import WORDS
+
+    first = date.today() - timedelta(days=int(years * 365))
+    days = int(years * 365)
+    entries = []
+    for day in range(days * per_day):
+        text = ". ".join(" ".join(rng.choices(WORDS, k=rng.randint(8, 20))) for _ in range(rng.randint(2, 5))) + "."
+        entries.append({
+            "date": (first + timedelta(days=day // per_day)).isoformat(),
+            "entry": text,
+            "mood": rng.choice(MOODS),
+            "sentiment": 0.0,
+            "encouragement": "",
+        })
+    store.append_entries(user, entries)
+    store.flush()
+    return len(entries)
+
+
+def timed(function, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - started) / repeat
+
+
+def uncached_search(index, user, query, k):
+    # Without the in-memory matrix: read every vector back per query, then the same scan
+    import numpy as np
+
+    rows = index._conn.execute("SELECT entry_id, vector FROM journal_vectors WHERE user = ?", (user,)).fetchall()
+    matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+    scores = matrix @ query
+    return np.argpartition(-scores, k - 1)[:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure journal search index build and query latency.")
+    parser.add_argument("--years", type=float, nargs="+", default=[1, 5, 10], help="history lengths to try")
+    parser.add_argument("--per-day", type=int, default=1, help="entries written per day")
+    parser.add_argument("--searches", type=int, default=200, help="queries averaged per measurement")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub seconds added to every request")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/search-<commit>.json)")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    import stub_openai_server
+
+    server = stub_openai_server.serve(state=stub_openai_server.StubState(latency=args.latency))
+    base_url = stub_openai_server.base_url(server)
+    results = {"settings": vars(args), "runs": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        from embedding_pipeline import OpenAIEmbeddingBackend, PipelineEmbeddings
+        from embedding_store import CachedEmbeddings, EmbeddingStore
+        from history_store import HistoryStore
+        from journal_search import JournalIndex
+
+        embeddings = CachedEmbeddings(
+            PipelineEmbeddings(OpenAIEmbeddingBackend("stub", base_url=base_url)),
+            EmbeddingStore(os.path.join(directory, "embeddings.sqlite3")),
+        )
+        for years in args.years:
+            name = f"{years:g}y"
+            store = HistoryStore(os.path.join(directory, f"{name}.sqlite3"))
+            entries = seed(store, "bench", years, args.per_day, random.Random(0))
+            path = os.path.join(directory, f"{name}-index.sqlite3")
+            index = JournalIndex(store, lambda: embeddings, path)
+
+            _, build = timed(lambda: index.sync("bench"))
+            store.append_entry("bench", {"date": date.today().isoformat(), "entry": QUERY, "mood": "Negative", "sentiment": 0.0, "encouragement": ""})
+            _, incremental = timed(lambda: index.schedule_sync("bench").result())
+            reloaded = JournalIndex(store, lambda: embeddings, path)
+            _, load = timed(lambda: reloaded.count("bench"))
+
+            last_year = (date.today() - timedelta(days=365)).isoformat()
+            (best, _), _ = timed(lambda: index.search("bench", QUERY)[0])
+            _, search = timed(lambda: index.search("bench", QUERY), args.searches)
+            _, filtered = timed(lambda: index.search("bench", QUERY, start=last_year, moods=["Negative"]), args.searches)
+            query = index._embed_query(QUERY)
+            _, uncached = timed(lambda: uncached_search(index, "bench", query, 5), args.searches)
+            reloaded.close()
+            index.close()
+            store.close()
+
+            run = results["runs"][name] = {
+                "entries": entries + 1,
+                "build_seconds": build,
+                "incremental_ms": incremental * 1000,
+                "load_ms": load * 1000,
+                "search_ms": search * 1000,
+                "filtered_ms": filtered * 1000,
+                "uncached_ms": uncached * 1000,
+                "exact_match_score": best,
+            }
+            print(
+                f"  {name:>4} {run['entries']:>7,} entries  build {build:>6.2f} s  incremental {run['incremental_ms']:>6.1f} ms  "
+                f"load {run['load_ms']:>6.1f} ms  search {run['search_ms']:>6.2f} ms  filtered {run['filtered_ms']:>6.2f} ms  "
+                f"uncached {run['uncached_ms']:>6.2f} ms  top score {best:.3f}"
+            )
+    server.shutdown()
+    print(f"Saved {save_results('search', results, args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Throughput, memory and output equality of the offset splitter against LangChain's.
+
+    python -m benchmarks.splitter_bench --pages 100 1000 5000
+
+Page texts come from the synthetic PDFs in ``benchmarks.common`` (extracted once, outside the
+timings). Each splitter runs on the same pages; peak allocation is measured with ``tracemalloc``
+in a second, untimed pass. Chunks and ``start_index`` values must match exactly, on the documents
+and on a randomized set of edge-case texts; any difference fails the run.
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import make_synthetic_pdf, save_results
+
+SETTINGS = {"chunk_size": 400, "chunk_overlap": 150}
+
+
+def _measure(function):
+    # Timed without tracemalloc, which slows allocation-heavy code; then run again for the peak
+    started = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+
+def _as_rows(documents):
+    return [(document.page_content, document.metadata) for document in documents]
+
+
+def edge_case_mismatches(trials, seed=0):
+    """Compare both splitters on random texts full of blank lines, long lines and repeats."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    from offset_splitter import OffsetTextSplitter
+
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(trials):
+        size = rng.choice([5, 10, 40, 100, 400])
+        overlap = rng.randint(0, size)
+        reference = RecursiveCharacterTextSplitter(
+            separators=["\n"], chunk_size=size, chunk_overlap=overlap, add_start_index=True, length_function=len
+        )
+        splitter = OffsetTextSplitter("\n", size, overlap)
+        alphabet = ["a", "b", " ", "\n", "\n\n", "  \n", "\t", "word ", "x" * rng.randint(1, size * 2), "ab\nab\n"]
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 200)))
+        if _as_rows(reference.create_documents([text])) != _as_rows(splitter.create_documents([text])):
+            mismatches += 1
+    return mismatches
+
+
+def run_document(pages):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    from offset_splitter import OffsetTextSplitter
+
+    texts = [text for _, text in pages]
+    metadatas = [{"page": number} for number, _ in pages]
+    reference = RecursiveCharacterTextSplitter(separators=["\n"], add_start_index=True, length_function=len, **SETTINGS)
+    splitter = OffsetTextSplitter("\n", add_start_index=True, **SETTINGS)
+
+    stages = {}
+    expected, seconds, peak = _measure(lambda: reference.create_documents(texts, metadatas))
+    stages["langchain_documents"] = {"seconds": seconds, "peak_mb": peak, "chunks": len(expected)}
+    documents, seconds, peak = _measure(lambda: splitter.create_documents(texts, metadatas))
+    stages["offset_documents"] = {"seconds": seconds, "peak_mb": peak, "chunks": len(documents)}
+    spans, seconds, peak = _measure(lambda: list(splitter.split_pages(pages)))
+    stages["offset_spans"] = {"seconds": seconds, "peak_mb": peak, "chunks": len(spans)}
+    for numbers in stages.values():
+        numbers["chunks_per_second"] = numbers["chunks"] / numbers["seconds"] if numbers["seconds"] else None
+    return stages, _as_rows(expected) == _as_rows(documents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the offset splitter against RecursiveCharacterTextSplitter.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 1000, 5000], help="synthetic document sizes")
+    parser.add_argument("--edge-cases", type=int, default=2000, help="random edge-case texts to compare")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/splitter-<commit>.json)")
+    args = parser.parse_args()
+
+    from pdf_extract import iter_page_texts
+
+    results, failed = [], False
+    for page_count in args.pages:
+        pages = list(iter_page_texts(make_synthetic_pdf(page_count, seed=page_count)))
+        stages, identical = run_document(pages)
+        failed |= not identical
+        results.append({"document": f"synthetic-{page_count}p", "identical": identical, "stages": stages})
+        print(f"synthetic-{page_count}p ({sum(len(text) for _, text in pages):,} chars) identical={identical}")
+        for stage, numbers in stages.items():
+            print(
+                f"  {stage:<22}{numbers['seconds']:>8.3f}s {numbers['peak_mb']:>8.1f} MiB peak "
+                f"{numbers['chunks_per_second']:>12,.0f} chunks/s"
+            )
+
+    mismatches = edge_case_mismatches(args.edge_cases)
+    failed |= bool(mismatches)
+    print(f"edge cases: {mismatches} of {args.edge_cases} differ")
+    print(f"Saved {save_results('splitter', {'documents': results, 'edge_case_mismatches': mismatches}, args.output)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Cold-start cost of each Streamlit app page, with a budget that fails the run on regressions.
+
+    python -m benchmarks.startup_bench
+    python -m benchmarks.startup_bench --repeat 5 --budget-scale 1.5
+
+Each target runs in a fresh interpreter through Streamlit's ``AppTest`` against the local stub
+API. The first script run is timed (the page a user lands on), or the run after switching to
+``page`` for multi-page apps. Besides wall time, each target lists modules that must not be
+imported by that page; loading one is a failure regardless of timing.
+"""
+import argparse
+import os
+import secrets
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from benchmarks.common import save_results
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_DOCUQUERY_HEAVY = ("langchain", "langchain_community", "langchain_openai", "faiss", "PyPDF2", "tiktoken")
+_JOURNAL_HEAVY = ("pandas", "matplotlib", "audiorecorder", "langchain_core")
+
+# (label, script, page, budget in seconds, modules the page must not import). Budgets leave
+# roughly 2x headroom over a laptop run; eager imports used to cost about 2 s per app.
+TARGETS = [
+    ("chatbot", "chatbot.py", None, 0.75, _DOCUQUERY_HEAVY),
+    ("docuquery", "DocuQuery_Insightful_Assistant.py", None, 0.75, _DOCUQUERY_HEAVY),
+    ("journal", "mental_health_journal.py", None, 0.75, _JOURNAL_HEAVY + ("openai", "vaderSentiment")),
+    ("journal:chatbot", "mental_health_journal.py", "Chatbot", 0.25, _JOURNAL_HEAVY + ("vaderSentiment",)),
+    # The first chart pays for pandas and matplotlib
+    ("journal:mood_trends", "mental_health_journal.py", "Mood Trends", 2.5, ("audiorecorder", "langchain_core", "openai")),
+]
+
+
+def measure(script, page, forbidden):
+    """Run one target in this (fresh) process and return ``(seconds, forbidden modules loaded)``."""
+    sys.path.insert(0, REPO_ROOT)
+    import stub_openai_server
+    from streamlit.testing.v1 import AppTest
+
+    server = stub_openai_server.serve()
+    os.environ["OPENAI_BASE_URL"] = stub_openai_server.base_url(server)
+    # A throwaway history database with one journal entry, so Mood Trends has a chart to draw
+    directory = tempfile.TemporaryDirectory()
+    os.environ["GENAI_HISTORY_DB"] = os.path.join(directory.name, "history.sqlite3")
+    from history_store import HistoryStore
+    from user_identity import browser_key
+
+    token = secrets.token_urlsafe(24)
+    store = HistoryStore(os.environ["GENAI_HISTORY_DB"])
+    store.append_entry(browser_key(token), {"date": "2024-01-01", "entry": "ok", "mood": "Neutral", "sentiment": 0.0, "encouragement": ""})
+    store.close()
+    app = AppTest.from_file(os.path.join(REPO_ROOT, script), default_timeout=120)
+    app.secrets["OPEN_API_KEY"] = "stub"
+    app.query_params["user"] = token
+
+    started = time.perf_counter()
+    app.run()
+    if page is not None:
+        app.sidebar.radio[0].set_value(page)
+        started = time.perf_counter()
+        app.run()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    directory.cleanup()
+    if app.exception:
+        raise RuntimeError(f"{script} raised: {app.exception[0].value}")
+    if page == "Mood Trends" and not app.get("image"):
+        # Without a chart the timing leaves out pandas and matplotlib
+        raise RuntimeError(f"{script} drew no mood chart: {[info.value for info in app.info]}")
+    loaded = sorted(name for name in forbidden if name in sys.modules)
+    return elapsed, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check Streamlit app cold-start time against a budget.")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh-process runs per target (median is used)")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="multiply every budget, e.g. on slow CI")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/startup-<commit>.json)")
+    args = parser.parse_args()
+
+    results, failures = [], []
+    for label, script, page, budget, forbidden in TARGETS:
+        samples, loaded = [], []
+        for _ in range(args.repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                seconds, loaded = pool.submit(measure, script, page, forbidden).result()
+            samples.append(seconds)
+        median = statistics.median(samples)
+        limit = budget * args.budget_scale
+        ok = median <= limit and not loaded
+        results.append({"target": label, "seconds": median, "samples": samples, "budget": limit, "unexpected_imports": loaded})
+        status = "ok" if ok else "FAIL"
+        extra = f"  imported {', '.join(loaded)}" if loaded else ""
+        print(f"  {label:<22}{median * 1000:>8.0f} ms  budget {limit * 1000:>6.0f} ms  {status}{extra}")
+        if not ok:
+            failures.append(label)
+
+    print(f"Saved {save_results('startup', results, args.output)}")
+    if failures:
+        print(f"Startup budget exceeded: {', '.join(failures)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
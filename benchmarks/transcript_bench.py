@@ -0,0 +1,139 @@
+"""Rerun time of the chat transcript at growing conversation lengths.
+
+    python -m benchmarks.transcript_bench --messages 10 100 1000
+
+For each length a session is seeded with that many messages and rerun through ``AppTest``:
+"legacy" is the old one-``st.markdown``-per-message loop, "transcript" is ``transcript.Transcript``
+on its own, and "mental_health.py" is the whole app, opening the same conversation from a throwaway
+history database (it shows the newest page). Only the first runs pay for rendering the bubbles,
+so the medians of later reruns should stay flat as the history grows.
+"""
+import argparse
+import logging
+import os
+import secrets
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+from benchmarks.common import save_results
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def legacy_script():
+    import streamlit as st
+
+    for message in st.session_state.chat_history:
+        if message["role"] == "user":
+            st.markdown(f'<div class="user-bubble">{message["content"]}</div>', unsafe_allow_html=True)
+        elif message["role"] == "assistant":
+            st.markdown(f'<div class="ai-bubble">{message["content"]}</div>', unsafe_allow_html=True)
+
+
+def transcript_script():
+    import streamlit as st
+
+    from transcript import Transcript
+
+    if "transcript" not in st.session_state:
+        st.session_state.transcript = Transcript({
+            "user": '<div class="user-bubble">{}</div>',
+            "assistant": '<div class="ai-bubble">{}</div>',
+        })
+    st.session_state.transcript.render(st.session_state.chat_history)
+
+
+def make_history(count):
+    return [
+        {
+            "role": "user" if number % 2 == 0 else "assistant",
+            "content": f"Message {number}: I have been <b>sleeping badly</b> & worrying about work again. " * 3,
+        }
+        for number in range(count)
+    ]
+
+
+def seed_conversation(history):
+    """Store ``history`` as a new user's conversation and return the token that opens it."""
+    import shared_resources
+    from user_identity import browser_key
+
+    token = secrets.token_urlsafe(24)
+    store = shared_resources.history_store()
+    user = browser_key(token)
+    session = store.new_session(user, "mental_health")
+    for message in history:
+        store.append_message(user, session, message["role"], message["content"])
+    store.flush()
+    return token
+
+
+def rerun_ms(app, history, repeat):
+    if history is not None:
+        app.session_state["chat_history"] = history
+    app.run()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        app.run()
+        samples.append(time.perf_counter() - started)
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    return statistics.median(samples) * 1000, len(app.markdown)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure transcript rerun time against conversation length.")
+    parser.add_argument("--messages", type=int, nargs="+", default=[10, 100, 1000], help="conversation lengths")
+    parser.add_argument("--repeat", type=int, default=15, help="reruns per measurement (median is reported)")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/transcript-<commit>.json)")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+    # The app's collapsed text input logs an empty-label warning on every run
+    logging.disable(logging.WARNING)
+
+    from streamlit.testing.v1 import AppTest
+
+    import shared_resources
+    import stub_openai_server
+
+    server = stub_openai_server.serve(state=stub_openai_server.StubState(dim=64))
+    os.environ["OPENAI_BASE_URL"] = stub_openai_server.base_url(server)
+    # The app reads its conversation from the history database, never from the real .cache
+    directory = tempfile.TemporaryDirectory()
+    os.environ["GENAI_HISTORY_DB"] = os.path.join(directory.name, "history.sqlite3")
+
+    results = []
+    print(f"{'messages':>8} {'legacy':>12} {'transcript':>12} {'mental_health.py':>18}")
+    for count in args.messages:
+        history = make_history(count)
+        row = {"messages": count}
+        targets = {
+            "legacy": AppTest.from_function(legacy_script, default_timeout=120),
+            "transcript": AppTest.from_function(transcript_script, default_timeout=120),
+            "app": AppTest.from_file(os.path.join(REPO_ROOT, "mental_health.py"), default_timeout=120),
+        }
+        targets["app"].secrets["OPEN_API_KEY"] = "stub"
+        targets["app"].query_params["user"] = seed_conversation(history)
+        for name, app in targets.items():
+            milliseconds, elements = rerun_ms(app, None if name == "app" else history, args.repeat)
+            row[name] = {"rerun_ms": milliseconds, "markdown_elements": elements}
+        results.append(row)
+        print(
+            f"{count:>8} {row['legacy']['rerun_ms']:>9.1f} ms {row['transcript']['rerun_ms']:>9.1f} ms "
+            f"{row['app']['rerun_ms']:>15.1f} ms"
+        )
+    server.shutdown()
+    shared_resources.clear()
+    directory.cleanup()
+
+    print(f"Saved {save_results('transcript', results, args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,12 @@
 import streamlit as st
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain.chains.question_answering import load_qa_chain
-from langchain_openai.chat_models import ChatOpenAI
-from langchain_community.vectorstores import FAISS
 from dotenv import load_dotenv
 import os
 
+import metrics
+from answer_cache import DEFAULT_SIMILARITY_THRESHOLD, AnswerCache
+from request_scheduler import SchedulerBusy
+from streaming import StreamTimer, render_debug_panel
+
 # # Load environment variables
 # load_dotenv()
 # # Access the OpenAI API key
@@ -19,64 +18,187 @@ open_api_key = st.secrets["OPEN_API_KEY"]
 if not open_api_key:
     raise ValueError("API key not found. Please set OPEN_API_KEY in Streamlit Secrets.")
 
+# Stage timings and counters are labelled with the app name when exported
+metrics.configure(app="chatbot")
+
+
+@st.cache_resource
+def get_index_cache():
+    from index_cache import IndexCache
+
+    # One on-disk cache shared by every session of this process
+    return IndexCache()
+
+
+@st.cache_resource
+def get_embedding_store():
+    from embedding_store import EmbeddingStore
+
+    # Per-chunk vectors shared across documents, revisions and sessions
+    return EmbeddingStore()
+
+
+@st.cache_resource
+def get_answer_cache():
+    # Answers are shared by every session asking about the same documents
+    return AnswerCache()
+
+
+@st.cache_resource(max_entries=32)
+def get_retriever(fingerprint, _vector_store):
+    from hybrid_search import HybridRetriever
+
+    # BM25 postings are built once per index version and shared across sessions. Only for cached
+    # single-file indexes, which never change once built
+    return HybridRetriever(_vector_store)
+
+
+def get_corpus_retriever(corpus):
+    from hybrid_search import HybridRetriever
+
+    # A corpus store belongs to one session and changes in place as documents come and go, so its
+    # retriever stays in that session and is rebuilt whenever the documents or the store change
+    key = (corpus.fingerprint(), id(corpus.vector_store))
+    cached = st.session_state.get("corpus_retriever")
+    if cached is None or cached[0] != key:
+        cached = st.session_state.corpus_retriever = (key, HybridRetriever(corpus.vector_store))
+    return cached[1]
+
+
 # App header
 st.title("📄 DocuQuery AI")
 st.subheader("Ask Questions and Extract Insights from Your Documents Effortlessly")
 
 # Sidebar for file upload
 st.sidebar.header("Upload Document")
-uploaded_file = st.sidebar.file_uploader("Upload a PDF file to get started", type="pdf")
+corpus_mode = st.sidebar.toggle("Corpus mode", help="Index several PDFs together and search across them.")
+if corpus_mode:
+    uploaded_files = st.sidebar.file_uploader("Upload PDF files to build a corpus", type="pdf", accept_multiple_files=True)
+else:
+    uploaded_file = st.sidebar.file_uploader("Upload a PDF file to get started", type="pdf")
+    uploaded_files = [uploaded_file] if uploaded_file else []
 
-if uploaded_file:
-    # Extract text from uploaded PDF
-    pdf_reader = PdfReader(uploaded_file)
-    document_text = ""
-    for page in pdf_reader.pages:
-        document_text += page.extract_text()
+if uploaded_files:
+    # LangChain, FAISS and PyPDF2 are only loaded once there is a document to work on
+    import docuquery_pipeline as pipeline
+    from corpus_index import CorpusIndex, document_id
+    from stream_callbacks import PlaceholderStreamHandler
 
     # Display success message
     st.sidebar.success("Document uploaded successfully!")
 
-    # Split text into manageable chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        separators=["\n"],
-        chunk_size=400,
-        chunk_overlap=150,
-        length_function=len,
+    # Uncached chunks are embedded in concurrent batches with progress in the sidebar
+    embedding_progress = st.sidebar.empty()
+    embeddings = pipeline.make_embeddings(
+        open_api_key,
+        get_embedding_store(),
+        on_progress=lambda done, total: embedding_progress.progress(done / total, text=f"Embedded {done}/{total} chunks"),
     )
-    chunks = text_splitter.split_text(document_text)
 
-    # Generate embeddings for text chunks
-    embeddings = OpenAIEmbeddings(openai_api_key=open_api_key)
-    vector_store = FAISS.from_texts(chunks, embeddings)
+    if corpus_mode:
+        # Only newly uploaded files are embedded; removed files drop their vectors
+        if "corpus" not in st.session_state:
+            st.session_state.corpus = CorpusIndex(
+                embeddings, index_mode=pipeline.INDEX_SETTINGS["mode"], index_params=pipeline.SEARCH_SETTINGS
+            )
+        corpus = st.session_state.corpus
+        corpus.embeddings = embeddings
+        uploads = {document_id(f.getvalue()): f for f in uploaded_files}
+        corpus.sync(
+            {doc_id: f.name for doc_id, f in uploads.items()},
+            lambda doc_id: pipeline.split_pdf(uploads[doc_id].getvalue()),
+        )
+        selected_docs = st.sidebar.multiselect(
+            "Search within",
+            list(corpus.documents),
+            format_func=lambda doc_id: corpus.documents[doc_id]["source"],
+            placeholder="All documents",
+        )
+        fingerprint = corpus.fingerprint(selected_docs)
+        retriever = get_corpus_retriever(corpus)
+    else:
+        # Reuse the cached index for this file and settings, building it only on a miss
+        vector_store, fingerprint = pipeline.load_index(get_index_cache(), uploaded_file.getvalue(), embeddings)
+        retriever = get_retriever(fingerprint, vector_store)
+        selected_docs = None
+    embedding_stats = embeddings.underlying.stats
+    if embedding_stats.chunks:
+        embedding_progress.empty()
+        st.sidebar.metric("Embedding throughput", f"{embedding_stats.chunks_per_second:.1f} chunks/sec")
 
     # Main app functionality
     st.header("🔍 Document Query")
     user_question = st.text_input("Type your question below:", placeholder="e.g., What is this document about?")
 
     if user_question:
-        # Perform similarity search for relevant chunks
-        matched_chunks = vector_store.similarity_search(user_question, k=3)
-
-        # Initialize the LLM
-        llm = ChatOpenAI(
-            openai_api_key=open_api_key,
-            temperature=0,
-            max_tokens=1000,
-            model_name="gpt-3.5-turbo",
-        )
-
-        # Load QA chain
-        chain = load_qa_chain(llm, chain_type="stuff")
-        response = chain.run(input_documents=matched_chunks, question=user_question)
-
-        # Display the response
-        st.write("### 📜 Answer:")
-        st.write(response)
+        try:
+            # Repeated or near-identical questions about the same documents skip search and the LLM
+            answer_cache = get_answer_cache()
+            response = answer_cache.get_exact(fingerprint, user_question)
+            question_vector = None
+            if response is None:
+                # Identifier-style queries go straight to the lexical index without an embedding call
+                if retriever.wants_lexical_only(user_question):
+                    answer_cache.record_miss()
+                else:
+                    question_vector = embeddings.embed_query(user_question)
+                    response = answer_cache.get_similar(
+                        fingerprint, question_vector, st.session_state.get("answer_similarity", DEFAULT_SIMILARITY_THRESHOLD)
+                    )
+
+            st.write("### 📜 Answer:")
+            if response is not None:
+                st.write(response)
+            else:
+                # Fuse lexical and vector matches, then merge overlapping chunks into a token budget
+                matched_chunks, _, prompt_tokens = pipeline.retrieve(
+                    retriever, user_question, query_vector=question_vector, doc_ids=selected_docs
+                )
+                st.session_state.last_prompt_tokens = prompt_tokens
+
+                # Display the response as it streams in
+                answer_placeholder = st.empty()
+                timer = StreamTimer()
+
+                # The streaming LLM is shared by the whole process; tokens reach this session via the callback
+                llm = pipeline.make_llm(open_api_key, streaming=True)
+
+                # Run the QA chain
+                response = pipeline.answer(
+                    llm, matched_chunks, user_question, callbacks=[PlaceholderStreamHandler(answer_placeholder, timer)]
+                )
+                answer_placeholder.markdown(response)
+                citations = pipeline.format_citations(matched_chunks)
+                if citations:
+                    st.caption(f"Sources: {citations}")
+                st.session_state.last_stream_timer = timer
+                answer_cache.put(fingerprint, user_question, response, question_vector, timer.total_time or 0.0)
+        except SchedulerBusy as e:
+            # The shared request queue is full; nothing was sent for this question
+            st.warning(str(e))
 
 else:
     st.info("Please upload a PDF file to start querying.")
 
+render_debug_panel(
+    st.session_state.get("last_stream_timer"),
+    {"Prompt tokens (context + question)": st.session_state.get("last_prompt_tokens", "n/a")},
+    registry=metrics.REGISTRY,
+)
+with st.sidebar.expander("Answer cache"):
+    # Per session; the lookup above reads it from session state
+    st.slider(
+        "Similar-question threshold",
+        min_value=0.80,
+        max_value=1.0,
+        value=DEFAULT_SIMILARITY_THRESHOLD,
+        step=0.01,
+        key="answer_similarity",
+        help="Cosine similarity a new question needs to a cached one to reuse its answer.",
+    )
+    st.metric("Hit rate", f"{get_answer_cache().hit_rate:.0%}")
+    st.metric("Latency saved", f"{get_answer_cache().saved_seconds:.1f} s")
+
 # Footer
 st.markdown("---")
 st.markdown("DocuQuery AI | Powered by OpenAI and LangChain")
@@ -0,0 +1,70 @@
+"""Merge overlapping retrieved chunks into contiguous spans and pack them into a token budget."""
+from langchain_core.documents import Document
+
+from tokens import get_encoding
+
+DEFAULT_CONTEXT_TOKENS = 1500
+
+
+class _Span:
+    __slots__ = ("key", "start", "end", "text", "score", "metadata")
+
+    def __init__(self, key, start, text, score, metadata):
+        self.key = key
+        self.start = start
+        self.end = start + len(text)
+        self.text = text
+        self.score = score
+        self.metadata = metadata
+
+    def absorb(self, other):
+        # ``other`` starts inside or right at the end of this span
+        if other.end > self.end:
+            self.text += other.text[self.end - other.start:]
+            self.end = other.end
+        self.score = max(self.score, other.score)
+
+
+def merge_overlapping(documents):
+    """Collapse chunks from the same page whose ``start_index`` ranges touch; input is best-first."""
+    spans, groups = [], {}
+    for rank, document in enumerate(documents):
+        metadata = document.metadata
+        score = 1.0 / (rank + 1)
+        if "start_index" not in metadata:
+            spans.append(_Span(None, 0, document.page_content, score, metadata))
+            continue
+        key = (metadata.get("doc_id", metadata.get("source")), metadata.get("page"))
+        groups.setdefault(key, []).append(_Span(key, metadata["start_index"], document.page_content, score, metadata))
+
+    for members in groups.values():
+        members.sort(key=lambda span: span.start)
+        current = members[0]
+        for span in members[1:]:
+            if span.start <= current.end:
+                current.absorb(span)
+            else:
+                spans.append(current)
+                current = span
+        spans.append(current)
+    return spans
+
+
+def pack_context(documents, budget=DEFAULT_CONTEXT_TOKENS, encoding_name="cl100k_base"):
+    """Return ``(documents, tokens)``: the best merged spans that fit in ``budget`` tokens."""
+    encoding = get_encoding(encoding_name)
+    packed, used = [], 0
+    for span in sorted(merge_overlapping(documents), key=lambda span: span.score, reverse=True):
+        tokens = encoding.encode(span.text, disallowed_special=())
+        if used + len(tokens) > budget:
+            if packed:
+                continue
+            # Never send an empty context; trim the best span to fit instead
+            tokens = tokens[:budget]
+            span.text = encoding.decode(tokens)
+        used += len(tokens)
+        metadata = dict(span.metadata)
+        if span.key is not None:
+            metadata["start_index"] = span.start
+        packed.append(Document(page_content=span.text, metadata=metadata))
+    return packed, used
@@ -0,0 +1,172 @@
+"""Token-budgeted chat memory: recent turns verbatim, older turns folded into a rolling summary.
+
+Prompts stay roughly constant in size however long a session runs. Messages the summary does not
+cover yet are sent verbatim while they fit the token budget. Summaries are produced on a background
+thread after a reply has been sent, so turns normally do not wait on the summarization call; only
+when the budget would leave out a whole unsummarized batch is it folded before the reply.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import shared_resources
+from request_scheduler import BACKGROUND
+from tokens import count_tokens
+
+# Most recent messages kept out of the summary, and the tokens all verbatim messages may use together
+RECENT_MESSAGES = 12
+HISTORY_TOKEN_BUDGET = 1500
+# Chat format overhead per message (role and separators), per OpenAI's token counting guide
+MESSAGE_OVERHEAD_TOKENS = 4
+# Older messages are folded in batches so summarization costs one call every few turns, not every turn
+SUMMARY_BATCH_MESSAGES = 6
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a supportive conversation between a user and a mental health "
+    "practitioner. Update the summary with the new messages. Keep the user's concerns, feelings, "
+    "important facts and any advice already given. Write at most 150 words in the third person."
+)
+
+# Shared by every session; summaries are small, infrequent calls
+_summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summarize")
+
+
+def make_openai_summarizer(get_client, model="gpt-3.5-turbo", max_tokens=300):
+    """Return ``summarize(summary, messages) -> str`` backed by a chat completion.
+
+    ``get_client()`` returns the OpenAI client. It is only called once there is something to
+    summarize, so creating a memory does not import ``openai``.
+    """
+    def summarize(summary, messages):
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        prompt = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+        ]
+        with metrics.span("summarize", messages=len(messages)):
+            # Background priority: replies to users are admitted first
+            response = shared_resources.request_scheduler("chat").call(
+                lambda: get_client().chat.completions.create(
+                    model=model, messages=prompt, max_tokens=max_tokens, temperature=0
+                ),
+                priority=BACKGROUND,
+                tokens=sum(count_tokens(message["content"]) for message in prompt) + max_tokens,
+                stage="summarize",
+            )
+        metrics.record_usage("summarize", response.usage)
+        return response.choices[0].message.content.strip()
+
+    return summarize
+
+
+class ConversationMemory:
+    """Builds each turn's prompt from an append-only ``history`` list of chat messages."""
+
+    def __init__(self, summarize, recent_messages=RECENT_MESSAGES, token_budget=HISTORY_TOKEN_BUDGET,
+                 summary_batch=SUMMARY_BATCH_MESSAGES):
+        self.summarize = summarize
+        self.recent_messages = recent_messages
+        self.token_budget = token_budget
+        self.summary_batch = summary_batch
+        self.summary = ""
+        # history[:summarized] is covered by ``summary``
+        self.summarized = 0
+        self.last_prompt_tokens = 0
+        self._counts = []
+        self._pending = None
+        self._generation = 0
+        # After a failed in-turn summary, the next one waits until another batch is left out
+        self._retry_from = 0
+        self._lock = threading.Lock()
+
+    def _message_tokens(self, history):
+        if len(history) < len(self._counts):
+            # History was cleared; start over
+            self.reset()
+        for message in history[len(self._counts):]:
+            self._counts.append(count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS)
+        return self._counts
+
+    def reset(self):
+        with self._lock:
+            self.summary = ""
+            self.summarized = 0
+            self._counts = []
+            self._pending = None
+            self._retry_from = 0
+            self._generation += 1
+
+    def build_messages(self, system_prompt, history):
+        """Return the messages to send: system prompt, summary of older turns, then recent turns.
+
+        Every message the summary does not cover yet is sent verbatim while the token budget allows.
+        """
+        counts = self._message_tokens(history)
+        with self._lock:
+            summary, summarized = self.summary, self.summarized
+        start, used = self._verbatim(counts, summarized)
+        if start - summarized >= self.summary_batch and start >= self._retry_from:
+            # A whole batch is over budget and not summarized (a summary is behind or failed);
+            # fold it now rather than leave it out
+            self.wait()
+            with self._lock:
+                summarized, generation = self.summarized, self._generation
+            if start > summarized and not self._fold(history[summarized:start], start, generation):
+                self._retry_from = start + self.summary_batch
+            with self._lock:
+                summary, summarized = self.summary, self.summarized
+            start, used = self._verbatim(counts, summarized)
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+        header_tokens = sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+        messages.extend(history[start:])
+        self.last_prompt_tokens = header_tokens + used
+
+        # Fold what has left the recent window ahead of time, so the budget rarely has to drop anything
+        upto = max(start, len(history) - self.recent_messages)
+        if upto - summarized >= self.summary_batch:
+            self._schedule_summary(history[summarized:upto], upto)
+        return messages
+
+    def _verbatim(self, counts, summarized):
+        # Walk back from the newest message while the token budget allows; the newest is always sent.
+        # Returns where the verbatim messages start and their tokens
+        start, used = len(counts), 0
+        while start > summarized:
+            cost = counts[start - 1]
+            if start < len(counts) and used + cost > self.token_budget:
+                break
+            start -= 1
+            used += cost
+        return start, used
+
+    def _schedule_summary(self, messages, upto):
+        with self._lock:
+            if self._pending is not None and not self._pending.done():
+                # One summary at a time; the next turn picks up whatever is still left
+                return
+            self._pending = _summary_pool.submit(self._fold, list(messages), upto, self._generation)
+
+    def _fold(self, messages, upto, generation):
+        with self._lock:
+            summary = self.summary
+        try:
+            updated = self.summarize(summary, messages)
+        except Exception:
+            # Older turns stay verbatim while they fit the budget, until a later attempt succeeds
+            metrics.increment("errors", stage="summarize")
+            return False
+        with self._lock:
+            # Ignore results for a history that was reset meanwhile
+            if self._generation == generation and upto > self.summarized:
+                self.summary = updated
+                self.summarized = upto
+        return True
+
+    def wait(self, timeout=None):
+        """Block until any pending summary is done."""
+        pending = self._pending
+        if pending is not None:
+            pending.exception(timeout=timeout)
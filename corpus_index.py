@@ -0,0 +1,122 @@
+"""One FAISS store over many PDFs, with per-document add, remove and filtered search."""
+import hashlib
+import json
+import os
+import threading
+
+import faiss
+from langchain_community.vectorstores import FAISS
+
+from index_backends import configure_search, convert_vector_store, effective_mode, supports_remove
+
+_MANIFEST = "corpus.json"
+
+
+def document_id(pdf_bytes):
+    # Same file uploaded twice maps to the same document
+    return hashlib.sha256(pdf_bytes).hexdigest()[:16]
+
+
+class CorpusIndex:
+    """Appends each document's vectors to a shared store and drops them again by document ID."""
+
+    def __init__(self, embeddings, vector_store=None, documents=None, index_mode="flat", index_params=None):
+        self.embeddings = embeddings
+        self.vector_store = vector_store
+        self.index_mode = index_mode
+        self.index_params = index_params
+        # doc_id -> {"source": name, "ids": [chunk ids]}
+        self.documents = documents or {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, doc_id):
+        return doc_id in self.documents
+
+    def add_document(self, doc_id, chunks, source=None):
+        """Index ``chunks`` (LangChain documents) under ``doc_id`` without touching other documents."""
+        with self._lock:
+            if doc_id in self.documents:
+                return self.documents[doc_id]["ids"]
+            ids = [f"{doc_id}:{position}" for position in range(len(chunks))]
+            for chunk in chunks:
+                chunk.metadata.update({"doc_id": doc_id, "source": source or doc_id})
+            if chunks:
+                texts = [chunk.page_content for chunk in chunks]
+                text_embeddings = list(zip(texts, self.embeddings.embed_documents(texts)))
+                metadatas = [chunk.metadata for chunk in chunks]
+                if self.vector_store is None:
+                    self.vector_store = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+                else:
+                    self.vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+                self._maybe_upgrade_index()
+            self.documents[doc_id] = {"source": source or doc_id, "ids": ids}
+            return ids
+
+    def _maybe_upgrade_index(self):
+        # Train the approximate index once the corpus is big enough; later adds go into it directly
+        count = self.vector_store.index.ntotal
+        if isinstance(self.vector_store.index, faiss.IndexFlat) and effective_mode(self.index_mode, count) != "flat":
+            self.vector_store = convert_vector_store(self.vector_store, self.index_mode, self.index_params)
+
+    def remove_document(self, doc_id):
+        with self._lock:
+            entry = self.documents.pop(doc_id, None)
+            if entry and entry["ids"] and self.vector_store is not None:
+                if not supports_remove(self.vector_store.index):
+                    # Only flat indexes delete in place (see supports_remove); rebuild the rest from the
+                    # remaining vectors
+                    self.vector_store = convert_vector_store(self.vector_store, "flat")
+                    self.vector_store.delete(entry["ids"])
+                    self.vector_store = convert_vector_store(self.vector_store, self.index_mode, self.index_params)
+                else:
+                    self.vector_store.delete(entry["ids"])
+
+    def sync(self, wanted, load_chunks):
+        """Make the corpus hold exactly ``wanted`` ({doc_id: source}); ``load_chunks(doc_id)`` splits new ones."""
+        for doc_id in list(self.documents):
+            if doc_id not in wanted:
+                self.remove_document(doc_id)
+        added = []
+        for doc_id, source in wanted.items():
+            if doc_id not in self.documents:
+                self.add_document(doc_id, load_chunks(doc_id), source)
+                added.append(doc_id)
+        return added
+
+    def fingerprint(self, doc_ids=None):
+        # Identifies the set of documents a search runs over
+        selected = sorted(doc_ids or self.documents)
+        return hashlib.sha256("\n".join(selected).encode("utf-8")).hexdigest()
+
+    def similarity_search(self, query, k=4, doc_ids=None, **kwargs):
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k, doc_ids=doc_ids, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k=4, doc_ids=None, **kwargs):
+        if self.vector_store is None:
+            return []
+        if doc_ids:
+            kwargs["filter"] = {"doc_id": list(doc_ids)}
+            # Filtering happens after the vector lookup, so look further ahead
+            kwargs.setdefault("fetch_k", max(20, k * 10))
+        return self.vector_store.similarity_search_by_vector(embedding, k=k, **kwargs)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            if self.vector_store is not None:
+                self.vector_store.save_local(path)
+            with open(os.path.join(path, _MANIFEST), "w") as manifest:
+                json.dump(self.documents, manifest)
+
+    @classmethod
+    def load(cls, path, embeddings, **options):
+        manifest_path = os.path.join(path, _MANIFEST)
+        if not os.path.exists(manifest_path):
+            return cls(embeddings, **options)
+        with open(manifest_path) as manifest:
+            documents = json.load(manifest)
+        vector_store = None
+        if os.path.exists(os.path.join(path, "index.faiss")):
+            vector_store = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+            configure_search(vector_store.index, options.get("index_params"))
+        return cls(embeddings, vector_store, documents, **options)
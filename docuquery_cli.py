@@ -0,0 +1,126 @@
+"""Answer a JSONL file of questions about one or more PDFs without the Streamlit UI.
+
+    python docuquery_cli.py manual.pdf policy.pdf --questions questions.jsonl --output answers.jsonl --workers 16
+
+Each input line is ``{"id": ..., "question": ..., "pdf": "manual.pdf"}``; ``pdf`` is optional and
+restricts retrieval to that file, otherwise every PDF is searched. Each output line carries the
+answer, the retrieved chunk IDs and per-stage timings.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import docuquery_pipeline as pipeline
+import metrics
+from corpus_index import CorpusIndex, document_id
+from embedding_store import DEFAULT_STORE_PATH, EmbeddingStore
+from hybrid_search import HybridRetriever
+
+
+def ingest(pdf_paths, embeddings):
+    """Index every PDF once into a shared corpus; returns the corpus and a name -> doc_id map."""
+    corpus = CorpusIndex(
+        embeddings, index_mode=pipeline.INDEX_SETTINGS["mode"], index_params=pipeline.SEARCH_SETTINGS
+    )
+    doc_ids = {}
+    for path in pdf_paths:
+        started = time.perf_counter()
+        with open(path, "rb") as pdf:
+            pdf_bytes = pdf.read()
+        doc_id = document_id(pdf_bytes)
+        name = os.path.basename(path)
+        chunks = pipeline.split_pdf(pdf_bytes)
+        corpus.add_document(doc_id, chunks, source=name)
+        doc_ids[name] = doc_id
+        print(f"Ingested {name}: {len(chunks)} chunks in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return corpus, doc_ids
+
+
+def read_questions(path):
+    with open(path) as questions:
+        for number, line in enumerate(questions):
+            if line.strip():
+                record = json.loads(line)
+                record.setdefault("id", number)
+                yield record
+
+
+def answer_all(questions, embeddings, retriever, llm, doc_ids, output, workers):
+    """Answer questions on a bounded thread pool, writing one JSON line per result as it completes."""
+    write_lock = threading.Lock()
+    answered = failed = 0
+
+    def run(record):
+        pdf = record.get("pdf")
+        if pdf is not None and pdf not in doc_ids:
+            raise ValueError(f"Unknown pdf {pdf!r}")
+        selected = [doc_ids[pdf]] if pdf is not None else None
+        return pipeline.answer_with_timings(record["question"], embeddings, retriever, llm, selected)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run, record): record for record in questions}
+        for future in as_completed(futures):
+            record = futures[future]
+            result = {"id": record["id"], "question": record["question"], "pdf": record.get("pdf")}
+            try:
+                result.update(future.result())
+                answered += 1
+            except Exception as error:
+                result["error"] = f"{type(error).__name__}: {error}"
+                failed += 1
+            with write_lock:
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+    return answered, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="+", help="PDF files to index")
+    parser.add_argument("--questions", required=True, help="JSONL file of questions")
+    parser.add_argument("--output", default="-", help="JSONL file for answers (default: stdout)")
+    parser.add_argument("--workers", type=int, default=8, help="questions answered concurrently")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY") or os.environ.get("OPEN_API_KEY"))
+    parser.add_argument("--base-url", default=os.environ.get("OPENAI_BASE_URL"), help="e.g. a local stub server")
+    parser.add_argument("--embedding-store", default=DEFAULT_STORE_PATH)
+    parser.add_argument("--metrics", help="write per-stage Prometheus metrics to this file when done")
+    args = parser.parse_args()
+    if not args.api_key:
+        parser.error("API key not found. Pass --api-key or set OPENAI_API_KEY.")
+    metrics.configure(app="docuquery_cli")
+
+    embeddings = pipeline.make_embeddings(args.api_key, EmbeddingStore(args.embedding_store), base_url=args.base_url)
+    corpus, doc_ids = ingest(args.pdfs, embeddings)
+    retriever = HybridRetriever(corpus.vector_store)
+    llm = pipeline.make_llm(args.api_key, base_url=args.base_url)
+
+    questions = list(read_questions(args.questions))
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    started = time.perf_counter()
+    try:
+        answered, failed = answer_all(questions, embeddings, retriever, llm, doc_ids, output, args.workers)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - started
+    print(
+        f"Answered {answered} questions ({failed} failed) in {elapsed:.1f}s: "
+        f"{len(questions) / elapsed if elapsed else 0.0:.2f} questions/sec",
+        file=sys.stderr,
+    )
+    for stage, row in metrics.REGISTRY.summary().items():
+        print(
+            f"  {stage:<16}{row['count']:>6} calls  p50 {row['p50'] * 1000:>8.1f} ms  p95 {row['p95'] * 1000:>8.1f} ms",
+            file=sys.stderr,
+        )
+    if args.metrics:
+        metrics.REGISTRY.write_prometheus(args.metrics)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""Ingest, retrieve and answer steps shared by the DocuQuery apps and the batch CLI."""
+import os
+import time
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import BaseCallbackHandler
+
+import metrics
+import shared_resources
+from context_packing import pack_context
+from embedding_pipeline import PipelineEmbeddings
+from embedding_store import CachedEmbeddings
+from index_backends import configure_search, convert_vector_store
+from index_cache import cache_key
+from offset_splitter import OffsetTextSplitter
+from pdf_extract import iter_page_documents, iter_page_texts
+from request_scheduler import estimate_tokens
+from tokens import count_tokens
+
+# Splitter and embedding settings; part of the index cache key
+SPLITTER_SETTINGS = {
+    "separators": ["\n"],
+    "chunk_size": 400,
+    "chunk_overlap": 150,
+    "split_by_page": True,
+    "add_start_index": True,
+}
+
+# Vector index type: flat, ivf_flat, hnsw or ivf_pq (see index_backends.py for a comparison report)
+INDEX_SETTINGS = {"mode": os.environ.get("DOCUQUERY_INDEX_MODE", "flat")}
+SEARCH_SETTINGS = {"nprobe": 8, "ef_search": 64}
+
+# Retrieved candidates are merged and packed into this many context tokens
+RETRIEVAL_CANDIDATES = 8
+CONTEXT_TOKEN_BUDGET = 1500
+
+# Embedding request batching; batches are also capped by token count
+EMBEDDING_BATCH_SIZE = 256
+EMBEDDING_CONCURRENCY = 4
+
+# ``stream_usage`` asks for token counts on streamed answers too
+LLM_SETTINGS = {"temperature": 0, "max_tokens": 1000, "model_name": "gpt-3.5-turbo", "stream_usage": True}
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Adds the token usage of every LLM call to the process-wide metrics."""
+
+    def __init__(self, stage="answer"):
+        self.stage = stage
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage")
+        if not usage and response.generations and response.generations[0]:
+            # Streamed generations report usage on the message instead
+            usage_metadata = getattr(getattr(response.generations[0][0], "message", None), "usage_metadata", None) or {}
+            usage = {
+                "prompt_tokens": usage_metadata.get("input_tokens"),
+                "completion_tokens": usage_metadata.get("output_tokens"),
+            }
+        metrics.record_usage(self.stage, usage)
+
+
+def make_embeddings(api_key, store, on_progress=None, base_url=None):
+    # Only chunks missing from the store are sent, in concurrent batches
+    # The backend and its HTTP clients are shared; this wrapper only carries per-run progress and stats
+    pipeline = PipelineEmbeddings(
+        shared_resources.embedding_backend(api_key, base_url=base_url),
+        on_progress=on_progress,
+        max_batch_size=EMBEDDING_BATCH_SIZE,
+        concurrency=EMBEDDING_CONCURRENCY,
+    )
+    return CachedEmbeddings(pipeline, store)
+
+
+def make_llm(api_key, base_url=None, **kwargs):
+    # One model per settings for the whole process; pass callbacks to ``answer`` instead
+    return shared_resources.chat_model(api_key, base_url, **{**LLM_SETTINGS, **kwargs})
+
+
+def make_text_splitter(splitter_settings=SPLITTER_SETTINGS):
+    separators = splitter_settings["separators"]
+    if len(separators) == 1:
+        # "\n" and ["\n"] split identically; the offset splitter yields the same chunks without copies
+        return OffsetTextSplitter(
+            separators[0],
+            chunk_size=splitter_settings["chunk_size"],
+            chunk_overlap=splitter_settings["chunk_overlap"],
+            add_start_index=splitter_settings["add_start_index"],
+        )
+    return RecursiveCharacterTextSplitter(
+        separators=splitter_settings["separators"],
+        chunk_size=splitter_settings["chunk_size"],
+        chunk_overlap=splitter_settings["chunk_overlap"],
+        add_start_index=splitter_settings["add_start_index"],
+        length_function=len,
+    )
+
+
+def _timed_pages(pages, totals):
+    # Adds the time spent waiting on each page to ``totals``, leaving the pipeline streaming
+    pages = iter(pages)
+    while True:
+        started = time.perf_counter()
+        try:
+            page = next(pages)
+        except StopIteration:
+            return
+        except BaseException as raised:
+            totals["error"] = raised
+            raise
+        finally:
+            totals["seconds"] += time.perf_counter() - started
+        totals["pages"] += 1
+        yield page
+
+
+def split_pdf(pdf_bytes, splitter_settings=SPLITTER_SETTINGS):
+    # Split pages into manageable chunks as they are extracted; "split" is the time left over
+    totals = {"seconds": 0.0, "pages": 0, "error": None}
+    started = time.perf_counter()
+    error = None
+    try:
+        pages = _timed_pages(iter_page_texts(pdf_bytes), totals)
+        return list(iter_page_documents(pages, make_text_splitter(splitter_settings)))
+    except BaseException as raised:
+        error = raised
+        raise
+    finally:
+        split_error = error if error is not totals["error"] else None
+        metrics.observe("pdf_extract", totals["seconds"], error=totals["error"], pages=totals["pages"])
+        metrics.observe("split", time.perf_counter() - started - totals["seconds"], error=split_error, pages=totals["pages"])
+
+
+def build_vector_store(pdf_bytes, embeddings, splitter_settings=SPLITTER_SETTINGS):
+    documents = split_pdf(pdf_bytes, splitter_settings)
+    with metrics.span("index_build", chunks=len(documents)):
+        vector_store = FAISS.from_documents(documents, embeddings)
+        if INDEX_SETTINGS["mode"] != "flat":
+            vector_store = convert_vector_store(vector_store, INDEX_SETTINGS["mode"], SEARCH_SETTINGS)
+    return vector_store
+
+
+def load_index(index_cache, pdf_bytes, embeddings, splitter_settings=SPLITTER_SETTINGS):
+    """Return ``(vector_store, fingerprint)``, building the index only on a cache miss."""
+    index_settings = {**splitter_settings, **INDEX_SETTINGS, "embedding_model": embeddings.model}
+    with metrics.span("index_load"):
+        vector_store = index_cache.get_or_build(
+            pdf_bytes,
+            index_settings,
+            embeddings,
+            lambda: build_vector_store(pdf_bytes, embeddings, splitter_settings),
+        )
+    configure_search(vector_store.index, SEARCH_SETTINGS)
+    return vector_store, cache_key(pdf_bytes, index_settings)
+
+
+def retrieve(retriever, question, query_vector=None, doc_ids=None):
+    """Return ``(packed documents, candidate chunk ids, prompt tokens)`` for ``question``."""
+    candidates = retriever.search_with_keys(
+        question, k=RETRIEVAL_CANDIDATES, query_vector=query_vector, doc_ids=doc_ids
+    )
+    with metrics.span("pack_context"):
+        documents, context_tokens = pack_context([document for _, document in candidates], CONTEXT_TOKEN_BUDGET)
+    return documents, [key for key, _ in candidates], context_tokens + count_tokens(question)
+
+
+def format_citations(documents):
+    """``"p. 2, 5"`` for one document, ``"a.pdf p. 2; b.pdf p. 1"`` across a corpus."""
+    pages = {}
+    for document in documents:
+        if document.metadata.get("page") is not None:
+            pages.setdefault(document.metadata.get("source"), set()).add(document.metadata["page"])
+    parts = []
+    for source, numbers in pages.items():
+        label = ", ".join(f"p. {number}" for number in sorted(numbers))
+        parts.append(f"{source} {label}" if source else label)
+    return "; ".join(parts)
+
+
+def answer(llm, documents, question, callbacks=None):
+    chain = shared_resources.qa_chain(llm)
+    # Rate limits count the prompt plus the completion allowance
+    tokens = estimate_tokens(question, *(document.page_content for document in documents)) + (llm.max_tokens or 0)
+    with metrics.span("answer", chunks=len(documents)):
+        return shared_resources.request_scheduler("chat").call(
+            lambda: chain.run(
+                input_documents=documents, question=question, callbacks=[*(callbacks or []), UsageCallbackHandler()]
+            ),
+            tokens=tokens,
+            stage="answer",
+        )
+
+
+def answer_with_timings(question, embeddings, retriever, llm, doc_ids=None):
+    """Run one question end to end and record how long each stage took."""
+    timings = {}
+    started = time.perf_counter()
+    query_vector = None
+    if not retriever.wants_lexical_only(question):
+        query_vector = embeddings.embed_query(question)
+    timings["embed_query"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    documents, chunk_ids, prompt_tokens = retrieve(retriever, question, query_vector, doc_ids)
+    timings["retrieve"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    response = answer(llm, documents, question)
+    timings["answer"] = time.perf_counter() - started
+    return {
+        "answer": response,
+        "chunk_ids": chunk_ids,
+        "citations": format_citations(documents),
+        "prompt_tokens": prompt_tokens,
+        "timings": timings,
+    }
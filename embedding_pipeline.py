@@ -0,0 +1,192 @@
+"""Batched, concurrent embedding requests with token-aware batching, backpressure and retry."""
+import asyncio
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+from openai import AsyncOpenAI
+
+import metrics
+import shared_resources
+from request_scheduler import BACKGROUND, INTERACTIVE, estimate_tokens
+from tokens import get_encoding
+
+DEFAULT_MODEL = "text-embedding-ada-002"
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_BATCH_TOKENS = 50_000
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 6
+
+def make_batches(texts, max_batch_size=DEFAULT_BATCH_SIZE, max_batch_tokens=DEFAULT_BATCH_TOKENS, encoding_name="cl100k_base"):
+    """Group text indices so no batch exceeds the item or token limit."""
+    encoding = get_encoding(encoding_name)
+    batch, batch_tokens = [], 0
+    for index, text in enumerate(texts):
+        tokens = len(encoding.encode(text, disallowed_special=()))
+        if batch and (len(batch) >= max_batch_size or batch_tokens + tokens > max_batch_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(index)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+class EmbeddingStats:
+    def __init__(self):
+        self.chunks = 0
+        self.batches = 0
+        self.retries = 0
+        self.seconds = 0.0
+
+    @property
+    def chunks_per_second(self):
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+
+class OpenAIEmbeddingBackend:
+    """Async embedding calls; point ``base_url`` at a local stub server to run offline."""
+
+    def __init__(self, api_key, model=DEFAULT_MODEL, base_url=None):
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url
+        self._local = threading.local()
+
+    def _client_for_loop(self):
+        # Async HTTP connections are bound to the event loop that opened them, and loops to threads
+        loop = asyncio.get_running_loop()
+        if getattr(self._local, "loop", None) is not loop:
+            # Retries happen in the request scheduler
+            self._local.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+            self._local.loop = loop
+        return self._local.client
+
+    async def aclose(self):
+        """Close this loop's client and its connection pool; call before the loop ends."""
+        client = getattr(self._local, "client", None)
+        self._local.client = self._local.loop = None
+        if client is not None:
+            await client.close()
+
+    async def embed(self, texts):
+        response = await self._client_for_loop().embeddings.create(model=self.model, input=texts)
+        metrics.record_usage("embed", response.usage)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def embed_sync(self, texts):
+        # Single queries reuse the process-wide keep-alive pool instead of a fresh event loop and client
+        response = shared_resources.openai_client(self.api_key, self.base_url).embeddings.create(model=self.model, input=texts)
+        metrics.record_usage("embed", response.usage)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+async def embed_texts_async(
+    texts,
+    backend,
+    max_batch_size=DEFAULT_BATCH_SIZE,
+    max_batch_tokens=DEFAULT_BATCH_TOKENS,
+    concurrency=DEFAULT_CONCURRENCY,
+    max_retries=DEFAULT_MAX_RETRIES,
+    on_progress=None,
+    stats=None,
+    scheduler=None,
+):
+    """Embed ``texts`` through a bounded worker pool and return vectors in input order.
+
+    Batches go through ``scheduler`` (the process's "embeddings" scheduler by default) as
+    background work, so interactive requests are admitted ahead of them.
+    """
+    stats = stats or EmbeddingStats()
+    scheduler = scheduler or shared_resources.request_scheduler("embeddings")
+    vectors = [None] * len(texts)
+    done = 0
+    started = time.perf_counter()
+
+    # A small queue makes the producer wait for workers instead of buffering every batch
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    errors = []
+
+    def count_retry(attempt, error):
+        stats.retries += 1
+
+    async def embed_batch(batch_texts):
+        return await scheduler.acall(
+            lambda: backend.embed(batch_texts),
+            priority=BACKGROUND,
+            tokens=estimate_tokens(*batch_texts),
+            max_retries=max_retries,
+            stage="embed",
+            on_retry=count_retry,
+        )
+
+    async def worker():
+        nonlocal done
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                return
+            # After a failure keep draining so the producer never blocks on a full queue
+            if errors:
+                continue
+            try:
+                result = await embed_batch([texts[index] for index in batch])
+            except Exception as error:
+                errors.append(error)
+                continue
+            for index, vector in zip(batch, result):
+                vectors[index] = vector
+            done += len(batch)
+            stats.batches += 1
+            if on_progress:
+                on_progress(done, len(texts))
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    for batch in make_batches(texts, max_batch_size, max_batch_tokens):
+        if errors:
+            break
+        await queue.put(batch)
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    if errors:
+        raise errors[0]
+
+    stats.chunks += len(texts)
+    stats.seconds += time.perf_counter() - started
+    return vectors
+
+
+class PipelineEmbeddings(Embeddings):
+    """LangChain ``Embeddings`` adapter that runs documents through ``embed_texts_async``."""
+
+    def __init__(self, backend, on_progress=None, **options):
+        self.backend = backend
+        self.model = backend.model
+        self.on_progress = on_progress
+        self.options = options
+        self.stats = EmbeddingStats()
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        with metrics.span("embed_documents", chunks=len(texts)):
+            return asyncio.run(self._embed_documents(list(texts)))
+
+    async def _embed_documents(self, texts):
+        # Every call runs on a fresh event loop; its HTTP client must not outlive it
+        try:
+            return await embed_texts_async(texts, self.backend, on_progress=self.on_progress, stats=self.stats, **self.options)
+        finally:
+            await self.backend.aclose()
+
+    def embed_query(self, text):
+        scheduler = self.options.get("scheduler") or shared_resources.request_scheduler("embeddings")
+        with metrics.span("embed_query"):
+            return scheduler.call(
+                lambda: self.backend.embed_sync([text])[0],
+                priority=INTERACTIVE,
+                tokens=estimate_tokens(text),
+                max_retries=self.options.get("max_retries", DEFAULT_MAX_RETRIES),
+                stage="embed",
+            )
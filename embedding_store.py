@@ -0,0 +1,106 @@
+"""Disk-backed per-chunk embedding cache shared across documents and revisions."""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+import metrics
+
+DEFAULT_STORE_PATH = os.environ.get("DOCUQUERY_EMBEDDING_STORE", os.path.join(".cache", "docuquery", "embeddings.sqlite3"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    # Chunks that differ only in whitespace or unicode form share one vector
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """SQLite table of float32 vectors keyed by (model, normalized text hash)."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " hash BLOB NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, hash)"
+            ") WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def get_many(self, model, hashes):
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *batch],
+                )
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, model, items):
+        rows = [(model, key, array("f", vector).tobytes()) for key, vector in items]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embeddings backend so only chunks missing from the store are sent to it."""
+
+    def __init__(self, underlying, store, model=None):
+        self.underlying = underlying
+        self.store = store
+        self.model = model or getattr(underlying, "model", type(underlying).__name__)
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        hashes = [text_hash(text) for text in texts]
+        cached = self.store.get_many(self.model, hashes)
+
+        # Embed each missing chunk once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = list(zip(missing.keys(), vectors))
+            self.store.put_many(self.model, fresh)
+            cached.update(fresh)
+
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        metrics.record_cache("embedding", hit=True, count=len(texts) - len(missing))
+        metrics.record_cache("embedding", hit=False, count=len(missing))
+        return [cached[key] for key in hashes]
+
+    def embed_query(self, text):
+        return self.underlying.embed_query(text)
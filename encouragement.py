@@ -0,0 +1,81 @@
+"""Encouragement for journal entries, generated on background threads after the entry is saved.
+
+Submitting an entry only scores its sentiment and queues it for writing. The encouragement
+request runs on a shared worker pool through the chat scheduler, which retries 429s and server
+errors. When the reply arrives, it is set on the session's entry dict and written to the stored
+entry. Until then the entry's ``encouragement`` is ``None``, which Past Entries shows as pending.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import shared_resources
+from request_scheduler import SchedulerBusy, backoff_delay, estimate_tokens
+
+SYSTEM_PROMPT = (
+    "You are a compassionate and highly skilled mental health practitioner with a PhD in psychology and mental health. "
+    "You have decades of experience providing therapy, emotional support, and practical guidance to individuals facing "
+    "a wide range of emotional challenges. Your responses should reflect deep empathy, evidence-based practices, and a "
+    "nurturing tone. You are here to help users gain insight, build resilience, and foster a sense of hope and personal growth."
+)
+MAX_TOKENS = 400
+# Attempts when the scheduler turns the request away; API errors are retried inside the scheduler
+BUSY_ATTEMPTS = 3
+# How often a page with pending encouragement checks for it
+POLL_SECONDS = 2.0
+
+# Shared by every session; each worker mostly waits on the API
+_encouragement_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="encouragement")
+
+
+def generate(client, mood, entry, model="gpt-3.5-turbo"):
+    """A motivational reply to a journal ``entry`` with the given ``mood``; blocks until it arrives."""
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Provide a motivational response to someone feeling {mood}. Their journal entry: {entry}"},
+    ]
+    for attempt in range(BUSY_ATTEMPTS):
+        try:
+            with metrics.span("encouragement"):
+                # Every OpenAI call goes through the process-wide rate limiter for its model group
+                response = shared_resources.request_scheduler("chat").call(
+                    lambda: client.chat.completions.create(
+                        model=model, messages=messages, max_tokens=MAX_TOKENS, temperature=0.7
+                    ),
+                    tokens=estimate_tokens(*(message["content"] for message in messages)) + MAX_TOKENS,
+                    stage="encouragement",
+                )
+            break
+        except SchedulerBusy:
+            if attempt == BUSY_ATTEMPTS - 1:
+                raise
+            time.sleep(backoff_delay(attempt, base_delay=2.0))
+    metrics.record_usage("encouragement", response.usage)
+    return response.choices[0].message.content.strip()
+
+
+def submit(store, user, journal, get_client):
+    """Generate encouragement for ``journal`` (an entry dict already queued to ``store``) in the background.
+
+    The dict gets ``encouragement`` when the reply arrives. If every attempt fails it gets ``""``
+    and an ``encouragement_error`` message instead. The stored entry is kept either way.
+    """
+    journal["encouragement"] = None
+
+    def run():
+        try:
+            text = generate(get_client(), journal["mood"], journal["entry"])
+        except Exception as error:
+            metrics.increment("errors", stage="encouragement")
+            journal["encouragement_error"] = str(error)
+            journal["encouragement"] = ""
+            return
+        journal["encouragement"] = text
+        store.set_encouragement(user, journal["created"], text)
+
+    return _encouragement_pool.submit(run)
+
+
+def pending(journals):
+    """Whether any of the session's entries is still waiting for its encouragement."""
+    return any(journal["encouragement"] is None for journal in journals)
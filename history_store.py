@@ -0,0 +1,401 @@
+"""Durable chat messages and journal entries in SQLite, loaded a page at a time.
+
+Both tables are append-only. Reads are keyset-paginated on ``(user, session, created)`` and
+``(user, created)`` indexes, so opening a page costs the same however much history a user has.
+Writes go through a queue to a single writer thread, which commits them in batches; the UI
+thread never waits on the disk. The same transactions keep per-day sentiment sums and counts,
+plus a per-user data version, so mood trends never rescan the entries.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import metrics
+
+DEFAULT_HISTORY_PATH = os.environ.get("GENAI_HISTORY_DB", os.path.join(".cache", "genai", "history.sqlite3"))
+PAGE_SIZE = 50
+# Upper bound on rows committed in one transaction
+WRITE_BATCH = 500
+# Attempts at a batch while the database is locked or busy, before committing its rows one by one
+WRITE_ATTEMPTS = 3
+WRITE_RETRY_SECONDS = 0.2
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sessions ("
+    " session TEXT PRIMARY KEY,"
+    " user TEXT NOT NULL,"
+    " app TEXT NOT NULL,"
+    " created REAL NOT NULL"
+    ")",
+    "CREATE INDEX IF NOT EXISTS sessions_by_user ON sessions (user, app, created)",
+    "CREATE TABLE IF NOT EXISTS messages ("
+    " id INTEGER PRIMARY KEY,"
+    " user TEXT NOT NULL,"
+    " session TEXT NOT NULL,"
+    " created REAL NOT NULL,"
+    " role TEXT NOT NULL,"
+    " content TEXT NOT NULL"
+    ")",
+    "CREATE INDEX IF NOT EXISTS messages_by_session ON messages (user, session, created)",
+    "CREATE TABLE IF NOT EXISTS journal_entries ("
+    " id INTEGER PRIMARY KEY,"
+    " user TEXT NOT NULL,"
+    " created REAL NOT NULL,"
+    " date TEXT NOT NULL,"
+    " entry TEXT NOT NULL,"
+    " mood TEXT NOT NULL,"
+    " sentiment REAL NOT NULL,"
+    " encouragement TEXT NOT NULL"
+    ")",
+    "CREATE INDEX IF NOT EXISTS journal_by_user ON journal_entries (user, created)",
+    "CREATE TABLE IF NOT EXISTS journal_daily ("
+    " user TEXT NOT NULL,"
+    " date TEXT NOT NULL,"
+    " sentiment_sum REAL NOT NULL,"
+    " entries INTEGER NOT NULL,"
+    " PRIMARY KEY (user, date)"
+    ") WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS journal_versions ("
+    " user TEXT PRIMARY KEY,"
+    " version INTEGER NOT NULL"
+    ") WITHOUT ROWID",
+)
+
+_UPSERT_DAILY = (
+    "INSERT INTO journal_daily (user, date, sentiment_sum, entries) VALUES (?, ?, ?, ?)"
+    " ON CONFLICT (user, date) DO UPDATE SET"
+    " sentiment_sum = sentiment_sum + excluded.sentiment_sum, entries = entries + excluded.entries"
+)
+_BUMP_VERSION = (
+    "INSERT INTO journal_versions (user, version) VALUES (?, ?)"
+    " ON CONFLICT (user) DO UPDATE SET version = version + excluded.version"
+)
+# Fills the aggregates from entries written before they existed
+_BACKFILL = (
+    "INSERT INTO journal_daily SELECT user, date, SUM(sentiment), COUNT(*) FROM journal_entries GROUP BY user, date",
+    "INSERT INTO journal_versions SELECT user, COUNT(*) FROM journal_entries GROUP BY user",
+)
+
+# Keyed by queue item kind; each batch runs them in the order the kinds first appear
+_WRITES = {
+    "sessions": "INSERT OR IGNORE INTO sessions (session, user, app, created) VALUES (?, ?, ?, ?)",
+    "messages": "INSERT INTO messages (user, session, created, role, content) VALUES (?, ?, ?, ?, ?)",
+    "journal_entries": (
+        "INSERT INTO journal_entries (user, created, date, entry, mood, sentiment, encouragement)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)"
+    ),
+    "encouragement": "UPDATE journal_entries SET encouragement = ? WHERE user = ? AND created = ?",
+}
+
+_ENTRY_FIELDS = ("date", "entry", "mood", "sentiment", "encouragement")
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # In WAL mode commits only reach the log; fsync happens at checkpoints
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class HistoryStore:
+    """Append-only message and journal tables with paged reads and a background batch writer.
+
+    Page reads return ``(rows, cursor)``: rows oldest first, and a cursor to pass as ``before`` for
+    the previous page, or ``None`` once the first record has been reached.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, page_size=PAGE_SIZE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.page_size = page_size
+        self._writer_conn = _connect(path)
+        with self._writer_conn:
+            has_aggregates = self._writer_conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'journal_daily'"
+            ).fetchone()
+            for statement in _SCHEMA:
+                self._writer_conn.execute(statement)
+            if not has_aggregates:
+                for statement in _BACKFILL:
+                    self._writer_conn.execute(statement)
+        # Readers see every committed batch while the writer carries on (WAL)
+        self._reader_conn = _connect(path)
+        self._read_lock = threading.Lock()
+
+        self._queue = queue.Queue()
+        self._written = threading.Condition()
+        self._enqueued = 0
+        self._committed = 0
+        # Position in the write queue of the last row that could not be committed, and how far
+        # flush() has already reported on
+        self._last_failed = 0
+        self._checked = 0
+        self.last_error = None
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    # Writes
+
+    def _enqueue(self, table, *rows):
+        with self._written:
+            if self._closed:
+                raise RuntimeError("HistoryStore is closed")
+            self._enqueued += len(rows)
+        for row in rows:
+            self._queue.put((table, row))
+
+    def new_session(self, user, app):
+        """Start a conversation for ``user`` in ``app`` and return its id."""
+        session = uuid.uuid4().hex
+        self._enqueue("sessions", (session, user, app, time.time()))
+        return session
+
+    def append_message(self, user, session, role, content):
+        self._enqueue("messages", (user, session, time.time(), role, content))
+
+    def append_entry(self, user, entry, created=None):
+        """Queue a journal entry: a dict with ``date``, ``entry``, ``mood``, ``sentiment`` and ``encouragement``.
+
+        ``created`` (a Unix timestamp, default now) orders entries in pages.
+        """
+        self.append_entries(user, [entry], None if created is None else [created])
+
+    def append_entries(self, user, entries, created=None):
+        """Queue several journal entries at once; ``created`` lists their timestamps, if not now."""
+        now = time.time()
+        self._enqueue(
+            "journal_entries",
+            *(
+                (user, now if created is None else created[position], *(entry[field] for field in _ENTRY_FIELDS))
+                for position, entry in enumerate(entries)
+            ),
+        )
+
+    def set_encouragement(self, user, created, encouragement):
+        """Queue the encouragement for the entry of ``user`` created at ``created``."""
+        self._enqueue("encouragement", (encouragement, user, created))
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # Take whatever else is already waiting, so bursts share one commit
+            while len(batch) < WRITE_BATCH:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _write(self, batch):
+        rows = {}
+        for table, row in batch:
+            rows.setdefault(table, []).append(row)
+        with metrics.span("history_write", rows=len(batch)):
+            with self._writer_conn:
+                for table, table_rows in rows.items():
+                    self._writer_conn.executemany(_WRITES[table], table_rows)
+                if "journal_entries" in rows:
+                    self._update_aggregates(rows["journal_entries"])
+
+    def _commit(self, batch):
+        failed, error = [], None
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                self._write(batch)
+                error = None
+                break
+            except sqlite3.OperationalError as raised:
+                # Locked or busy databases usually clear up; anything else will not
+                error = raised
+                if attempt < WRITE_ATTEMPTS - 1:
+                    time.sleep(WRITE_RETRY_SECONDS * (attempt + 1))
+            except sqlite3.Error as raised:
+                error = raised
+                break
+        if error is not None and len(batch) > 1:
+            # One bad row must not sink the rest of the batch, which may hold other users' writes
+            for position, item in enumerate(batch):
+                try:
+                    self._write([item])
+                except sqlite3.Error as raised:
+                    failed.append(position)
+                    error = raised
+        elif error is not None:
+            failed.append(0)
+        if failed:
+            metrics.increment("history_write_failures", len(failed))
+            logger.error("Could not save %d of %d history writes: %s", len(failed), len(batch), error)
+        with self._written:
+            if failed:
+                self._last_failed = self._committed + failed[-1] + 1
+                self.last_error = str(error)
+            self._committed += len(batch)
+            self._written.notify_all()
+
+    def _update_aggregates(self, entry_rows):
+        # One upsert per (user, day) and per user in the batch, in the entries' transaction
+        daily = defaultdict(lambda: [0.0, 0])
+        for user, _, date, _, _, sentiment, _ in entry_rows:
+            totals = daily[(user, date)]
+            totals[0] += sentiment
+            totals[1] += 1
+        self._writer_conn.executemany(_UPSERT_DAILY, [(*key, total, count) for key, (total, count) in daily.items()])
+        versions = Counter(row[0] for row in entry_rows)
+        self._writer_conn.executemany(_BUMP_VERSION, list(versions.items()))
+
+    def flush(self, timeout=None):
+        """Wait until every write queued so far has been committed.
+
+        Returns False on timeout, or if a write could not be saved since the last flush; the
+        reason is in ``last_error``.
+        """
+        with self._written:
+            target = self._enqueued
+            if not self._written.wait_for(lambda: self._committed >= target, timeout):
+                return False
+            failed = self._last_failed > self._checked
+            self._checked = max(self._checked, target)
+            return not failed
+
+    def close(self):
+        with self._written:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        self._writer_conn.close()
+        with self._read_lock:
+            self._reader_conn.close()
+
+    # Reads
+
+    def _page(self, sql, params, before, limit):
+        limit = limit or self.page_size
+        if before is not None:
+            # Keyset pagination: the index seeks straight to the cursor instead of skipping rows
+            sql = sql.format(before="AND (created, id) < (?, ?)")
+            params = [*params, *before]
+        else:
+            sql = sql.format(before="")
+        with self._read_lock:
+            rows = self._reader_conn.execute(sql, [*params, limit]).fetchall()
+        rows.reverse()
+        cursor = (rows[0][0], rows[0][1]) if len(rows) == limit else None
+        return rows, cursor
+
+    def latest_session(self, user, app):
+        """Id of the most recent conversation of ``user`` in ``app``, or ``None``."""
+        with self._read_lock:
+            row = self._reader_conn.execute(
+                "SELECT session FROM sessions WHERE user = ? AND app = ? ORDER BY created DESC LIMIT 1",
+                (user, app),
+            ).fetchone()
+        return row[0] if row else None
+
+    def messages(self, user, session, before=None, limit=None):
+        """A page of chat messages as ``{"role", "content"}`` dicts, ready to send to the API."""
+        with metrics.span("history_read", table="messages"):
+            rows, cursor = self._page(
+                "SELECT created, id, role, content FROM messages"
+                " WHERE user = ? AND session = ? {before} ORDER BY created DESC, id DESC LIMIT ?",
+                [user, session],
+                before,
+                limit,
+            )
+        return [{"role": role, "content": content} for _, _, role, content in rows], cursor
+
+    def entries(self, user, before=None, limit=None):
+        """A page of journal entries in the dict shape the journal app keeps in session state.
+
+        Each dict also carries its ``created`` timestamp, which identifies it for ``set_encouragement``.
+        """
+        with metrics.span("history_read", table="journal_entries"):
+            rows, cursor = self._page(
+                "SELECT created, id, date, entry, mood, sentiment, encouragement FROM journal_entries"
+                " WHERE user = ? {before} ORDER BY created DESC, id DESC LIMIT ?",
+                [user],
+                before,
+                limit,
+            )
+        return [{**dict(zip(_ENTRY_FIELDS, row[2:])), "created": row[0]} for row in rows], cursor
+
+    def entries_after(self, user, after_id=0, limit=None):
+        """``[(id, date, entry, mood)]`` of ``user``'s entries with ids above ``after_id``, in id order.
+
+        Ids grow with every write, so this picks up everything committed since the last call.
+        """
+        with self._read_lock:
+            return self._reader_conn.execute(
+                "SELECT id, date, entry, mood FROM journal_entries WHERE user = ? AND id > ? ORDER BY id LIMIT ?",
+                (user, after_id, limit or self.page_size),
+            ).fetchall()
+
+    def entries_by_id(self, user, ids):
+        """Entry dicts (as ``entries`` returns them) for ``ids``, keyed by id."""
+        found = {}
+        with self._read_lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(ids), 500):
+                batch = list(ids[start:start + 500])
+                rows = self._reader_conn.execute(
+                    "SELECT id, created, date, entry, mood, sentiment, encouragement FROM journal_entries"
+                    f" WHERE user = ? AND id IN ({','.join('?' * len(batch))})",
+                    [user, *batch],
+                )
+                for row in rows:
+                    found[row[0]] = {**dict(zip(_ENTRY_FIELDS, row[2:])), "created": row[1]}
+        return found
+
+    def journal_version(self, user):
+        """Changes whenever an entry of ``user`` is committed; 0 before the first one."""
+        with self._read_lock:
+            row = self._reader_conn.execute("SELECT version FROM journal_versions WHERE user = ?", (user,)).fetchone()
+        return row[0] if row else 0
+
+    def daily_mood(self, user, start=None, end=None):
+        """``[(date, sentiment sum, entries)]`` per day with entries, oldest first, optionally within
+        ``start``..``end`` (inclusive ``YYYY-MM-DD`` strings)."""
+        with self._read_lock:
+            return self._reader_conn.execute(
+                "SELECT date, sentiment_sum, entries FROM journal_daily"
+                " WHERE user = ? AND date >= ? AND date <= ? ORDER BY date",
+                (user, start or "", end or "9999-12-31"),
+            ).fetchall()
+
+
+class OlderPages:
+    """``fetch(before=..., limit=...)`` bound to a cursor, returning successively older pages.
+
+    Pass ``functools.partial(store.messages, user, session)`` and the cursor from the first page;
+    an instance works as ``Transcript(load_older=...)``.
+    """
+
+    def __init__(self, fetch, cursor):
+        self.fetch = fetch
+        self.cursor = cursor
+
+    @property
+    def exhausted(self):
+        return self.cursor is None
+
+    def __call__(self, limit=None):
+        if self.cursor is None:
+            return []
+        rows, self.cursor = self.fetch(before=self.cursor, limit=limit)
+        return rows
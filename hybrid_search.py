@@ -0,0 +1,133 @@
+"""BM25 lexical index over the vector store's chunks, fused with FAISS results by reciprocal rank."""
+import math
+import re
+from array import array
+
+import faiss
+import numpy as np
+
+import metrics
+
+_TOKEN = re.compile(r"\w+(?:[-./]\w+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by does for from how in is it of on or the this to was what when where which who why with".split()
+)
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def looks_like_identifier_query(query):
+    # Short queries made mostly of codes such as "ISO-27001", "PN 4471-B" or "SKU_88"
+    tokens = tokenize(query)
+    if not tokens or len(tokens) > 6:
+        return False
+    identifiers = [token for token in tokens if any(ch.isdigit() for ch in token) or any(ch in "-_./" for ch in token)]
+    return len(identifiers) * 2 >= len(tokens)
+
+
+class BM25Index:
+    """Inverted index with postings stored as parallel ``array`` columns per term."""
+
+    def __init__(self, texts, keys, k1=1.5, b=0.75):
+        self.keys = list(keys)
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = array("I")
+        postings = {}
+        for position, text in enumerate(texts):
+            counts = {}
+            tokens = tokenize(text)
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            self.doc_lengths.append(len(tokens))
+            for token, count in counts.items():
+                if token not in postings:
+                    postings[token] = (array("I"), array("H"))
+                doc_column, tf_column = postings[token]
+                doc_column.append(position)
+                tf_column.append(min(count, 0xFFFF))
+        self.postings = postings
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def has_terms(self, query):
+        return any(token in self.postings for token in tokenize(query))
+
+    def search(self, query, k=10):
+        """Return ``[(key, score)]`` best first."""
+        total = len(self.keys)
+        scores = {}
+        for token in set(tokenize(query)):
+            if token not in self.postings:
+                continue
+            doc_column, tf_column = self.postings[token]
+            idf = math.log(1 + (total - len(doc_column) + 0.5) / (len(doc_column) + 0.5))
+            for position, tf in zip(doc_column, tf_column):
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[position] / (self.avg_length or 1))
+                scores[position] = scores.get(position, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.keys[position], score) for position, score in best]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    fused = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return [key for key, _ in sorted(fused.items(), key=lambda item: item[1], reverse=True)]
+
+
+class HybridRetriever:
+    """Fuses BM25 and FAISS rankings; identifier-style queries can skip the query embedding."""
+
+    def __init__(self, vector_store, fetch_k=20, rrf_k=60):
+        self.vector_store = vector_store
+        self.fetch_k = fetch_k
+        self.rrf_k = rrf_k
+        keys, texts = [], []
+        if vector_store is not None:
+            for position in sorted(vector_store.index_to_docstore_id):
+                key = vector_store.index_to_docstore_id[position]
+                keys.append(key)
+                texts.append(vector_store.docstore.search(key).page_content)
+        self.lexical = BM25Index(texts, keys)
+
+    def wants_lexical_only(self, query):
+        return looks_like_identifier_query(query) and self.lexical.has_terms(query)
+
+    def _dense_ranking(self, query_vector, fetch_k):
+        vector = np.array([query_vector], dtype=np.float32)
+        if getattr(self.vector_store, "_normalize_L2", False):
+            faiss.normalize_L2(vector)
+        _, positions = self.vector_store.index.search(vector, fetch_k)
+        return [self.vector_store.index_to_docstore_id[position] for position in positions[0] if position != -1]
+
+    def search(self, query, k=4, query_vector=None, doc_ids=None):
+        """Hybrid search when ``query_vector`` is given, lexical-only otherwise."""
+        return [document for _, document in self.search_with_keys(query, k, query_vector, doc_ids)]
+
+    def search_with_keys(self, query, k=4, query_vector=None, doc_ids=None):
+        """Like ``search`` but returns ``(docstore_id, document)`` pairs."""
+        if self.vector_store is None:
+            return []
+        # Filters are applied after ranking, so widen the candidate pool
+        fetch_k = self.fetch_k * (5 if doc_ids else 1)
+        with metrics.span("lexical_search"):
+            rankings = [[key for key, _ in self.lexical.search(query, fetch_k)]]
+        if query_vector is not None:
+            with metrics.span("vector_search"):
+                rankings.append(self._dense_ranking(query_vector, fetch_k))
+
+        results = []
+        for key in reciprocal_rank_fusion(rankings, self.rrf_k):
+            document = self.vector_store.docstore.search(key)
+            if doc_ids and document.metadata.get("doc_id") not in doc_ids:
+                continue
+            results.append((key, document))
+            if len(results) == k:
+                break
+        return results
@@ -0,0 +1,192 @@
+"""Selectable FAISS index types (flat, IVF-Flat, HNSW, IVF-PQ) and a recall/latency/memory report.
+
+    python index_backends.py .cache/docuquery/indexes/<key> --queries 200 --k 10
+    python index_backends.py --synthetic 50000 --dim 1536 --json report.json
+"""
+import argparse
+import json
+import math
+import time
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+INDEX_MODES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+DEFAULT_PARAMS = {
+    "nlist": None,  # defaults to ~4 * sqrt(n)
+    "nprobe": 8,
+    "hnsw_m": 32,
+    "ef_construction": 80,
+    "ef_search": 64,
+    "pq_m": 64,
+    "pq_nbits": 8,
+    "train_sample": 50_000,
+}
+
+# Approximate modes need enough vectors to train; smaller indexes stay flat
+MIN_VECTORS = {"flat": 0, "hnsw": 0, "ivf_flat": 1_000, "ivf_pq": 10_000}
+
+
+def _params(params):
+    return {**DEFAULT_PARAMS, **(params or {})}
+
+
+def effective_mode(mode, count):
+    if mode not in INDEX_MODES:
+        raise ValueError(f"Unknown index mode {mode!r}; expected one of {', '.join(INDEX_MODES)}")
+    return mode if count >= MIN_VECTORS[mode] else "flat"
+
+
+def configure_search(index, params=None):
+    """Apply search-time knobs; these are cheap to change on a loaded index."""
+    params = _params(params)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(params["nprobe"], ivf.nlist)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = params["ef_search"]
+    return index
+
+
+def build_index(vectors, mode="flat", params=None):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    params = _params(params)
+    count, dim = vectors.shape
+    mode = effective_mode(mode, count)
+
+    if mode == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif mode == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"])
+        index.hnsw.efConstruction = params["ef_construction"]
+    else:
+        nlist = params["nlist"] or int(4 * math.sqrt(count))
+        # FAISS wants roughly 39 training points per centroid
+        nlist = max(1, min(nlist, count // 39))
+        quantizer = faiss.IndexFlatL2(dim)
+        if mode == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            pq_m = params["pq_m"]
+            while dim % pq_m:
+                pq_m -= 1
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, params["pq_nbits"])
+        rng = np.random.default_rng(0)
+        sample_size = min(count, params["train_sample"])
+        index.train(vectors[rng.choice(count, sample_size, replace=False)])
+        # Needed for reconstruct() and for LangChain's delete() via remove_ids
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+    index.add(vectors)
+    return configure_search(index, params)
+
+
+def index_vectors(index):
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def supports_remove(index):
+    """Whether LangChain's ``FAISS.delete`` can drop vectors from ``index`` in place.
+
+    ``delete`` renumbers ``index_to_docstore_id`` as 0..n-1, which only matches the index when
+    ``remove_ids`` shifts the remaining labels down, as flat indexes do. IVF indexes keep their
+    original labels and HNSW graphs cannot drop points, so those are rebuilt instead.
+    """
+    return isinstance(index, faiss.IndexFlat)
+
+
+def convert_vector_store(vector_store, mode, params=None):
+    """Rebuild a LangChain FAISS store's index as ``mode``, keeping its docstore and ids."""
+    index = build_index(index_vectors(vector_store.index), mode, params)
+    return FAISS(
+        embedding_function=vector_store.embedding_function,
+        index=index,
+        docstore=vector_store.docstore,
+        index_to_docstore_id=dict(vector_store.index_to_docstore_id),
+        normalize_L2=getattr(vector_store, "_normalize_L2", False),
+        distance_strategy=vector_store.distance_strategy,
+    )
+
+
+def index_memory_bytes(index):
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def compare_index_modes(vectors, queries, modes=INDEX_MODES, k=10, params=None):
+    """Recall@k against flat, build time, per-query latency and serialized size for each mode."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    truth = build_index(vectors, "flat").search(queries, k)[1]
+
+    rows = []
+    for mode in modes:
+        started = time.perf_counter()
+        index = build_index(vectors, mode, params)
+        build_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        found = index.search(queries, k)[1]
+        search_seconds = time.perf_counter() - started
+
+        recall = np.mean([len(set(row) & set(expected)) / k for row, expected in zip(found, truth)])
+        rows.append({
+            "mode": mode,
+            "effective_mode": effective_mode(mode, len(vectors)),
+            "vectors": len(vectors),
+            "recall_at_k": float(recall),
+            "build_seconds": build_seconds,
+            "latency_ms_per_query": search_seconds * 1000 / len(queries),
+            "memory_bytes": index_memory_bytes(index),
+        })
+    return rows
+
+
+def _sample_queries(vectors, count, noise=0.05, seed=1):
+    # Perturbed copies of stored vectors stand in for real questions about the same corpus
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.choice(len(vectors), min(count, len(vectors)), replace=False)]
+    return picks + rng.normal(0, noise * float(np.std(vectors)), picks.shape).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FAISS index modes against flat search.")
+    parser.add_argument("index_dir", nargs="?", help="directory written by FAISS.save_local (e.g. an index cache entry)")
+    parser.add_argument("--synthetic", type=int, help="use N random vectors instead of a saved index")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--modes", default=",".join(INDEX_MODES))
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_PARAMS["nprobe"])
+    parser.add_argument("--ef-search", type=int, default=DEFAULT_PARAMS["ef_search"])
+    parser.add_argument("--json", help="also write the rows to this file")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = np.random.default_rng(0).standard_normal((args.synthetic, args.dim)).astype(np.float32)
+    elif args.index_dir:
+        vectors = index_vectors(faiss.read_index(f"{args.index_dir}/index.faiss"))
+    else:
+        parser.error("pass an index directory or --synthetic N")
+
+    rows = compare_index_modes(
+        vectors,
+        _sample_queries(vectors, args.queries),
+        modes=args.modes.split(","),
+        k=args.k,
+        params={"nprobe": args.nprobe, "ef_search": args.ef_search},
+    )
+    print(f"{'mode':<10}{'used':<10}{'recall@k':>10}{'build s':>10}{'ms/query':>10}{'MiB':>10}")
+    for row in rows:
+        print(
+            f"{row['mode']:<10}{row['effective_mode']:<10}{row['recall_at_k']:>10.3f}{row['build_seconds']:>10.2f}"
+            f"{row['latency_ms_per_query']:>10.3f}{row['memory_bytes'] / 2 ** 20:>10.1f}"
+        )
+    if args.json:
+        with open(args.json, "w") as report:
+            json.dump(rows, report, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Content-addressed on-disk cache of FAISS indexes built from uploaded PDFs."""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_community.vectorstores import FAISS
+
+import metrics
+
+# Default location and size budget, overridable from the environment
+DEFAULT_CACHE_DIR = os.environ.get("DOCUQUERY_CACHE_DIR", os.path.join(".cache", "docuquery", "indexes"))
+DEFAULT_MAX_BYTES = int(os.environ.get("DOCUQUERY_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# Indexes kept loaded in memory; the rest are reloaded from disk when asked for again
+DEFAULT_MAX_LOADED = int(os.environ.get("DOCUQUERY_CACHE_MAX_LOADED", 8))
+
+_LAST_USED = ".last_used"
+# The last-used marker is rewritten at most this often per entry; eviction only needs rough order
+TOUCH_INTERVAL = 60.0
+
+
+def cache_key(pdf_bytes, settings):
+    # Hash the raw upload together with everything that changes the chunks or vectors
+    digest = hashlib.sha256()
+    digest.update(pdf_bytes)
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class IndexCache:
+    """Saves built vector stores under ``root/<key>`` and loads them back with ``FAISS.load_local``.
+
+    Entries are evicted least-recently-used first once the directory grows past ``max_bytes``.
+    At most ``max_loaded`` indexes stay in memory, also least-recently-used first.
+    One instance is meant to be shared by every session of the process.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, max_loaded=DEFAULT_MAX_LOADED):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_loaded = max_loaded
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()
+        self._touched = {}
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def _touch(self, key, force=False):
+        now = time.monotonic()
+        if not force and now - self._touched.get(key, float("-inf")) < TOUCH_INTERVAL:
+            return
+        self._touched[key] = now
+        try:
+            with open(os.path.join(self._path(key), _LAST_USED), "w") as marker:
+                marker.write(str(time.time()))
+        except OSError:
+            # Evicted meanwhile
+            pass
+
+    def get(self, key, embeddings):
+        with self._lock:
+            vector_store = self._loaded.get(key)
+            if vector_store is not None:
+                self._loaded.move_to_end(key)
+                self._touch(key)
+                return vector_store
+        path = self._path(key)
+        if not os.path.isdir(path):
+            return None
+        # Loading a large index takes a while; other sessions' lookups must not wait on it
+        try:
+            vector_store = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+        except (OSError, RuntimeError):
+            # Evicted while loading
+            return None
+        with self._lock:
+            # Another session may have loaded the same index meanwhile; keep one copy
+            vector_store = self._loaded.get(key) or vector_store
+            self._remember(key, vector_store)
+            self._touch(key)
+            return vector_store
+
+    def put(self, key, vector_store):
+        # Write into a scratch directory first so readers never see a half-saved index
+        tmp_dir = tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=self.root)
+        vector_store.save_local(tmp_dir)
+        with self._lock:
+            path = self._path(key)
+            if os.path.isdir(path):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            else:
+                os.replace(tmp_dir, path)
+            self._remember(key, vector_store)
+            self._touch(key, force=True)
+            self._evict(keep=key)
+
+    def _remember(self, key, vector_store):
+        # Sessions still using a dropped index keep their own reference to it
+        self._loaded[key] = vector_store
+        self._loaded.move_to_end(key)
+        while len(self._loaded) > self.max_loaded:
+            self._loaded.popitem(last=False)
+
+    def get_or_build(self, pdf_bytes, settings, embeddings, build):
+        key = cache_key(pdf_bytes, settings)
+        vector_store = self.get(key, embeddings)
+        metrics.record_cache("index", hit=vector_store is not None)
+        if vector_store is None:
+            vector_store = build()
+            self.put(key, vector_store)
+        return vector_store
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                last_used = os.path.getmtime(os.path.join(path, _LAST_USED))
+            except OSError:
+                last_used = os.path.getmtime(path)
+            entries.append((last_used, name, _dir_size(path)))
+        return sorted(entries)
+
+    def _evict(self, keep=None):
+        entries = self._entries()
+        total = sum(size for _, _, size in entries)
+        for _, name, size in entries:
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(self._path(name), ignore_errors=True)
+            self._loaded.pop(name, None)
+            self._touched.pop(name, None)
+            total -= size
@@ -0,0 +1,272 @@
+"""Bulk import of journal entries exported from other tools, scored in parallel.
+
+    python -m journal_import export.csv --user <token from the app URL>
+
+Files are read as a stream of ``(date, text)`` records: CSV with a date and a text column, JSON
+(an array, ``{"entries": [...]}`` or JSON Lines), or Markdown with one dated heading per entry.
+Records are scored with VADER in chunks across a process pool. Each chunk is labelled with the
+journal's mood thresholds in one vectorized pass and queued to the history store as one batch.
+No encouragement is generated on import.
+"""
+import csv
+import io
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from itertools import chain
+
+import metrics
+import shared_resources
+
+# Compound scores above / below these are Positive / Negative; everything between is Neutral
+POSITIVE_THRESHOLD = 0.2
+NEGATIVE_THRESHOLD = -0.2
+CHUNK_SIZE = 500
+# Chunks scored ahead of the one being written, per worker; bounds memory on large files
+CHUNKS_AHEAD = 2
+
+# Column or key names tried, in order, for an entry's text and date
+TEXT_FIELDS = ("entry", "text", "content", "body", "note")
+DATE_FIELDS = ("date", "created", "created_at", "timestamp", "day")
+DATE_FORMATS = ("%m/%d/%Y", "%d.%m.%Y", "%B %d, %Y", "%A, %B %d, %Y", "%b %d, %Y", "%d %B %Y")
+FORMATS = {".csv": "csv", ".json": "json", ".jsonl": "json", ".md": "markdown", ".markdown": "markdown", ".txt": "markdown"}
+
+_HEADING = re.compile(r"^#{1,6}\s+(.*?)\s*#*\s*$")
+
+_worker_analyzer = None
+
+
+def mood_for(compound):
+    """The journal's mood label for one compound score."""
+    if compound > POSITIVE_THRESHOLD:
+        return "Positive"
+    if compound < NEGATIVE_THRESHOLD:
+        return "Negative"
+    return "Neutral"
+
+
+def mood_labels(compounds):
+    """``mood_for`` over a sequence of scores in one numpy pass."""
+    import numpy as np
+
+    scores = np.asarray(compounds, dtype=float)
+    return np.select(
+        [scores > POSITIVE_THRESHOLD, scores < NEGATIVE_THRESHOLD], ["Positive", "Negative"], "Neutral"
+    ).tolist()
+
+
+def parse_date(value):
+    """A ``datetime`` from an ISO date/time, a Unix timestamp or a common written date; ``None`` if unrecognized."""
+    if isinstance(value, (int, float)) or (isinstance(value, str) and re.fullmatch(r"\d{9,13}(\.\d+)?", value.strip())):
+        seconds = float(value)
+        # Millisecond timestamps are common in app exports
+        return datetime.fromtimestamp(seconds / 1000 if seconds > 1e11 else seconds)
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def _field(record, names):
+    lowered = {str(key).strip().lower(): value for key, value in record.items()}
+    for name in names:
+        if lowered.get(name) not in (None, ""):
+            return lowered[name]
+    return None
+
+
+def _text_stream(stream):
+    # Uploaded files and open(..., "rb") give bytes; a BOM from spreadsheet exports is dropped
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="") if not isinstance(stream, io.TextIOBase) else stream
+
+
+def read_csv(stream):
+    for row in csv.DictReader(_text_stream(stream)):
+        yield _field(row, DATE_FIELDS), _field(row, TEXT_FIELDS)
+
+
+def read_json(stream):
+    text = _text_stream(stream)
+    first = text.read(1)
+    while first and first.isspace():
+        first = text.read(1)
+    if first == "{":
+        # Either one object holding the entries or JSON Lines; try the line-by-line form first
+        line = first + text.readline()
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            records = json.loads(line + text.read()).get("entries", [])
+        else:
+            records = record["entries"] if isinstance(record.get("entries"), list) else _json_lines(record, text)
+    elif first == "[":
+        # Arrays are parsed whole; use JSON Lines to stream very large exports
+        records = json.loads(first + text.read())
+    else:
+        records = []
+    for record in records:
+        if isinstance(record, dict):
+            yield _field(record, DATE_FIELDS), _field(record, TEXT_FIELDS)
+
+
+def _json_lines(first, lines):
+    yield first
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_markdown(stream):
+    # A heading that parses as a date starts an entry; anything before the first one is ignored
+    date, body = None, []
+    for line in _text_stream(stream):
+        heading = _HEADING.match(line)
+        if heading and parse_date(heading.group(1)):
+            if date is not None:
+                yield date, "".join(body).strip()
+            date, body = heading.group(1), []
+        elif date is not None and line.strip() != "---":
+            body.append(line)
+    if date is not None:
+        yield date, "".join(body).strip()
+
+
+READERS = {"csv": read_csv, "json": read_json, "markdown": read_markdown}
+
+
+def read_records(name, stream):
+    """``(date, text)`` records from an export file, picking the format from the file name."""
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported file type {extension or name!r}; use CSV, JSON or Markdown")
+    return READERS[FORMATS[extension]](stream)
+
+
+def _init_worker():
+    # Each worker loads the VADER lexicon once and then scores chunk after chunk
+    global _worker_analyzer
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+    _worker_analyzer = SentimentIntensityAnalyzer()
+
+
+def _score_chunk(texts):
+    if _worker_analyzer is None:
+        _init_worker()
+    return [_worker_analyzer.polarity_scores(text)["compound"] for text in texts]
+
+
+def _chunks(records, chunk_size, stats):
+    chunk = []
+    for date, text in records:
+        moment = parse_date(date)
+        if moment is None or not isinstance(text, str) or not text.strip():
+            stats["skipped"] += 1
+            continue
+        chunk.append((moment, text.strip()))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _scored(chunks, max_workers):
+    # Yields (chunk, compound scores) in file order
+    first = next(chunks, None)
+    second = next(chunks, None)
+    if second is None or max_workers == 1:
+        # A single chunk is scored faster here than by starting a pool
+        for chunk in chain(filter(None, (first, second)), chunks):
+            yield chunk, _score_chunk([text for _, text in chunk])
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=shared_resources.process_pool_context(), initializer=_init_worker) as pool:
+        pending = deque()
+        for chunk in chain((first, second), chunks):
+            pending.append((chunk, pool.submit(_score_chunk, [text for _, text in chunk])))
+            if len(pending) > max_workers * CHUNKS_AHEAD:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+
+
+def import_records(store, user, records, chunk_size=CHUNK_SIZE, max_workers=None, progress=None):
+    """Score ``records`` and queue them as ``user``'s journal entries.
+
+    ``progress(imported)`` is called after each chunk. Returns ``{"imported", "skipped",
+    "seconds", "per_second"}``, timed until the store has committed the last entry, plus
+    ``"error"`` if some entries could not be saved.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    stats = {"imported": 0, "skipped": 0}
+    started = time.perf_counter()
+    with metrics.span("journal_import"):
+        for chunk, compounds in _scored(_chunks(records, chunk_size, stats), max_workers):
+            entries = [
+                {"date": moment.strftime("%Y-%m-%d"), "entry": text, "mood": mood, "sentiment": compound, "encouragement": ""}
+                for (moment, text), compound, mood in zip(chunk, compounds, mood_labels(compounds))
+            ]
+            store.append_entries(user, entries, [moment.timestamp() for moment, _ in chunk])
+            stats["imported"] += len(entries)
+            if progress:
+                progress(stats["imported"])
+        if not store.flush():
+            stats["error"] = store.last_error
+    stats["seconds"] = time.perf_counter() - started
+    stats["per_second"] = stats["imported"] / stats["seconds"] if stats["seconds"] else 0.0
+    metrics.increment("journal_imported", stats["imported"])
+    return stats
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import journal entries from a CSV, JSON or Markdown export.")
+    parser.add_argument("path", help="export file")
+    parser.add_argument("--user", required=True, help="the user=<token> value from the journal app's URL")
+    parser.add_argument("--workers", type=int, help="scoring processes (default: one per CPU)")
+    parser.add_argument("--db", help="history database (default: GENAI_HISTORY_DB or .cache/genai/history.sqlite3)")
+    args = parser.parse_args()
+
+    from history_store import DEFAULT_HISTORY_PATH, HistoryStore
+    from user_identity import browser_key, valid_token
+
+    if not valid_token(args.user):
+        parser.error("--user must be the user=<token> value from the journal app's URL")
+
+    store = HistoryStore(args.db or DEFAULT_HISTORY_PATH)
+    try:
+        with open(args.path, "rb") as export:
+            stats = import_records(store, browser_key(args.user), read_records(args.path, export), max_workers=args.workers)
+    finally:
+        store.close()
+    print(
+        f"Imported {stats['imported']:,} entries ({stats['skipped']:,} skipped) in {stats['seconds']:.1f}s, "
+        f"{stats['per_second']:,.0f} entries/s"
+    )
+    if "error" in stats:
+        print(f"Some entries could not be saved: {stats['error']}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
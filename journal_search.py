@@ -0,0 +1,227 @@
+"""Semantic search over journal entries, with an incremental, persisted per-user vector index.
+
+Each entry is embedded once, after it reaches the history store. Entries are picked up in id order,
+so a sync only embeds what was written since the last one. Vectors are saved in SQLite with each
+entry's date and mood. On first use a user's vectors load into one normalized numpy matrix, and a
+query is a single matrix-vector product over the rows that pass the date and mood filters. Years
+of daily entries are a few thousand rows, so an exact scan takes milliseconds and needs no
+approximate index. Embedding requests go through the embedding cache, so a rebuilt index reuses
+vectors it already paid for.
+"""
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import metrics
+
+DEFAULT_INDEX_PATH = os.environ.get("GENAI_JOURNAL_INDEX_DB", os.path.join(".cache", "genai", "journal_index.sqlite3"))
+TOP_K = 5
+# Entries read and embedded per step of a sync
+SYNC_BATCH = 256
+# Query embeddings kept, so reruns with the same text do not call the API again
+QUERY_CACHE_SIZE = 256
+# Memory for users' vectors; the least recently searched are dropped first and reload from disk
+# (ten years of daily entries at 1536 dimensions is about 22 MB)
+MAX_CACHED_BYTES = int(os.environ.get("GENAI_JOURNAL_INDEX_CACHE_BYTES", 512 * 1024 ** 2))
+
+# Shared by every session; syncs mostly wait on the embeddings API
+_sync_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="journal-index")
+
+
+def _normalized(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class _UserVectors:
+    """One user's index in memory: normalized vectors plus the columns filters run on."""
+
+    def __init__(self, ids, dates, moods, matrix):
+        self.ids = ids
+        self.dates = dates
+        self.moods = moods
+        self.matrix = matrix
+
+    @property
+    def last_id(self):
+        return int(self.ids[-1]) if len(self.ids) else 0
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.dates.nbytes + self.moods.nbytes + self.matrix.nbytes
+
+    def extend(self, ids, dates, moods, vectors):
+        # One copy per sync step; searches never see a half-appended row
+        self.matrix = np.concatenate([self.matrix, vectors]) if len(self.ids) else vectors
+        self.dates = np.concatenate([self.dates, np.array(dates, dtype="U10")])
+        self.moods = np.concatenate([self.moods, np.array(moods, dtype="U8")])
+        self.ids = np.concatenate([self.ids, np.array(ids, dtype=np.int64)])
+
+
+class JournalIndex:
+    """Entry vectors per user, synced from a ``HistoryStore`` and searched with date and mood filters.
+
+    ``get_embeddings()`` returns a LangChain ``Embeddings``. It is only called when there is
+    something to embed, so creating the index imports nothing heavy. Loaded users are kept in
+    memory up to ``max_bytes``, least recently used first out.
+    """
+
+    def __init__(self, history, get_embeddings, path=DEFAULT_INDEX_PATH, max_bytes=MAX_CACHED_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.history = history
+        self.get_embeddings = get_embeddings
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS journal_vectors ("
+            " user TEXT NOT NULL,"
+            " entry_id INTEGER NOT NULL,"
+            " date TEXT NOT NULL,"
+            " mood TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (user, entry_id)"
+            ") WITHOUT ROWID"
+        )
+        self._conn.commit()
+        # _db_lock guards the connection; _lock the in-memory state, and is never held during I/O
+        self._db_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        self._syncs = {}
+        self._queries = OrderedDict()
+
+    def _load(self, user):
+        with self._lock:
+            vectors = self._users.get(user)
+            if vectors is not None:
+                self._users.move_to_end(user)
+                return vectors
+        # Read outside the state lock, so other users' searches and syncs carry on meanwhile
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT entry_id, date, mood, vector FROM journal_vectors WHERE user = ? ORDER BY entry_id", (user,)
+            ).fetchall()
+        loaded = _UserVectors(
+            np.array([row[0] for row in rows], dtype=np.int64),
+            np.array([row[1] for row in rows], dtype="U10"),
+            np.array([row[2] for row in rows], dtype="U8"),
+            np.stack([np.frombuffer(row[3], dtype=np.float32) for row in rows]) if rows else np.zeros((0, 0), np.float32),
+        )
+        with self._lock:
+            # Another thread may have loaded this user meanwhile; keep the first copy
+            vectors = self._users.setdefault(user, loaded)
+            self._users.move_to_end(user)
+            self._evict()
+            return vectors
+
+    def _evict(self):
+        # Drop least recently used users past the budget; the newest always stays
+        total = sum(vectors.nbytes for vectors in self._users.values())
+        while total > self.max_bytes and len(self._users) > 1:
+            _, vectors = self._users.popitem(last=False)
+            total -= vectors.nbytes
+
+    def count(self, user):
+        return len(self._load(user).ids)
+
+    def sync(self, user):
+        """Embed and store every entry of ``user`` committed since the last sync; returns how many."""
+        vectors = self._load(user)
+        added = 0
+        while True:
+            rows = self.history.entries_after(user, vectors.last_id, SYNC_BATCH)
+            if not rows:
+                return added
+            with metrics.span("journal_index", entries=len(rows)):
+                embedded = _normalized(self.get_embeddings().embed_documents([entry for _, _, entry, _ in rows]))
+                with self._db_lock:
+                    # Rewriting a row another sync already saved is harmless
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO journal_vectors VALUES (?, ?, ?, ?, ?)",
+                        [(user, entry_id, date, mood, vector.tobytes()) for (entry_id, date, _, mood), vector in zip(rows, embedded)],
+                    )
+                    self._conn.commit()
+                with self._lock:
+                    # A concurrent sync may have added some of these meanwhile
+                    fresh = [position for position, row in enumerate(rows) if row[0] > vectors.last_id]
+                    rows, embedded = [rows[position] for position in fresh], embedded[fresh]
+                    if rows:
+                        vectors.extend([row[0] for row in rows], [row[1] for row in rows], [row[3] for row in rows], embedded)
+                        self._evict()
+            added += len(rows)
+
+    def schedule_sync(self, user, flush_timeout=5.0):
+        """Sync ``user`` on a background thread, unless a sync is already running; returns its future."""
+        def run():
+            # Include entries this session just queued for writing
+            self.history.flush(timeout=flush_timeout)
+            try:
+                return self.sync(user)
+            except Exception:
+                metrics.increment("errors", stage="journal_index")
+                raise
+
+        with self._lock:
+            future = self._syncs.get(user)
+            if future is None or future.done():
+                future = self._syncs[user] = _sync_pool.submit(run)
+            return future
+
+    def syncing(self, user):
+        future = self._syncs.get(user)
+        return future is not None and not future.done()
+
+    def _embed_query(self, text):
+        with self._lock:
+            if text in self._queries:
+                self._queries.move_to_end(text)
+                return self._queries[text]
+        vector = _normalized(self.get_embeddings().embed_query(text))
+        with self._lock:
+            self._queries[text] = vector
+            while len(self._queries) > QUERY_CACHE_SIZE:
+                self._queries.popitem(last=False)
+        return vector
+
+    def search(self, user, text, k=TOP_K, start=None, end=None, moods=None):
+        """The ``k`` entries of ``user`` closest in meaning to ``text``, as ``[(score, entry dict)]``.
+
+        ``start`` and ``end`` are inclusive ``YYYY-MM-DD`` dates and ``moods`` a collection of mood labels.
+        """
+        vectors = self._load(user)
+        if not len(vectors.ids) or not text.strip():
+            return []
+        query = self._embed_query(text)
+        with metrics.span("journal_search", entries=len(vectors.ids)):
+            with self._lock:
+                ids, dates, moods_column, matrix = vectors.ids, vectors.dates, vectors.moods, vectors.matrix
+            mask = np.ones(len(ids), dtype=bool)
+            if start:
+                mask &= dates >= start
+            if end:
+                mask &= dates <= end
+            if moods:
+                mask &= np.isin(moods_column, list(moods))
+            rows = np.flatnonzero(mask)
+            if not len(rows):
+                return []
+            scores = (matrix if len(rows) == len(ids) else matrix[rows]) @ query
+            top = np.argpartition(-scores, min(k, len(rows)) - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+        entries = self.history.entries_by_id(user, [int(ids[rows[position]]) for position in top])
+        return [
+            (float(scores[position]), entries[int(ids[rows[position]])])
+            for position in top
+            if int(ids[rows[position]]) in entries
+        ]
+
+    def close(self):
+        with self._db_lock:
+            self._conn.close()
@@ -1,15 +1,46 @@
+from functools import partial
+
 import streamlit as st
-from openai import OpenAI
+
+import metrics
+import shared_resources
+from conversation_memory import ConversationMemory, make_openai_summarizer
+from history_store import OlderPages
+from request_scheduler import SchedulerBusy
+from streaming import StreamTimer, iter_chat_deltas, render_debug_panel, stream_to_placeholder
+from transcript import Transcript, escape_content
+from user_identity import current_user
 
 # Access the shared secret
 open_api_key = st.secrets["OPEN_API_KEY"]
 
-# Initialize OpenAI client with the shared secret API key
-client = OpenAI(api_key=open_api_key)
+# OpenAI client with the shared secret API key; built once per process with a keep-alive pool
+client = shared_resources.openai_client(open_api_key)
+
+# Stage timings and counters are labelled with the app name when exported
+metrics.configure(app="mental_health")
 
-# Initialize or load chat history
+# Histories are private: keyed by the signed-in account, or by a random token kept in this
+# browser's URL (see user_identity.py)
+store = shared_resources.history_store()
+user = current_user()
+
+# Initialize or load chat history: the user's latest conversation, newest page only
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_session = store.latest_session(user, "mental_health") or store.new_session(user, "mental_health")
+    st.session_state.chat_history, cursor = store.messages(user, st.session_state.chat_session)
+    st.session_state.older_messages = OlderPages(partial(store.messages, user, st.session_state.chat_session), cursor)
+
+# Recent turns plus a rolling summary of older ones, so prompts stop growing with the session
+if "memory" not in st.session_state:
+    st.session_state.memory = ConversationMemory(make_openai_summarizer(lambda: client))
+
+# Bubble HTML of past messages, built once per message; only the newest page is shown
+if "transcript" not in st.session_state:
+    st.session_state.transcript = Transcript(
+        {"user": '<div class="user-bubble">{}</div>', "assistant": '<div class="ai-bubble">{}</div>'},
+        load_older=st.session_state.older_messages,
+    )
 
 # Practitioners definition
 practitioners = {
@@ -124,11 +155,11 @@ st.subheader(f"{practitioner['specialty']}")
 st.markdown('<div class="chat-container scrollable-container">', unsafe_allow_html=True)
 
 # Display chat history
-for message in st.session_state.chat_history:
-    if message["role"] == "user":
-        st.markdown(f'<div class="user-bubble">{message["content"]}</div>', unsafe_allow_html=True)
-    elif message["role"] == "assistant":
-        st.markdown(f'<div class="ai-bubble">{message["content"]}</div>', unsafe_allow_html=True)
+st.session_state.transcript.render(st.session_state.chat_history)
+
+# Slots for the message being sent and the reply streaming in
+pending_user_bubble = st.empty()
+pending_ai_bubble = st.empty()
 
 st.markdown('</div>', unsafe_allow_html=True)
 
@@ -147,21 +178,38 @@ st.markdown('</div>', unsafe_allow_html=True)
 if send_button and user_message.strip() != "":
     # Add user message to chat history
     st.session_state.chat_history.append({"role": "user", "content": user_message})
+    store.append_message(user, st.session_state.chat_session, "user", user_message)
+    pending_user_bubble.markdown(f'<div class="user-bubble">{escape_content(user_message)}</div>', unsafe_allow_html=True)
 
-    # Generate AI Response
+    # Generate AI Response, rendering tokens as they arrive
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": practitioner["style"]},
-            ] + st.session_state.chat_history,
-            max_tokens=400,
-            temperature=0.7,
-        )
-        ai_response = response.choices[0].message.content.strip()
+        timer = StreamTimer()
+        messages = st.session_state.memory.build_messages(practitioner["style"], st.session_state.chat_history)
+        with metrics.span("chat_completion"):
+            # Admitted by the process-wide chat rate limiter; 429s back off and retry for every session
+            stream = shared_resources.request_scheduler("chat").call(
+                lambda: client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=messages,
+                    max_tokens=400,
+                    temperature=0.7,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                ),
+                tokens=st.session_state.memory.last_prompt_tokens + 400,
+                stage="chat_completion",
+            )
+            ai_response = stream_to_placeholder(
+                iter_chat_deltas(stream, timer), pending_ai_bubble, '<div class="ai-bubble">{}</div>', escape_content
+            ).strip()
+        metrics.record_usage("chat_completion", timer.usage)
+        st.session_state.last_stream_timer = timer
 
         # Add AI response to chat history
         st.session_state.chat_history.append({"role": "assistant", "content": ai_response})
+        store.append_message(user, st.session_state.chat_session, "assistant", ai_response)
+    except SchedulerBusy as e:
+        st.warning(str(e))
     except Exception as e:
         st.error(f"Error generating AI response: {e}")
 
@@ -176,7 +224,17 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+render_debug_panel(
+    st.session_state.get("last_stream_timer"),
+    {"Prompt tokens": st.session_state.memory.last_prompt_tokens},
+    registry=metrics.REGISTRY,
+)
+
 # Clear Chat Button
 if st.sidebar.button("Clear Chat"):
+    # Stored messages are kept; the next visit opens this new, empty conversation
+    st.session_state.chat_session = store.new_session(user, "mental_health")
     st.session_state.chat_history = []
+    st.session_state.memory.reset()
+    st.session_state.transcript.reset()
     st.success("Chat history cleared!")
@@ -1,27 +1,65 @@
+import time
+
 import streamlit as st
-from openai import OpenAI
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime
-from audiorecorder import audiorecorder
+from functools import partial
+
+import encouragement
+import metrics
+import shared_resources
+from history_store import OlderPages
+from journal_import import FORMATS as IMPORT_FORMATS, import_records, mood_for, read_records
+from mood_trends import RANGES, fetch_start, range_start, render_chart, trend_series
+from request_scheduler import SchedulerBusy
+from streaming import StreamTimer, iter_chat_deltas, render_debug_panel, stream_to_placeholder
+from transcript import Transcript, escape_content
+from user_identity import current_user
 
 # Access the shared secret
 open_api_key = st.secrets["OPEN_API_KEY"]
 
-# Initialize OpenAI client with the shared secret API key
-client = OpenAI(api_key=open_api_key)
+# The OpenAI client and VADER analyzer come from shared_resources: built on first use, once per process
+
+# Stage timings and counters are labelled with the app name when exported
+metrics.configure(app="mental_health_journal")
+
+# Histories are private: keyed by the signed-in account, or by a random token kept in this
+# browser's URL (see user_identity.py)
+store = shared_resources.history_store()
+user = current_user()
 
-# Initialize or load journal data
+# Initialize or load journal data: newest page only, older pages on request
 if "journal_data" not in st.session_state:
-    st.session_state.journal_data = []
+    st.session_state.journal_data, cursor = store.entries(user)
+    st.session_state.older_entries = OlderPages(partial(store.entries, user), cursor)
 
-# Initialize or load chat history
+# Initialize or load chat history: the latest conversation, newest page only
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_session = store.latest_session(user, "journal_chatbot") or store.new_session(user, "journal_chatbot")
+    st.session_state.chat_history, cursor = store.messages(user, st.session_state.chat_session)
+    st.session_state.older_messages = OlderPages(partial(store.messages, user, st.session_state.chat_session), cursor)
+
+
+def load_older_entries():
+    st.session_state.journal_data[:0] = st.session_state.older_entries()
+
 
-# Initialize VADER sentiment analyzer
-analyzer = SentimentIntensityAnalyzer()
+def show_matches(matches):
+    # Search results: most similar first
+    if not matches:
+        st.info("No matching entries yet.")
+    for score, journal in matches:
+        st.markdown(f"**{journal['date']}** · *{journal['mood']}* · similarity {score:.2f}")
+        st.markdown(journal['entry'])
+        st.write("---")
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def mood_trend_chart(user, version, start):
+    # Keyed by the user's data version: a new entry redraws, every other visit reuses the PNG
+    daily = store.daily_mood(user, fetch_start(start))
+    series = trend_series(daily, start)
+    return render_chart(series) if series["dates"] else None
 
 # Add custom CSS for chat UI
 st.markdown(
@@ -60,7 +98,7 @@ st.markdown(
 # App title
 st.title("Mental Health Journal App 🌸")
 st.sidebar.title("Navigation")
-page = st.sidebar.radio("Go to", ["Journal", "Audio Journal", "Chatbot", "Mood Trends"])
+page = st.sidebar.radio("Go to", ["Journal", "Audio Journal", "Chatbot", "Mood Trends", "Search"])
 
 if page == "Journal":
     st.subheader("Journal ✍️")
@@ -71,101 +109,177 @@ if page == "Journal":
     if st.button("Submit"):
         if entry:
             # Analyze mood sentiment using VADER
-            scores = analyzer.polarity_scores(entry)
+            with metrics.span("sentiment"):
+                scores = shared_resources.sentiment_analyzer().polarity_scores(entry)
             compound = scores["compound"]  # Compound score for overall sentiment
-            if compound > 0.2:  # Adjust thresholds as needed
-                mood = "Positive"
-            elif compound < -0.2:
-                mood = "Negative"
-            else:
-                mood = "Neutral"
+            mood = mood_for(compound)  # Thresholds shared with bulk import
+
+            # Save entry straight away; the encouragement follows from a background worker
+            journal = {
+                "date": datetime.now().strftime("%Y-%m-%d"),
+                "entry": entry,
+                "mood": mood,
+                "sentiment": compound,
+                "encouragement": "",
+                "created": time.time(),
+            }
+            store.append_entry(user, journal, created=journal["created"])
+            st.session_state.journal_data.append(journal)
+            encouragement.submit(store, user, journal, lambda: shared_resources.openai_client(open_api_key))
+            # Index the entry for search; embedding happens in the background too
+            shared_resources.journal_index(open_api_key).schedule_sync(user)
 
-            # Generate AI encouragement
+            st.success("Journal entry saved!")
+        else:
+            st.warning("Please write something before submitting.")
+
+    # Past entries closest in meaning to the one being written
+    if entry and st.button("Find similar entries"):
+        try:
+            with st.spinner("Searching..."):
+                show_matches(shared_resources.journal_index(open_api_key).search(user, entry))
+        except SchedulerBusy as e:
+            st.warning(str(e))
+        except Exception as e:
+            st.error(f"Error searching entries: {e}")
+
+    # Bulk import from another journaling tool; scored in a process pool, no AI encouragement
+    with st.expander("Import entries"):
+        export = st.file_uploader(
+            "CSV, JSON or Markdown export", type=[extension[1:] for extension in IMPORT_FORMATS]
+        )
+        if export is not None and st.button("Import"):
+            status = st.empty()
             try:
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a compassionate and highly skilled mental health practitioner with a PhD in psychology and mental health. You have decades of experience providing therapy, emotional support, and practical guidance to individuals facing a wide range of emotional challenges. Your responses should reflect deep empathy, evidence-based practices, and a nurturing tone. You are here to help users gain insight, build resilience, and foster a sense of hope and personal growth."},
-                        {"role": "user", "content": f"Provide a motivational response to someone feeling {mood}. Their journal entry: {entry}"}
-                    ],
-                    max_tokens=400,
-                    temperature=0.7,
+                with st.spinner("Importing..."):
+                    stats = import_records(
+                        store, user, read_records(export.name, export),
+                        progress=lambda imported: status.caption(f"Scored {imported:,} entries..."),
+                    )
+            except (ValueError, UnicodeDecodeError) as e:
+                status.empty()
+                st.error(f"Could not read {export.name}: {e}")
+            else:
+                status.empty()
+                st.success(
+                    f"Imported {stats['imported']:,} entries in {stats['seconds']:.1f}s "
+                    f"({stats['per_second']:,.0f} entries/s); {stats['skipped']:,} skipped"
                 )
-                encouragement = response.choices[0].message.content.strip()
+                if "error" in stats:
+                    st.warning(f"Some entries could not be saved: {stats['error']}")
+                # Show the newest page again, now including imported entries
+                st.session_state.journal_data, cursor = store.entries(user)
+                st.session_state.older_entries = OlderPages(partial(store.entries, user), cursor)
+                # Embed the imported entries for search in the background
+                shared_resources.journal_index(open_api_key).schedule_sync(user)
 
-                # Save entry
-                st.session_state.journal_data.append({
-                    "date": datetime.now().strftime("%Y-%m-%d"),
-                    "entry": entry,
-                    "mood": mood,
-                    "sentiment": compound,
-                    "encouragement": encouragement
-                })
+    # Display Past Entries; while encouragement is pending, this part reruns on its own to pick it up
+    polling = encouragement.pending(st.session_state.journal_data)
 
-                st.success("Journal entry saved!")
-            except Exception as e:
-                st.error(f"Error generating AI response: {e}")
-        else:
-            st.warning("Please write something before submitting.")
+    @st.fragment(run_every=encouragement.POLL_SECONDS if polling else None)
+    def past_entries():
+        st.write("### Past Entries")
+        if st.session_state.journal_data:
+            for journal in st.session_state.journal_data[::-1]:
+                st.markdown(f"**{journal['date']}**")
+                st.markdown(f"*Journal Entry:* {journal['entry']}")
+                st.markdown(f"*Mood:* {journal['mood']}")
+                if journal['encouragement'] is None:
+                    st.markdown("*Encouragement:* on its way...")
+                elif journal['encouragement']:
+                    st.markdown(f"*Encouragement:* {journal['encouragement']}")
+                elif journal.get('encouragement_error'):
+                    st.markdown("*Encouragement:* unavailable right now; your entry is saved.")
+                # Imported entries come without encouragement
+                st.write("---")
+        if not st.session_state.older_entries.exhausted:
+            st.button("Load older entries", on_click=load_older_entries)
+        if polling and not encouragement.pending(st.session_state.journal_data):
+            # Everything has arrived; a full rerun stops the polling
+            st.rerun()
 
-    # Display Past Entries
-    st.write("### Past Entries")
-    if st.session_state.journal_data:
-        for journal in st.session_state.journal_data[::-1]:
-            st.markdown(f"**{journal['date']}**")
-            st.markdown(f"*Journal Entry:* {journal['entry']}")
-            st.markdown(f"*Mood:* {journal['mood']}")
-            st.markdown(f"*Encouragement:* {journal['encouragement']}")
-            st.write("---")
+    past_entries()
 
 elif page == "Audio Journal":
+    import hashlib
+    import io
+
+    from audiorecorder import audiorecorder
+
+    import audio_pipeline
+
     st.subheader("Audio Journal 🎙️")
     st.write("### Record Your Audio Journal")
     audio = audiorecorder("Start Recording", "Stop Recording")
 
     if len(audio) > 0:
-        # Save the audio as a WAV file
-        audio_file_path = "audio_journal.wav"
-        audio.export(audio_file_path, format="wav")
+        # Kept in memory: concurrent sessions each have their own recording, nothing goes to disk
+        playback = io.BytesIO()
+        audio.export(playback, format="wav")
 
         # Display the audio in the app
-        st.audio(audio_file_path)
+        st.audio(playback.getvalue(), format="audio/wav")
 
-        # Transcribe audio using OpenAI Whisper
-        try:
-            transcription = client.audio.transcribe(
-                file=open(audio_file_path, "rb"),
-                model="whisper-1",
-                response_format="text",
-            )
+        # The recorder returns the same recording on every rerun; transcribe and save it once
+        recording = hashlib.blake2b(audio.raw_data, digest_size=16).hexdigest()
+        saved = st.session_state.get("audio_transcription")
+        if saved and saved[0] == recording:
             st.write("### Transcription")
-            st.write(transcription)
-
-            # Analyze sentiment of transcription
-            scores = analyzer.polarity_scores(transcription)
-            compound = scores["compound"]
-            if compound > 0.2:
-                mood = "Positive"
-            elif compound < -0.2:
-                mood = "Negative"
-            else:
-                mood = "Neutral"
+            st.write(saved[1])
+        else:
+            # Transcribe audio using OpenAI Whisper: compressed segments split at pauses, sent concurrently
+            try:
+                with metrics.span("transcribe"):
+                    transcription = audio_pipeline.transcribe(
+                        audio, audio_pipeline.openai_transcriber(lambda: shared_resources.openai_client(open_api_key))
+                    )
+                st.write("### Transcription")
+                st.write(transcription)
 
-            # Save transcribed journal
-            st.session_state.journal_data.append({
-                "date": datetime.now().strftime("%Y-%m-%d"),
-                "entry": transcription,
-                "mood": mood,
-                "sentiment": compound,
-                "encouragement": "Audio journal recorded and analyzed!"
-            })
-            st.success("Audio journal entry saved!")
-        except Exception as e:
-            st.error(f"Error transcribing audio: {e}")
+                # Analyze sentiment of transcription
+                with metrics.span("sentiment"):
+                    scores = shared_resources.sentiment_analyzer().polarity_scores(transcription)
+                compound = scores["compound"]
+                mood = mood_for(compound)
+
+                # Save transcribed journal
+                journal = {
+                    "date": datetime.now().strftime("%Y-%m-%d"),
+                    "entry": transcription,
+                    "mood": mood,
+                    "sentiment": compound,
+                    "encouragement": "Audio journal recorded and analyzed!"
+                }
+                st.session_state.journal_data.append(journal)
+                store.append_entry(user, journal)
+                st.session_state.audio_transcription = (recording, transcription)
+                st.success("Audio journal entry saved!")
+            except SchedulerBusy as e:
+                st.warning(str(e))
+            except Exception as e:
+                st.error(f"Error transcribing audio: {e}")
 
 elif page == "Chatbot":
+    from conversation_memory import ConversationMemory, make_openai_summarizer
+
     st.subheader("AI Chatbot 🤖")
 
+    # Recent turns plus a rolling summary of older ones, so prompts stop growing with the session
+    if "memory" not in st.session_state:
+        st.session_state.memory = ConversationMemory(
+            make_openai_summarizer(lambda: shared_resources.openai_client(open_api_key))
+        )
+
+    # Bubble HTML of past messages, built once per message; only the newest page is shown
+    if "transcript" not in st.session_state:
+        st.session_state.transcript = Transcript(
+            {
+                "user": '<div class="message-container"><div class="user-bubble">{}</div></div>',
+                "assistant": '<div class="message-container"><div class="ai-bubble">{}</div></div>',
+            },
+            load_older=st.session_state.older_messages,
+        )
+
     # Input message
     user_message = st.text_input("You:", key="user_message")
 
@@ -173,45 +287,98 @@ elif page == "Chatbot":
         if user_message:
             # Add user message to chat history
             st.session_state.chat_history.append({"role": "user", "content": user_message})
+            store.append_message(user, st.session_state.chat_session, "user", user_message)
 
-            # Generate AI response
+            # Generate AI response, streaming it into a temporary bubble
             try:
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a compassionate and highly skilled mental health practitioner with a PhD in psychology and mental health. You have decades of experience providing therapy, emotional support, and practical guidance to individuals facing a wide range of emotional challenges. Your responses should reflect deep empathy, evidence-based practices, and a nurturing tone."},
-                    ] + st.session_state.chat_history,
-                    max_tokens=400,
-                    temperature=0.7,
+                timer = StreamTimer()
+                streaming_bubble = st.empty()
+                messages = st.session_state.memory.build_messages(
+                    "You are a compassionate and highly skilled mental health practitioner with a PhD in psychology and mental health. You have decades of experience providing therapy, emotional support, and practical guidance to individuals facing a wide range of emotional challenges. Your responses should reflect deep empathy, evidence-based practices, and a nurturing tone.",
+                    st.session_state.chat_history,
                 )
-                ai_response = response.choices[0].message.content.strip()
+                with metrics.span("chat_completion"):
+                    stream = shared_resources.request_scheduler("chat").call(
+                        lambda: shared_resources.openai_client(open_api_key).chat.completions.create(
+                            model="gpt-3.5-turbo",
+                            messages=messages,
+                            max_tokens=400,
+                            temperature=0.7,
+                            stream=True,
+                            stream_options={"include_usage": True},
+                        ),
+                        tokens=st.session_state.memory.last_prompt_tokens + 400,
+                        stage="chat_completion",
+                    )
+                    ai_response = stream_to_placeholder(
+                        iter_chat_deltas(stream, timer),
+                        streaming_bubble,
+                        '<div class="message-container"><div class="ai-bubble">{}</div></div>',
+                        escape_content,
+                    ).strip()
+                metrics.record_usage("chat_completion", timer.usage)
+                # The history below renders the finished reply
+                streaming_bubble.empty()
+                st.session_state.last_stream_timer = timer
 
                 # Add AI response to chat history
                 st.session_state.chat_history.append({"role": "assistant", "content": ai_response})
+                store.append_message(user, st.session_state.chat_session, "assistant", ai_response)
+            except SchedulerBusy as e:
+                st.warning(str(e))
             except Exception as e:
                 st.error(f"Error generating AI response: {e}")
 
+    render_debug_panel(
+        st.session_state.get("last_stream_timer"),
+        {"Prompt tokens": st.session_state.memory.last_prompt_tokens},
+        registry=metrics.REGISTRY,
+    )
+
     # Display chat history with styling
-    for message in st.session_state.chat_history:
-        if message["role"] == "user":
-            st.markdown(f'<div class="message-container"><div class="user-bubble">{message["content"]}</div></div>', unsafe_allow_html=True)
-        elif message["role"] == "assistant":
-            st.markdown(f'<div class="message-container"><div class="ai-bubble">{message["content"]}</div></div>', unsafe_allow_html=True)
+    st.session_state.transcript.render(st.session_state.chat_history)
 
 elif page == "Mood Trends":
     st.subheader("Mood Trends 📈")
-    if st.session_state.journal_data:
-        df = pd.DataFrame(st.session_state.journal_data)
-        df['date'] = pd.to_datetime(df['date'])
-        mood_avg = df.groupby('date')['sentiment'].mean()
-
-        # Plot mood trends
-        plt.figure(figsize=(10, 5))
-        plt.plot(mood_avg.index, mood_avg.values, marker='o')
-        plt.title("Mood Trends Over Time")
-        plt.xlabel("Date")
-        plt.ylabel("Sentiment (Compound Score)")
-        plt.grid()
-        st.pyplot(plt)
+    span = st.radio("Range", list(RANGES), index=len(RANGES) - 1, horizontal=True)
+    # Per-day sums are kept up to date as entries are written; include this session's entries that
+    # may still be queued for writing
+    store.flush(timeout=2)
+    version = store.journal_version(user)
+    if version:
+        chart = mood_trend_chart(user, version, range_start(RANGES[span]))
+        if chart:
+            st.image(chart)
+        else:
+            st.info("No entries in this range.")
     else:
         st.info("No data available. Start journaling to see your mood trends!")
+
+elif page == "Search":
+    st.subheader("Search Your Journal 🔎")
+    index = shared_resources.journal_index(open_api_key)
+    # Catch up on entries written or imported since the index last saw this user
+    index.schedule_sync(user)
+
+    query = st.text_input("What are you looking for?", placeholder="When did I last feel like this?")
+    date_column, mood_column = st.columns(2)
+    dates = date_column.date_input("Between", value=(), format="YYYY-MM-DD")
+    moods = mood_column.multiselect("Mood", ["Positive", "Neutral", "Negative"])
+    status = f"{index.count(user):,} entries indexed"
+    st.caption(status + ("; indexing new entries in the background" if index.syncing(user) else ""))
+
+    if query:
+        try:
+            with st.spinner("Searching..."):
+                matches = index.search(
+                    user,
+                    query,
+                    start=dates[0].isoformat() if len(dates) > 0 else None,
+                    end=dates[1].isoformat() if len(dates) > 1 else None,
+                    moods=moods,
+                )
+            show_matches(matches)
+        except SchedulerBusy as e:
+            st.warning(str(e))
+        except Exception as e:
+            st.error(f"Error searching entries: {e}")
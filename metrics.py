@@ -0,0 +1,248 @@
+"""Process-wide timing spans and counters with Prometheus text and JSONL export.
+
+Stages are timed with ``span("embed_query")``; counters cover token usage, cache hits and errors,
+and gauges hold current levels such as queue depth.
+Set ``GENAI_METRICS_JSONL`` to append one line per span, and ``GENAI_METRICS_PROM`` to keep a
+Prometheus text file up to date (e.g. for node_exporter's textfile collector).
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Recent durations kept per stage for the p50/p95 shown in the debug panel
+RECENT_SAMPLES = 1024
+PROMETHEUS_WRITE_INTERVAL = 5.0
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _labels(labels):
+    # Prometheus label values escape backslashes, quotes and newlines
+    parts = []
+    for name, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class _Stage:
+    __slots__ = ("buckets", "count", "total", "errors", "recent")
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds):
+        for position, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[position] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+
+class MetricsRegistry:
+    """Thread-safe stage histograms and counters, all labelled with the app name."""
+
+    def __init__(self, app="genai", jsonl_path=None, prometheus_path=None):
+        self.app = app
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self._stages = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._last_prometheus_write = 0.0
+
+    def configure(self, app=None, jsonl_path=None, prometheus_path=None):
+        if app is not None:
+            self.app = app
+        if jsonl_path is not None:
+            self.jsonl_path = jsonl_path
+        if prometheus_path is not None:
+            self.prometheus_path = prometheus_path
+
+    @contextmanager
+    def span(self, stage, **fields):
+        """Time the block as ``stage``; an exception counts as an error and is re-raised."""
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as raised:
+            error = raised
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started, error=error, **fields)
+
+    def observe(self, stage, seconds, error=None, **fields):
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = _Stage()
+            entry.observe(seconds)
+            if error is not None:
+                entry.errors += 1
+        if self.jsonl_path:
+            record = {"ts": time.time(), "app": self.app, "stage": stage, "seconds": round(seconds, 6), **fields}
+            if error is not None:
+                record["error"] = type(error).__name__
+            self._append_jsonl(record)
+        self._maybe_write_prometheus()
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def record_usage(self, stage, usage):
+        """Add an OpenAI ``usage`` object (or dict) to the token counters for ``stage``."""
+        if usage is None:
+            return
+        if not isinstance(usage, dict):
+            usage = {name: getattr(usage, name, None) for name in ("prompt_tokens", "completion_tokens")}
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage.get(kind):
+                self.increment("tokens", usage[kind], stage=stage, kind=kind.split("_")[0])
+
+    def record_cache(self, cache, hit, count=1):
+        self.increment("cache_lookups", count, cache=cache, result="hit" if hit else "miss")
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def summary(self):
+        """Return ``{stage: {count, p50, p95, mean, errors}}`` over recent samples."""
+        with self._lock:
+            stages = {stage: (entry.count, entry.total, entry.errors, sorted(entry.recent)) for stage, entry in self._stages.items()}
+        return {
+            stage: {
+                "count": count,
+                "p50": _percentile(recent, 0.50),
+                "p95": _percentile(recent, 0.95),
+                "mean": total / count if count else None,
+                "errors": errors,
+            }
+            for stage, (count, total, errors, recent) in sorted(stages.items())
+        }
+
+    def counters(self):
+        with self._lock:
+            return {(name, labels): value for (name, labels), value in sorted(self._counters.items())}
+
+    def gauges(self):
+        with self._lock:
+            return {(name, labels): value for (name, labels), value in sorted(self._gauges.items())}
+
+    def prometheus_text(self):
+        """Render every histogram and counter in the Prometheus text exposition format."""
+        with self._lock:
+            stages = {
+                stage: (list(entry.buckets), entry.count, entry.total, entry.errors)
+                for stage, entry in sorted(self._stages.items())
+            }
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+        lines = [
+            "# HELP genai_stage_seconds Time spent in each pipeline stage.",
+            "# TYPE genai_stage_seconds histogram",
+        ]
+        for stage, (buckets, count, total, _) in stages.items():
+            cumulative = 0
+            for bound, observed in zip(BUCKETS, buckets):
+                cumulative += observed
+                lines.append(f"genai_stage_seconds_bucket{_labels({'app': self.app, 'stage': stage, 'le': bound})} {cumulative}")
+            lines.append(f"genai_stage_seconds_bucket{_labels({'app': self.app, 'stage': stage, 'le': '+Inf'})} {count}")
+            lines.append(f"genai_stage_seconds_sum{_labels({'app': self.app, 'stage': stage})} {total}")
+            lines.append(f"genai_stage_seconds_count{_labels({'app': self.app, 'stage': stage})} {count}")
+        lines += ["# HELP genai_stage_errors_total Stage runs that raised.", "# TYPE genai_stage_errors_total counter"]
+        for stage, (_, _, _, errors) in stages.items():
+            lines.append(f"genai_stage_errors_total{_labels({'app': self.app, 'stage': stage})} {errors}")
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f"genai_{name}_total"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            lines.append(f"{metric}{_labels({'app': self.app, **dict(labels)})} {value}")
+        for (name, labels), value in gauges:
+            metric = f"genai_{name}"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} gauge")
+                declared.add(metric)
+            lines.append(f"{metric}{_labels({'app': self.app, **dict(labels)})} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        path = path or self.prometheus_path
+        text = self.prometheus_text()
+        # Write then rename so scrapers never read a half-written file; the temp name is unique per
+        # call, so threads and processes writing at once do not share one
+        with tempfile.NamedTemporaryFile(
+            "w", dir=os.path.dirname(path) or ".", prefix=f".{os.path.basename(path)}.", suffix=".tmp", delete=False
+        ) as out:
+            out.write(text)
+        try:
+            os.replace(out.name, path)
+        except OSError:
+            os.unlink(out.name)
+            raise
+        self._last_prometheus_write = time.monotonic()
+
+    def _maybe_write_prometheus(self):
+        if self.prometheus_path and time.monotonic() - self._last_prometheus_write >= PROMETHEUS_WRITE_INTERVAL:
+            try:
+                self.write_prometheus()
+            except OSError:
+                pass
+
+    def _append_jsonl(self, record):
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        # One write() to an O_APPEND file lands whole, so concurrent spans need no lock here
+        try:
+            fd = os.open(self.jsonl_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+REGISTRY = MetricsRegistry(
+    jsonl_path=os.environ.get("GENAI_METRICS_JSONL"),
+    prometheus_path=os.environ.get("GENAI_METRICS_PROM"),
+)
+
+configure = REGISTRY.configure
+span = REGISTRY.span
+observe = REGISTRY.observe
+increment = REGISTRY.increment
+set_gauge = REGISTRY.set_gauge
+record_usage = REGISTRY.record_usage
+record_cache = REGISTRY.record_cache
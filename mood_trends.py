@@ -0,0 +1,102 @@
+"""Mood trend series built from per-day aggregates, and the chart drawn from them.
+
+Input rows are ``(date, sentiment sum, entries)`` per day, as ``HistoryStore.daily_mood`` returns
+them. So the cost depends on the number of days shown, not the number of entries. Long ranges are
+downsampled to at most ``MAX_POINTS`` points.
+"""
+import io
+import math
+from datetime import date, timedelta
+
+# Trailing calendar-day windows drawn alongside the daily means
+ROLLING_WINDOWS = (7, 30)
+MAX_POINTS = 180
+# Range choices on the page: label -> days back from today (None for everything)
+RANGES = {"30 days": 30, "90 days": 90, "1 year": 365, "All time": None}
+
+
+def range_start(days, today=None):
+    """First date (``YYYY-MM-DD``) of a range of ``days`` ending today, or ``None`` for all time."""
+    if days is None:
+        return None
+    return ((today or date.today()) - timedelta(days=days - 1)).isoformat()
+
+
+def fetch_start(start, windows=ROLLING_WINDOWS):
+    # Rolling averages at the start of the range need the days before it
+    if start is None:
+        return None
+    return (date.fromisoformat(start) - timedelta(days=max(windows) - 1)).isoformat()
+
+
+def trend_series(daily, start=None, windows=ROLLING_WINDOWS, max_points=MAX_POINTS):
+    """Entry-weighted daily means and rolling means from ``daily`` rows, from ``start`` on.
+
+    Returns ``{"dates", "mean", "rolling_<n>"..., "bin_days"}``. ``bin_days`` is the number of
+    calendar days each point covers, and is more than 1 only when the range was downsampled.
+    """
+    days = [date.fromisoformat(day) for day, _, _ in daily]
+    ordinals = [day.toordinal() for day in days]
+    sums = [total for _, total, _ in daily]
+    counts = [entries for _, _, entries in daily]
+    series = {}
+    for window in windows:
+        # Two pointers over the days with entries: each day enters and leaves the window once
+        values = []
+        first = 0
+        window_sum = window_count = 0
+        for position, ordinal in enumerate(ordinals):
+            window_sum += sums[position]
+            window_count += counts[position]
+            while ordinals[first] <= ordinal - window:
+                window_sum -= sums[first]
+                window_count -= counts[first]
+                first += 1
+            values.append(window_sum / window_count)
+        series[f"rolling_{window}"] = values
+
+    # Drop the lead-in days fetched only for the rolling windows
+    keep = 0
+    if start is not None:
+        first_day = date.fromisoformat(start)
+        while keep < len(days) and days[keep] < first_day:
+            keep += 1
+    days, ordinals, sums, counts = days[keep:], ordinals[keep:], sums[keep:], counts[keep:]
+    series = {name: values[keep:] for name, values in series.items()}
+
+    # Bins are runs of ``step`` calendar days, so days without entries still count towards a bin
+    span = ordinals[-1] - ordinals[0] + 1 if ordinals else 0
+    step = max(1, math.ceil(span / max_points))
+    bin_of = [(ordinal - ordinals[0]) // step for ordinal in ordinals]
+    ends = [position for position in range(len(days)) if position + 1 == len(days) or bin_of[position + 1] != bin_of[position]]
+    starts = [0] + [end + 1 for end in ends[:-1]]
+    result = {
+        # Each point sits on the last day with entries in its bin; means stay weighted by entry counts
+        "dates": [days[end] for end in ends],
+        "mean": [sum(sums[first:end + 1]) / sum(counts[first:end + 1]) for first, end in zip(starts, ends)],
+        "bin_days": step,
+    }
+    for name, values in series.items():
+        result[name] = [values[end] for end in ends]
+    return result
+
+
+def render_chart(series, windows=ROLLING_WINDOWS):
+    """PNG bytes of the trend chart; drawn on a standalone ``Figure``, so it is safe across sessions."""
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(10, 5))
+    axes = figure.subplots()
+    label = "Daily mean" if series["bin_days"] == 1 else f"Mean per {series['bin_days']} days"
+    axes.plot(series["dates"], series["mean"], marker="o" if len(series["dates"]) <= 60 else None, label=label)
+    for window in windows:
+        axes.plot(series["dates"], series[f"rolling_{window}"], label=f"{window}-day average")
+    axes.set_title("Mood Trends Over Time")
+    axes.set_xlabel("Date")
+    axes.set_ylabel("Sentiment (Compound Score)")
+    axes.grid()
+    axes.legend()
+    figure.autofmt_xdate()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
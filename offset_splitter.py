@@ -0,0 +1,122 @@
+"""Chunking by character offsets over page text, without building intermediate strings.
+
+``OffsetTextSplitter`` produces exactly the chunks (and ``start_index`` values) that
+``RecursiveCharacterTextSplitter`` produces for a single separator such as ``"\\n"`` with the
+default ``keep_separator=True`` and ``strip_whitespace=True``. The pieces between separators are
+tracked as ``(start, end)`` pairs, so text is only sliced when a chunk is actually materialized.
+"""
+from collections import deque
+from typing import NamedTuple
+
+from langchain_core.documents import Document
+
+
+class ChunkSpan(NamedTuple):
+    """Where a chunk lives: ``pages[page][start:end]`` of document ``doc``."""
+
+    doc: object
+    page: int
+    start: int
+    end: int
+
+
+def _pieces(text, separator):
+    # Separator kept at the start of each piece, as keep_separator=True does; empty pieces dropped
+    start = 0
+    position = text.find(separator)
+    while position != -1:
+        if position > start:
+            yield start, position
+        start = position
+        position = text.find(separator, position + len(separator))
+    if len(text) > start:
+        yield start, len(text)
+
+
+def _strip(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+class OffsetTextSplitter:
+    """Drop-in for the single-separator ``RecursiveCharacterTextSplitter`` used by the apps."""
+
+    def __init__(self, separator="\n", chunk_size=400, chunk_overlap=150, add_start_index=True):
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"Got a larger chunk overlap ({chunk_overlap}) than chunk size ({chunk_size}), should be smaller."
+            )
+        if not separator:
+            raise ValueError("OffsetTextSplitter needs a non-empty separator")
+        self.separator = separator
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.add_start_index = add_start_index
+
+    def iter_spans(self, text):
+        """Yield ``(start, end)`` for every chunk of ``text``, in order."""
+        chunk_size, chunk_overlap = self.chunk_size, self.chunk_overlap
+        current = deque()
+        total = 0
+        for start, end in _pieces(text, self.separator):
+            length = end - start
+            if length >= chunk_size:
+                # Oversized pieces end the current run and are emitted as-is, unstripped
+                if current:
+                    span = _strip(text, current[0][0], current[-1][1])
+                    if span[0] < span[1]:
+                        yield span
+                    current.clear()
+                    total = 0
+                yield start, end
+                continue
+            if total + length > chunk_size and current:
+                span = _strip(text, current[0][0], current[-1][1])
+                if span[0] < span[1]:
+                    yield span
+                # Keep trailing pieces that fit in the overlap and still leave room for this one
+                while total > chunk_overlap or (total + length > chunk_size and total > 0):
+                    first_start, first_end = current.popleft()
+                    total -= first_end - first_start
+            current.append((start, end))
+            total += length
+        if current:
+            span = _strip(text, current[0][0], current[-1][1])
+            if span[0] < span[1]:
+                yield span
+
+    def split_text(self, text):
+        return [text[start:end] for start, end in self.iter_spans(text)]
+
+    def split_pages(self, pages, doc=None):
+        """Yield a ``ChunkSpan`` per chunk of ``(page_number, text)`` pairs; no text is copied."""
+        for page_number, text in pages:
+            for start, end in self.iter_spans(text):
+                yield ChunkSpan(doc, page_number, start, end)
+
+    def create_documents(self, texts, metadatas=None):
+        """Same output as ``TextSplitter.create_documents``, including its ``start_index`` values."""
+        metadatas = metadatas or [{}] * len(texts)
+        documents = []
+        for text, base_metadata in zip(texts, metadatas):
+            index = previous_length = 0
+            for start, end in self.iter_spans(text):
+                chunk = text[start:end]
+                metadata = dict(base_metadata)
+                if self.add_start_index:
+                    # LangChain searches forward from the expected offset; only repeated text can
+                    # make that land before the true start, so the search is skipped otherwise
+                    offset = max(0, index + previous_length - self.chunk_overlap)
+                    index = start if start == offset else text.find(chunk, offset)
+                    metadata["start_index"] = index
+                    previous_length = end - start
+                documents.append(Document(page_content=chunk, metadata=metadata))
+        return documents
+
+
+def span_text(pages, span):
+    """Slice the text of ``span`` out of ``pages``, a ``{page_number: text}`` mapping."""
+    return pages[span.page][span.start:span.end]
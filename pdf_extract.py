@@ -0,0 +1,52 @@
+"""Parallel, streaming PDF text extraction that keeps page numbers attached to chunks."""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2 import PdfReader
+
+import shared_resources
+
+# Below this many pages the process pool costs more than it saves
+PARALLEL_MIN_PAGES = 8
+
+_worker_reader = None
+
+
+def _init_worker(pdf_bytes):
+    # Pool workers only: each parses the document once and then serves page numbers
+    global _worker_reader
+    _worker_reader = PdfReader(io.BytesIO(pdf_bytes))
+
+
+def _extract_page(index):
+    # Scanned or empty pages come back as None
+    return _worker_reader.pages[index].extract_text() or ""
+
+
+def iter_page_texts(pdf_bytes, max_workers=None):
+    """Yield ``(page_number, text)`` in page order, starting at page 1."""
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    page_count = len(reader.pages)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    if page_count < PARALLEL_MIN_PAGES or max_workers == 1:
+        # In-process: a local reader, so concurrent sessions never share one
+        for index in range(page_count):
+            yield index + 1, reader.pages[index].extract_text() or ""
+        return
+
+    chunksize = max(1, page_count // (max_workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=shared_resources.process_pool_context(), initializer=_init_worker, initargs=(pdf_bytes,)
+    ) as pool:
+        # map() returns results in submission order while pages are extracted concurrently
+        for index, text in enumerate(pool.map(_extract_page, range(page_count), chunksize=chunksize)):
+            yield index + 1, text
+
+
+def iter_page_documents(pages, text_splitter):
+    """Split pages as they arrive, tagging every chunk with the page it came from."""
+    for page_number, text in pages:
+        if text:
+            yield from text_splitter.create_documents([text], metadatas=[{"page": page_number}])
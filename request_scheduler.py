@@ -0,0 +1,224 @@
+"""Process-wide admission control for outbound model calls: rate limits, priorities and retry.
+
+Each limit group (``"chat"``, ``"embeddings"``, ``"audio"``) has one ``RequestScheduler`` per
+process, shared by every Streamlit session. A request waits until the group's requests-per-minute
+and tokens-per-minute buckets both have room and no higher-priority request is waiting, then runs
+in the caller's own thread. A rate-limit response pauses the whole group and is retried with
+full-jitter backoff, so concurrent sessions slow down together instead of failing together.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+import metrics
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# (requests per minute, tokens per minute; 0 means unlimited). Override with GENAI_<GROUP>_RPM / _TPM
+DEFAULT_LIMITS = {
+    "chat": (3500, 90_000),
+    "embeddings": (3000, 1_000_000),
+    "audio": (50, 0),
+}
+# Seconds of refill a bucket can bank; short, so no minute-long window sees much more than the limit
+BURST_SECONDS = 5.0
+# Requests allowed to wait per priority before new ones are turned away
+MAX_WAITING = {INTERACTIVE: 64, BACKGROUND: 256}
+# How long a request may wait for admission; background work waits as long as it takes
+MAX_WAIT_SECONDS = {INTERACTIVE: 30.0, BACKGROUND: None}
+DEFAULT_MAX_RETRIES = 6
+
+
+class SchedulerBusy(RuntimeError):
+    """The wait queue is full, or the request could not be admitted in time."""
+
+
+def is_retryable(error):
+    # 429s and transient server errors; openai exceptions expose status_code
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or (status is not None and status >= 500) or type(error).__name__ in (
+        "RateLimitError",
+        "APIConnectionError",
+        "APITimeoutError",
+    )
+
+
+def is_rate_limit(error):
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+
+def backoff_delay(attempt, base_delay=0.5, max_delay=30.0):
+    # Full jitter keeps concurrent workers from retrying in lockstep
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def retry_after(error):
+    """Seconds from the ``Retry-After`` header of a failed response, if there is one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(*texts):
+    # About four characters per token; admission only needs the order of magnitude
+    return sum(len(text) for text in texts) // 4 + 1
+
+
+def limits_for(group):
+    requests_per_minute, tokens_per_minute = DEFAULT_LIMITS.get(group, (0, 0))
+    return (
+        int(os.environ.get(f"GENAI_{group.upper()}_RPM", requests_per_minute)),
+        int(os.environ.get(f"GENAI_{group.upper()}_TPM", tokens_per_minute)),
+    )
+
+
+class TokenBucket:
+    """Refills at ``per_minute / 60`` units a second up to ``BURST_SECONDS`` worth; not thread-safe."""
+
+    def __init__(self, per_minute, burst_seconds=BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until ``amount`` can be taken; 0 for an unlimited bucket."""
+        if not self.rate or not amount:
+            return 0.0
+        self._refill(now)
+        # Requests larger than the bucket go once it is full and leave it in debt
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / self.rate)
+
+    def take(self, amount, now):
+        if self.rate:
+            self._refill(now)
+            self.level -= amount
+
+
+class RequestScheduler:
+    """Admits requests in priority order, at most as fast as both buckets refill."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute=0, name="openai", max_waiting=None,
+                 max_wait_seconds=None, max_retries=DEFAULT_MAX_RETRIES, burst_seconds=BURST_SECONDS):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute, burst_seconds)
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds)
+        self.max_waiting = {**MAX_WAITING, **(max_waiting or {})}
+        self.max_wait_seconds = {**MAX_WAIT_SECONDS, **(max_wait_seconds or {})}
+        self.max_retries = max_retries
+        self._waiting = []
+        self._depth = dict.fromkeys(PRIORITY_NAMES, 0)
+        self._paused_until = 0.0
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _set_depth(self, priority, change):
+        self._depth[priority] += change
+        metrics.set_gauge("queue_depth", self._depth[priority], group=self.name, priority=PRIORITY_NAMES[priority])
+
+    def acquire(self, priority=INTERACTIVE, tokens=0, timeout=None):
+        """Block until the request may be sent and return the seconds spent waiting.
+
+        Raises ``SchedulerBusy`` when the queue for ``priority`` is full or ``timeout`` (default
+        ``MAX_WAIT_SECONDS[priority]``) passes first.
+        """
+        started = time.monotonic()
+        timeout = self.max_wait_seconds[priority] if timeout is None else timeout
+        deadline = None if timeout is None else started + timeout
+        priority_name = PRIORITY_NAMES[priority]
+        with self._condition:
+            if self._depth[priority] >= self.max_waiting[priority]:
+                metrics.increment("scheduler_rejected", group=self.name, priority=priority_name)
+                raise SchedulerBusy(f"Too many {priority_name} {self.name} requests waiting; try again shortly")
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            self._set_depth(priority, 1)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = None
+                    if self._waiting[0] == ticket:
+                        # Only the head of the queue draws from the buckets; the rest wait their turn
+                        delay = max(
+                            self._paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now)
+                        )
+                        if delay <= 0:
+                            self.requests.take(1, now)
+                            self.tokens.take(tokens, now)
+                            break
+                    if deadline is not None:
+                        if now >= deadline:
+                            metrics.increment("scheduler_rejected", group=self.name, priority=priority_name)
+                            raise SchedulerBusy(f"{self.name} rate limit: no capacity within {timeout:.0f}s; try again shortly")
+                        delay = deadline - now if delay is None else min(delay, deadline - now)
+                    self._condition.wait(delay)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._set_depth(priority, -1)
+                self._condition.notify_all()
+        waited = time.monotonic() - started
+        metrics.observe(f"{self.name}_queue_wait_{priority_name}", waited)
+        return waited
+
+    async def acquire_async(self, priority=INTERACTIVE, tokens=0, timeout=None):
+        # Waiting happens on a worker thread so the event loop keeps serving other requests
+        return await asyncio.to_thread(self.acquire, priority, tokens, timeout)
+
+    def pause(self, seconds):
+        """Hold back every request of this group for ``seconds``; used when the API says 429."""
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+    def _on_error(self, error, attempt, max_retries, stage, on_retry):
+        # Returns the delay before the next attempt, or raises when the error is final
+        if attempt == max_retries or not is_retryable(error):
+            raise error
+        metrics.increment("retries", stage=stage or self.name)
+        if on_retry:
+            on_retry(attempt, error)
+        delay = backoff_delay(attempt)
+        if is_rate_limit(error):
+            # The account limit is shared, so every caller backs off, not just this one
+            metrics.increment("rate_limited", group=self.name)
+            self.pause(retry_after(error) or delay)
+        return delay
+
+    def call(self, function, priority=INTERACTIVE, tokens=0, timeout=None, max_retries=None, stage=None, on_retry=None):
+        """Run ``function()`` once admitted, retrying retryable errors; each attempt is admitted anew."""
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            self.acquire(priority, tokens, timeout)
+            try:
+                return function()
+            except Exception as error:
+                delay = self._on_error(error, attempt, max_retries, stage, on_retry)
+            time.sleep(delay)
+
+    async def acall(self, function, priority=INTERACTIVE, tokens=0, timeout=None, max_retries=None, stage=None, on_retry=None):
+        """``call`` for coroutine functions."""
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            await self.acquire_async(priority, tokens, timeout)
+            try:
+                return await function()
+            except Exception as error:
+                delay = self._on_error(error, attempt, max_retries, stage, on_retry)
+            await asyncio.sleep(delay)
@@ -0,0 +1,155 @@
+"""Process-wide clients and models, built once and reused by every session and rerun.
+
+Streamlit reruns the whole script on each interaction; anything constructed at the top of an
+app is rebuilt every time. These getters return the same instance for the same arguments, and
+all OpenAI traffic goes through one keep-alive connection pool so reruns skip TCP/TLS setup.
+"""
+import atexit
+import os
+import threading
+
+# Connection pool shared by every sync OpenAI client in the process
+HTTP_LIMITS = {
+    "max_connections": int(os.environ.get("GENAI_HTTP_MAX_CONNECTIONS", 64)),
+    "max_keepalive_connections": int(os.environ.get("GENAI_HTTP_MAX_KEEPALIVE", 32)),
+    "keepalive_expiry": 90.0,
+}
+HTTP_TIMEOUT = {"timeout": 600.0, "connect": 10.0}
+
+_resources = {}
+_lock = threading.RLock()
+
+
+def _shared(key, build):
+    with _lock:
+        if key not in _resources:
+            _resources[key] = build()
+        return _resources[key]
+
+
+def process_pool_context():
+    """Start method for process pools created inside the app server.
+
+    Forking copies a multithreaded process together with any locks its other threads hold, which
+    can deadlock the child; forkserver (spawn where unavailable) starts workers clean.
+    """
+    import multiprocessing
+
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def http_client():
+    """Pooled keep-alive ``httpx.Client``; safe to use from several threads at once."""
+    def build():
+        import httpx
+
+        return httpx.Client(limits=httpx.Limits(**HTTP_LIMITS), timeout=httpx.Timeout(**HTTP_TIMEOUT))
+
+    return _shared("http_client", build)
+
+
+def openai_client(api_key, base_url=None):
+    def build():
+        from openai import OpenAI
+
+        # Retries belong to the request scheduler, which also pauses other sessions on a 429
+        return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client(), max_retries=0)
+
+    return _shared(("openai", api_key, base_url), build)
+
+
+def sentiment_analyzer():
+    # Loading the VADER lexicon is the expensive part
+    def build():
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+        return SentimentIntensityAnalyzer()
+
+    return _shared("vader", build)
+
+
+def chat_model(api_key, base_url=None, **settings):
+    """Shared ``ChatOpenAI``; pass per-request callbacks at call time, not here."""
+    def build():
+        from langchain_openai.chat_models import ChatOpenAI
+
+        return ChatOpenAI(openai_api_key=api_key, base_url=base_url, http_client=http_client(), max_retries=0, **settings)
+
+    return _shared(("chat_model", api_key, base_url, tuple(sorted(settings.items()))), build)
+
+
+def qa_chain(llm, chain_type="stuff"):
+    from langchain.chains.question_answering import load_qa_chain
+
+    # Keyed by identity; the entry keeps ``llm`` alive so its id cannot be reused
+    key = ("qa_chain", id(llm), chain_type)
+    with _lock:
+        entry = _resources.get(key)
+        if entry is None or entry[0] is not llm:
+            entry = _resources[key] = (llm, load_qa_chain(llm, chain_type=chain_type))
+        return entry[1]
+
+
+def embedding_backend(api_key, model=None, base_url=None):
+    def build():
+        from embedding_pipeline import DEFAULT_MODEL, OpenAIEmbeddingBackend
+
+        return OpenAIEmbeddingBackend(api_key, model=model or DEFAULT_MODEL, base_url=base_url)
+
+    return _shared(("embedding_backend", api_key, model, base_url), build)
+
+
+def request_scheduler(group="chat"):
+    """The process's ``RequestScheduler`` for a limit group: "chat", "embeddings" or "audio"."""
+    def build():
+        from request_scheduler import RequestScheduler, limits_for
+
+        return RequestScheduler(*limits_for(group), name=group)
+
+    return _shared(("request_scheduler", group), build)
+
+
+def history_store(path=None):
+    """Shared ``HistoryStore``; closed (and its queued writes committed) at interpreter exit."""
+    def build():
+        from history_store import DEFAULT_HISTORY_PATH, HistoryStore
+
+        store = HistoryStore(path or DEFAULT_HISTORY_PATH)
+        atexit.register(store.close)
+        return store
+
+    return _shared(("history_store", path), build)
+
+
+def journal_index(api_key, base_url=None):
+    """Shared ``JournalIndex`` over the shared history store; the embeddings client is built on first use."""
+    def build_embeddings():
+        from embedding_pipeline import PipelineEmbeddings
+        from embedding_store import CachedEmbeddings, EmbeddingStore
+
+        # Entry vectors go through the same per-text cache as document chunks
+        return CachedEmbeddings(PipelineEmbeddings(embedding_backend(api_key, base_url=base_url)), EmbeddingStore())
+
+    def build():
+        from journal_search import JournalIndex
+
+        index = JournalIndex(history_store(), lambda: _shared(("journal_embeddings", api_key, base_url), build_embeddings))
+        atexit.register(index.close)
+        return index
+
+    return _shared(("journal_index", api_key, base_url), build)
+
+
+def clear():
+    """Drop every shared object, closing the connection pool; mostly for benchmarks."""
+    with _lock:
+        client = _resources.get("http_client")
+        stores = [
+            value for key, value in _resources.items() if isinstance(key, tuple) and key[0] in ("history_store", "journal_index")
+        ]
+        _resources.clear()
+    if client is not None:
+        client.close()
+    for store in stores:
+        store.close()
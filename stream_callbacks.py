@@ -0,0 +1,23 @@
+"""LangChain streaming callbacks, kept apart from ``streaming`` so plain chat apps skip the LangChain import."""
+from langchain_core.callbacks import BaseCallbackHandler
+
+from streaming import CURSOR
+
+
+class PlaceholderStreamHandler(BaseCallbackHandler):
+    """LangChain callback that writes each new LLM token into a Streamlit placeholder."""
+
+    def __init__(self, placeholder, timer, prefix=""):
+        self.placeholder = placeholder
+        self.timer = timer
+        self.prefix = prefix
+        self.parts = []
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.timer.mark_token()
+        self.parts.append(token)
+        self.placeholder.markdown(self.prefix + "".join(self.parts) + CURSOR)
+
+    def on_llm_end(self, response, **kwargs):
+        self.timer.finish()
+        self.placeholder.markdown(self.prefix + "".join(self.parts))
@@ -0,0 +1,95 @@
+"""Incremental rendering of streamed model output and time-to-first-token measurement."""
+import time
+
+import streamlit as st
+
+CURSOR = "▌"
+
+
+class StreamTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.tokens = 0
+        self.usage = None
+
+    def mark_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.tokens += 1
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+    @property
+    def time_to_first_token(self):
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    @property
+    def total_time(self):
+        return None if self.finished_at is None else self.finished_at - self.started
+
+
+def iter_chat_deltas(stream, timer):
+    """Yield text deltas from an OpenAI ``stream=True`` chat completion."""
+    for chunk in stream:
+        # With ``stream_options={"include_usage": True}`` the last chunk has usage and no choices
+        if getattr(chunk, "usage", None) is not None:
+            timer.usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            timer.mark_token()
+            yield delta
+    timer.finish()
+
+
+def stream_to_placeholder(deltas, placeholder, template="{}", escape=None):
+    """Render ``deltas`` into ``placeholder`` as they arrive and return the full text.
+
+    ``escape`` converts the text before it goes into ``template``, e.g. ``transcript.escape_content``.
+    """
+    escape = escape or str
+    parts = []
+    for delta in deltas:
+        parts.append(delta)
+        placeholder.markdown(template.format(escape("".join(parts)) + CURSOR), unsafe_allow_html=True)
+    text = "".join(parts)
+    placeholder.markdown(template.format(escape(text)), unsafe_allow_html=True)
+    return text
+
+
+def _format_ms(seconds):
+    return f"{seconds * 1000:.0f}" if seconds is not None else "n/a"
+
+
+def render_debug_panel(timer, metrics=None, registry=None):
+    # Optional sidebar panel; collapsed so it stays out of the way
+    stages = registry.summary() if registry is not None else {}
+    if timer is None and not metrics and not stages:
+        return
+    with st.sidebar.expander("Debug"):
+        if timer is not None:
+            ttft = timer.time_to_first_token
+            total = timer.total_time
+            st.metric("Time to first token", f"{ttft * 1000:.0f} ms" if ttft is not None else "n/a")
+            st.metric("Total response time", f"{total * 1000:.0f} ms" if total is not None else "n/a")
+            st.caption(f"{timer.tokens} streamed chunks")
+        for label, value in (metrics or {}).items():
+            st.metric(label, value)
+        if stages:
+            # Process-wide numbers, so they cover every session of this app
+            rows = ["| Stage | Calls | p50 ms | p95 ms | Errors |", "|---|---:|---:|---:|---:|"]
+            for stage, row in stages.items():
+                rows.append(f"| {stage} | {row['count']} | {_format_ms(row['p50'])} | {_format_ms(row['p95'])} | {row['errors']} |")
+            st.markdown("\n".join(rows))
+            counters = {**registry.counters(), **registry.gauges()}
+            if counters:
+                rows = ["| Counter | Total |", "|---|---:|"]
+                for (name, labels), total in counters.items():
+                    label = " ".join([name] + [f"{key}={value}" for key, value in labels])
+                    rows.append(f"| {label} | {total} |")
+                st.markdown("\n".join(rows))
+            st.download_button("Prometheus metrics", registry.prometheus_text(), file_name="metrics.prom", mime="text/plain")
@@ -0,0 +1,277 @@
+"""Deterministic local stand-in for the OpenAI HTTP API (embeddings, chat and audio transcription), for offline runs and load tests.
+
+    python stub_openai_server.py --port 8765 --rate-limit-every 10
+
+Point a client at it with ``base_url="http://127.0.0.1:8765/v1"`` and any API key.
+"""
+import argparse
+import array
+import base64
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+import wave
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIM = 1536
+# The transcription endpoint's upload limit
+MAX_AUDIO_BYTES = 25 * 1024 * 1024
+
+
+def stub_embedding(text, dim=EMBEDDING_DIM):
+    # Same text always maps to the same unit vector
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class StubState:
+    def __init__(self, dim=EMBEDDING_DIM, latency=0.0, rate_limit_every=0, requests_per_minute=0, window=60.0,
+                 transcribe_speed=0.0, max_audio_bytes=MAX_AUDIO_BYTES):
+        self.dim = dim
+        self.latency = latency
+        # Seconds spent per second of uploaded WAV audio, on top of ``latency``
+        self.transcribe_speed = transcribe_speed
+        self.max_audio_bytes = max_audio_bytes
+        self.rate_limit_every = rate_limit_every
+        # Like the real API: at most requests_per_minute accepted in any trailing ``window`` seconds
+        self.requests_per_minute = requests_per_minute
+        self.window = window
+        self.accepted = deque()
+        self.requests = 0
+        self.rejected = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def count_connection(self):
+        with self.lock:
+            self.connections += 1
+
+    def rate_limit_delay(self):
+        """Seconds the client should wait when this request is rejected with a 429, else ``None``."""
+        with self.lock:
+            self.requests += 1
+            if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+                self.rejected += 1
+                return 0.0
+            if self.requests_per_minute:
+                now = time.monotonic()
+                while self.accepted and self.accepted[0] <= now - self.window:
+                    self.accepted.popleft()
+                if len(self.accepted) >= self.requests_per_minute * self.window / 60.0:
+                    self.rejected += 1
+                    return self.accepted[0] + self.window - now
+                self.accepted.append(now)
+            return None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive; streamed replies still close theirs
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms per reply
+    disable_nagle_algorithm = True
+    state = StubState()
+
+    def setup(self):
+        super().setup()
+        self.state.count_connection()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        content_type = self.headers.get("Content-Type", "")
+        request = _form_fields(content_type, body) if content_type.startswith("multipart/") else json.loads(body or b"{}")
+
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        delay = self.state.rate_limit_delay()
+        if delay is not None:
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (stub)", "type": "requests", "code": "rate_limit_exceeded"}},
+                {"Retry-After": f"{delay:.3f}"},
+            )
+            return
+
+        path = self.path.rstrip("/")
+        if path.endswith("/embeddings"):
+            self._send_json(200, self._embeddings(request))
+        elif path.endswith("/chat/completions"):
+            self._chat(request)
+        elif path.endswith("/audio/transcriptions"):
+            self._transcription(request)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _embeddings(self, request):
+        inputs = request.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        # The SDK asks for base64 unless told otherwise, and the real API honours that
+        if request.get("encoding_format") == "base64":
+            encode = lambda vector: base64.b64encode(array.array("f", vector).tobytes()).decode("ascii")
+        else:
+            encode = lambda vector: vector
+        data = [
+            {"object": "embedding", "index": index, "embedding": encode(stub_embedding(str(text), self.state.dim))}
+            for index, text in enumerate(inputs)
+        ]
+        tokens = sum(len(str(text).split()) for text in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "stub"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def _transcription(self, request):
+        name, data = request.get("file") or ("", b"")
+        if self.state.max_audio_bytes and len(data) > self.state.max_audio_bytes:
+            message = f"Maximum content size limit ({self.state.max_audio_bytes}) exceeded"
+            self._send_json(413, {"error": {"message": message, "type": "invalid_request_error"}})
+            return
+        seconds = _wav_seconds(data)
+        if self.state.transcribe_speed and seconds:
+            time.sleep(seconds * self.state.transcribe_speed)
+        # Names the file, so callers can check that segments come back in order
+        text = f"Stub transcript of {name} ({seconds:.1f}s)." if seconds else f"Stub transcript of {name}."
+        if request.get("response_format") == "text":
+            body = (text + "\n").encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(200, {"text": text})
+
+    def _chat(self, request):
+        # Echo the start of the last user message so answers depend on the retrieved context
+        messages = request.get("messages", [])
+        prompt = " ".join(str(message.get("content", "")) for message in messages)
+        last_user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        words = ["Stub", "answer:"] + str(last_user).split()[:40]
+        model = request.get("model", "stub")
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": len(prompt.split()),
+            "completion_tokens": len(words),
+            "total_tokens": len(prompt.split()) + len(words),
+        }
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        # Server-sent events, one word per chunk; the closed connection ends the body
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        deltas = [{"role": "assistant", "content": ""}] + [{"content": word + " "} for word in words] + [{}]
+        for position, delta in enumerate(deltas):
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": delta,
+                    "finish_reason": "stop" if position == len(deltas) - 1 else None,
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        if (request.get("stream_options") or {}).get("include_usage"):
+            # Like the real API, a final chunk without choices carries the usage
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model, "choices": [], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def _form_fields(content_type, body):
+    # multipart/form-data as {name: value}; file fields become (filename, bytes). Split on the
+    # boundary directly: the email parser takes about a second per 10 MB upload
+    boundary = b"--" + re.search(r'boundary="?([^";]+)"?', content_type).group(1).encode("latin-1")
+    fields = {}
+    for part in body.split(boundary)[1:-1]:
+        head, _, data = part[2:-2].partition(b"\r\n\r\n")
+        head = head.decode("latin-1")
+        name = re.search(r'(?<![a-z])name="([^"]*)"', head).group(1)
+        filename = re.search(r'filename="([^"]*)"', head)
+        fields[name] = (filename.group(1), data) if filename else data.decode("utf-8")
+    return fields
+
+
+def _wav_seconds(data):
+    # Duration of a WAV upload; 0.0 for compressed formats, which the stub does not decode
+    try:
+        with wave.open(io.BytesIO(data)) as audio:
+            return audio.getnframes() / audio.getframerate()
+    except (wave.Error, EOFError):
+        return 0.0
+
+
+def serve(host="127.0.0.1", port=0, state=None):
+    """Start the stub in a daemon thread and return the server; ``port=0`` picks a free port."""
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state or StubState()})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with a 429")
+    parser.add_argument("--rpm", type=int, default=0, help="429 once this many requests arrive within --window seconds")
+    parser.add_argument("--window", type=float, default=60.0, help="window in seconds for --rpm")
+    parser.add_argument("--transcribe-speed", type=float, default=0.0, help="seconds per second of WAV audio transcribed")
+    args = parser.parse_args()
+
+    state = StubState(args.dim, args.latency, args.rate_limit_every, args.rpm, args.window, args.transcribe_speed)
+    server = ThreadingHTTPServer((args.host, args.port), type("BoundStubHandler", (StubHandler,), {"state": state}))
+    print(f"Stub OpenAI API listening on {base_url(server)}")
+    server.serve_forever()
@@ -0,0 +1,37 @@
+"""Shared tiktoken encodings, with an offline fallback when the BPE files cannot be fetched."""
+import threading
+import warnings
+
+import tiktoken
+
+_encodings = {}
+_lock = threading.Lock()
+
+
+class ApproximateEncoding:
+    """Roughly four characters per token; only used when tiktoken has no cached BPE file."""
+
+    name = "approximate"
+
+    def encode(self, text, disallowed_special=()):
+        return [text[start:start + 4] for start in range(0, len(text), 4)]
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+def get_encoding(name="cl100k_base"):
+    with _lock:
+        if name not in _encodings:
+            try:
+                _encodings[name] = tiktoken.get_encoding(name)
+            except Exception as error:
+                # tiktoken downloads its BPE file on first use; offline boxes without
+                # TIKTOKEN_CACHE_DIR populated still need token budgets to work
+                warnings.warn(f"tiktoken encoding {name!r} unavailable ({error}); using approximate token counts")
+                _encodings[name] = ApproximateEncoding()
+        return _encodings[name]
+
+
+def count_tokens(text, encoding_name="cl100k_base"):
+    return len(get_encoding(encoding_name).encode(text, disallowed_special=()))
@@ -0,0 +1,75 @@
+"""Chat transcript rendering that costs the same on every rerun, however long the conversation.
+
+Each message is escaped and turned into its bubble HTML once, the first time it is seen; past
+messages never change, so later reruns reuse that HTML. Only the newest ``page_size`` messages are
+shown, joined into a single markdown element, with a button that reveals older ones a page at a time.
+When the history was loaded a page at a time, ``load_older`` fetches messages from before it.
+"""
+import html
+
+import streamlit as st
+
+PAGE_SIZE = 20
+
+
+def escape_content(text):
+    """Message text as HTML: escaped, with line breaks kept so the bubble stays one HTML block."""
+    return html.escape(text).replace("\n", "<br>")
+
+
+class Transcript:
+    """Rendered bubbles for an append-only chat history; keep one per session in ``st.session_state``."""
+
+    def __init__(self, templates, page_size=PAGE_SIZE, load_older=None):
+        # ``templates`` maps a message role to its bubble HTML with one ``{}`` for the content;
+        # roles without a template (such as "system") are not shown. ``load_older(count)`` returns
+        # up to ``count`` messages from before the loaded history, oldest first.
+        self.templates = templates
+        self.page_size = page_size
+        self.load_older = load_older
+        self.visible = page_size
+        self._bubbles = []
+        self._synced = 0
+        self._more_stored = load_older is not None and not getattr(load_older, "exhausted", False)
+
+    def _bubble(self, message):
+        template = self.templates.get(message["role"])
+        return template.format(escape_content(message["content"])) if template else ""
+
+    def sync(self, history):
+        """Render any messages appended to ``history`` since the last call."""
+        if len(history) < self._synced:
+            # History was cleared or replaced; start over
+            self.reset()
+        for message in history[self._synced:]:
+            self._bubbles.append(self._bubble(message))
+        self._synced = len(history)
+
+    def reset(self):
+        """Forget every rendered message, including older ones fetched with ``load_older``."""
+        self._bubbles = []
+        self._synced = 0
+        self._more_stored = False
+        self.visible = self.page_size
+
+    @property
+    def hidden(self):
+        return max(0, len(self._bubbles) - self.visible)
+
+    def show_older(self):
+        wanted = self.page_size - self.hidden
+        if wanted > 0 and self._more_stored:
+            older = self.load_older(wanted)
+            self._more_stored = len(older) == wanted
+            self._bubbles[:0] = [self._bubble(message) for message in older]
+        self.visible += self.page_size
+
+    def render(self, history, key="load_older"):
+        """Show the newest messages of ``history``, preceded by a "load older" button when there are more."""
+        self.sync(history)
+        if self.hidden or self._more_stored:
+            # A callback runs before the rerun, so the window below already reflects the click
+            st.button("Load older messages", key=key, on_click=self.show_older)
+        window = "".join(self._bubbles[-self.visible:])
+        if window:
+            st.markdown(window, unsafe_allow_html=True)
@@ -0,0 +1,55 @@
+"""Which user's stored history a browser session opens.
+
+Journals and conversations are private. When Streamlit authentication is configured (``st.login``),
+a signed-in visitor's history is keyed by their identity. Otherwise each browser gets a random,
+unguessable token, written into the page URL as ``?user=<token>``. Keeping that link reopens the
+same history, and nothing short of the link does. A missing or guessable ``user`` parameter is
+replaced with a fresh token, so no visitor ever lands in a shared account.
+
+The store only sees a hash of the token, so its keys cannot be turned back into working links.
+"""
+import hashlib
+import re
+import secrets
+
+import streamlit as st
+
+# secrets.token_urlsafe(24) is 32 characters carrying 192 random bits
+_TOKEN = re.compile(r"[A-Za-z0-9_-]{32,64}")
+
+
+def _key(kind, value):
+    return f"{kind}-{hashlib.blake2b(value.encode('utf-8'), digest_size=16).hexdigest()}"
+
+
+def valid_token(token):
+    return bool(_TOKEN.fullmatch(token or ""))
+
+
+def browser_key(token):
+    """Store key of the history opened by ``?user=<token>``, e.g. for command-line imports."""
+    return _key("browser", token)
+
+
+def _signed_in():
+    # None unless authentication is configured and the visitor has logged in
+    try:
+        if st.user.is_logged_in:
+            return _key("account", f"{st.user.get('iss', '')}|{st.user.get('sub') or st.user.get('email')}")
+    except (AttributeError, KeyError):
+        pass
+    return None
+
+
+def current_user():
+    """Store key for this browser session's history; set once per session."""
+    if "user_key" not in st.session_state:
+        user = _signed_in()
+        if user is None:
+            token = st.query_params.get("user", "")
+            if not valid_token(token):
+                token = secrets.token_urlsafe(24)
+                st.query_params["user"] = token
+            user = browser_key(token)
+        st.session_state.user_key = user
+    return st.session_state.user_key